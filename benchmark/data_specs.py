@@ -0,0 +1,94 @@
+"""
+Synthetic scenes with known foreground: static textured background with sensor noise,
+optionally with moving blobs, a slow change of the lighting and a flickering part of the background.
+"""
+import typing as t
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {'qvga': (240, 320), 'vga': (480, 640), '720p': (720, 1280), '1080p': (1080, 1920), '4k': (2160, 3840)}
+
+
+def create_background(height, width, random: np.random.RandomState) -> np.ndarray:
+    """
+    Smooth gradient with low frequency texture.
+    """
+    texture = random.randint(0, 256, (max(2, height // 32), max(2, width // 32), 3)).astype(np.uint8)
+    texture = cv2.resize(texture, (width, height), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+    gradient = np.linspace(40, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    return np.clip(0.5 * texture + 0.5 * gradient, 0, 255).astype(np.uint8)
+
+
+def generate_scene(height, width, frames, noise=5.0, blobs=0, blob_radius=None, lighting_drift=0.0, flicker=0.0,
+                   seed=0) -> t.Iterator[t.Tuple[np.ndarray, np.ndarray]]:
+    """
+    Args:
+        height, width: size of the frames
+        frames: number of frames
+        noise: standard deviation of the gaussian noise added to every pixel
+        blobs: number of moving discs of random colour
+        blob_radius: radius of the discs, by default 1/20 of the smaller dimension
+        lighting_drift: relative change of the brightness over the whole scene (e.g. 0.2 means 20% brighter at the end)
+        flicker: brightness change of the blocks in the left quarter of the scene which randomly switch
+            between two states every frame (e.g. swaying leaves, screens), it is background
+        seed: random seed, the same parameters give the same scene
+    Yields:
+        RGB uint8 frame and the bool mask of the foreground
+    """
+    random = np.random.RandomState(seed)
+    background = create_background(height, width, random)
+    blob_radius = blob_radius or max(2, min(height, width) // 20)
+    positions = random.random_sample((blobs, 2)) * (height, width)
+    velocities = (random.random_sample((blobs, 2)) - 0.5) * min(height, width) / 20
+    colours = random.randint(0, 256, (blobs, 3))
+
+    for i in range(frames):
+        lighting = 1.0 + lighting_drift * i / max(1, frames - 1)
+        frame = background.astype(np.float32) * lighting + random.normal(0, noise, background.shape)
+        if flicker:
+            states = random.randint(0, 2, ((height + 7) // 8, (width // 4 + 7) // 8)).astype(np.float32)
+            states = np.repeat(np.repeat(states, 8, axis=0), 8, axis=1)[:height, :width // 4]
+            frame[:, :width // 4] += ((2 * states - 1) * flicker)[..., np.newaxis]
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for position, colour in zip(positions, colours):
+            center = (int(position[1]), int(position[0]))
+            cv2.circle(frame, center, blob_radius, tuple(int(c) for c in colour), -1)
+            cv2.circle(mask, center, blob_radius, 1, -1)
+        yield frame, mask.astype(np.bool)
+
+        positions += velocities
+        bounced = (positions < 0) | (positions >= (height, width))
+        velocities[bounced] *= -1
+        positions = np.clip(positions, 0, (height - 1, width - 1))
+
+
+SCENES = {
+    'static': {'noise': 5.0},
+    'blobs': {'noise': 5.0, 'blobs': 5},
+    'crowd': {'noise': 5.0, 'blobs': 40},
+    'drift': {'noise': 5.0, 'blobs': 5, 'lighting_drift': 0.2},
+    'flicker': {'noise': 5.0, 'blobs': 5, 'flicker': 40.0},
+}
+
+
+def get_data_spec(name) -> dict:
+    """
+    Args:
+        name: scene and resolution joined with underscore e.g. blobs_vga (see SCENES and RESOLUTIONS)
+    Returns:
+        parameters of generate_scene without the number of frames
+    """
+    scene, resolution = name.rsplit('_', 1)
+    height, width = RESOLUTIONS[resolution]
+    return {'height': height, 'width': width, **SCENES[scene]}
+
+
+def load_frames(name, frames, seed=0) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        (N, H, W, 3) stack of frames and (N, H, W) stack of foreground masks of the named scene
+    """
+    images, masks = zip(*generate_scene(frames=frames, seed=seed, **get_data_spec(name)))
+    return np.stack(images), np.stack(masks)
@@ -0,0 +1,61 @@
+"""
+Import time of the package in a fresh interpreter (what a short lived worker or a command line tool pays on start),
+measured with python -X importtime so the start of the interpreter itself is not included.
+    python -m benchmark.import_time --module see.foreground --budget_ms 150
+"""
+import subprocess
+import sys
+
+import fire
+import numpy as np
+
+# optional dependencies that must not be imported with the package
+LAZY_MODULES = ('vendor', 'matplotlib', 'IPython', 'pandas', 'imageio')
+
+
+def measure_import(module='see.foreground') -> dict:
+    """
+    Returns:
+        total import time, the modules with the largest own import time and the lazy modules that were imported
+    """
+    check = (f"import sys, {module}; "
+             f"print(','.join(sorted({{name.split('.')[0] for name in sys.modules}} & {set(LAZY_MODULES)!r})))")
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', check],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                               check=True)
+    own_us = {}
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        own_us[name.strip()] = int(own)
+        if name.strip() == module:
+            total_us = int(cumulative)
+    largest = sorted(own_us.items(), key=lambda item: -item[1])[:5]
+    return {
+        'total_ms': total_us / 1000,
+        'largest_ms': [(name, us / 1000) for name, us in largest],
+        'lazy_imported': [name for name in completed.stdout.strip().split(',') if name],
+    }
+
+
+def main(module='see.foreground', repeats=5, budget_ms=150.0):
+    """
+    Exits with 1 if the median import time exceeds the budget or an optional dependency is imported.
+    """
+    results = [measure_import(module) for _ in range(repeats)]
+    median_ms = float(np.median([result['total_ms'] for result in results]))
+    print(f"import {module}: median {median_ms:.1f} ms of {repeats} (budget {budget_ms:.0f} ms)")
+    for name, ms in results[-1]['largest_ms']:
+        print(f"{name:>40}: {ms:6.1f} ms")
+
+    lazy_imported = results[-1]['lazy_imported']
+    if lazy_imported:
+        print(f"optional dependencies imported: {', '.join(lazy_imported)}")
+    if median_ms > budget_ms or lazy_imported:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,84 @@
+"""
+MixtureBackgroundModel compared to the StaticBackgroundModel and to cv2.BackgroundSubtractorMOG2:
+speed, memory of the state per camera and accuracy of the foreground on the scene with a flickering background.
+The finders are updated with the true masks (as in benchmark.utils.run_case), MOG2 learns from the frames alone
+so its accuracy is not directly comparable, it shows what the established per-pixel mixture achieves.
+    python -m benchmark.mixture --data flicker_vga
+"""
+import time
+
+import cv2
+import fire
+
+from benchmark import data_specs, model_specs, utils
+
+
+def score(detected, mask, flicker_columns) -> dict:
+    """
+    Counts over the whole frame and over its flickering part (the left quarter, see data_specs.generate_scene).
+    """
+    flicker_detected, flicker_mask = detected[:, :flicker_columns], mask[:, :flicker_columns]
+    return {'intersection': int((detected & mask).sum()), 'union': int((detected | mask).sum()),
+            'false_positives': int((detected & ~mask).sum()),
+            'flicker_intersection': int((flicker_detected & flicker_mask).sum()),
+            'flicker_union': int((flicker_detected | flicker_mask).sum())}
+
+
+def summarize(seconds, scores, pixels, state_mb) -> dict:
+    total = {key: sum(s[key] for s in scores) for key in scores[0]}
+    return {'fps': len(seconds) / sum(seconds), 'state_mb': state_mb,
+            'iou': total['intersection'] / max(total['union'], 1),
+            'fp_rate': total['false_positives'] / (pixels * len(scores)),
+            'flicker_iou': total['flicker_intersection'] / max(total['flicker_union'], 1)}
+
+
+def run_finder(model_name, images, masks, warmup, threshold=0.5) -> dict:
+    finder = model_specs.create_model(model_name)
+    seconds, scores = [], []
+    for i, (image, mask) in enumerate(zip(images, masks)):
+        start = time.perf_counter()
+        detected = finder.process(image, mask) > threshold
+        if i >= warmup:
+            seconds.append(time.perf_counter() - start)
+            scores.append(score(detected, mask, image.shape[1] // 4))
+    return summarize(seconds, scores, masks[0].size, utils.state_mb(finder))
+
+
+def mog2_state_mb(height, width, mixtures, channels=3) -> float:
+    """
+    Size of the model of MOG2: weight, variance and mean of every mixture as float32
+    and the number of used mixtures (uint8) for every pixel.
+    """
+    return (height * width * mixtures * (2 + channels) * 4 + height * width) / 2 ** 20
+
+
+def run_mog2(images, masks, warmup) -> dict:
+    subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+    seconds, scores = [], []
+    for i, (image, mask) in enumerate(zip(images, masks)):
+        start = time.perf_counter()
+        detected = subtractor.apply(image) > 0
+        if i >= warmup:
+            seconds.append(time.perf_counter() - start)
+            scores.append(score(detected, mask, image.shape[1] // 4))
+    height, width = masks[0].shape
+    return summarize(seconds, scores, masks[0].size, mog2_state_mb(height, width, subtractor.getNMixtures()))
+
+
+def main(data='flicker_vga', frames=100, warmup=30):
+    images, masks = data_specs.load_frames(data, frames + warmup)
+    cv2.setNumThreads(1)
+    results = {
+        'static': run_finder('float32', images, masks, warmup),
+        'mixture': run_finder('mixture', images, masks, warmup),
+        'cv2 MOG2': run_mog2(images, masks, warmup),
+    }
+    print(f"{data}, {frames} frames after {warmup} warmup frames, one thread")
+    for name, result in results.items():
+        print(f"{name:>10}: {result['fps']:6.1f} fps, state {result['state_mb']:6.2f} MB per camera, "
+              f"iou {result['iou']:.3f} (in the flickering part {result['flicker_iou']:.3f}), "
+              f"false positives {result['fp_rate']:6.2%}")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,35 @@
+"""
+Configurations of ForegroundFinder to benchmark, parameters of ForegroundFinder.create_from_dicts.
+"""
+import copy
+
+import see.foreground
+
+BACKGROUND = {'update_inertia': 10.0, 'error_inertia': 10.0, 'diff_method': 'rgb'}
+CLEANING = {'method': 'median', 'size': 5}
+
+MODEL_SPECS = {
+    'default': {'config_background_model': BACKGROUND, 'cleaning': CLEANING, 'confident_size': 3},
+    'in_place': {'config_background_model': {**BACKGROUND, 'in_place': True},
+                 'cleaning': CLEANING, 'confident_size': 3},
+    'float32': {'config_background_model': {**BACKGROUND, 'in_place': True, 'precision': 'float32'},
+                'cleaning': CLEANING, 'confident_size': 3, 'probability': {'dtype': 'float32'}},
+    'lut_uint8': {'config_background_model': {**BACKGROUND, 'in_place': True, 'precision': 'float32'},
+                  'cleaning': CLEANING, 'confident_size': 3, 'probability': {'method': 'lut', 'dtype': 'uint8'}},
+    'fixed16': {'config_background_model': {**BACKGROUND, 'precision': 'fixed16'},
+                'cleaning': CLEANING, 'confident_size': 3, 'probability': {'dtype': 'float32'}},
+    'tiled': {'config_background_model': {**BACKGROUND, 'in_place': True},
+              'cleaning': CLEANING, 'confident_size': 3, 'tiling': {'rows': 256, 'threads': 4}},
+    'mixture': {'config_background_model': {'model': 'mixture', 'update_inertia': 10.0},
+                'cleaning': CLEANING, 'confident_size': 3, 'probability': {'dtype': 'float32'}},
+    'large_cleaning': {'config_background_model': BACKGROUND, 'cleaning': {'method': 'median', 'size': 9},
+                       'confident_size': 7},
+}
+
+
+def get_model_spec(name) -> dict:
+    return copy.deepcopy(MODEL_SPECS[name])
+
+
+def create_model(name) -> see.foreground.ForegroundFinder:
+    return see.foreground.ForegroundFinder.create_from_dicts(**get_model_spec(name))
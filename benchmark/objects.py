@@ -0,0 +1,61 @@
+"""
+Throughput of the object extraction from the probability maps at different densities of the objects
+and the size of the records compared to the probability maps.
+    python -m benchmark.objects --resolution 720p
+"""
+import time
+
+import cv2
+import fire
+import numpy as np
+
+from benchmark import data_specs
+import see.foreground.objects as objects
+
+DENSITIES = (1, 10, 100, 1000)
+
+
+def create_probabilities(height, width, blobs, frames, seed=0) -> np.ndarray:
+    """
+    Probability maps of the moving blobs with soft edges.
+    """
+    probabilities = []
+    scene = data_specs.generate_scene(height, width, frames, blobs=blobs,
+                                      blob_radius=max(2, min(height, width) // (4 * int(np.sqrt(blobs)) + 16)),
+                                      seed=seed)
+    for _, mask in scene:
+        probabilities.append(cv2.GaussianBlur(mask.astype(np.float32), (7, 7), 0))
+    return np.stack(probabilities)
+
+
+def measure_extraction(probabilities, backend, threshold=0.5) -> dict:
+    extractor = objects.ObjectExtractor(threshold, backend=backend)
+    extractor.extract(probabilities[0])
+    start = time.perf_counter()
+    found = [extractor.extract(probability) for probability in probabilities]
+    seconds = time.perf_counter() - start
+    return {
+        'fps': len(probabilities) / seconds,
+        'objects_per_frame': float(np.mean([len(frame_objects) for frame_objects in found])),
+        'record_bytes_per_frame': float(np.mean([frame_objects.nbytes for frame_objects in found])),
+        'map_bytes_per_frame': probabilities[0].size * np.dtype(np.float64).itemsize,
+    }
+
+
+def main(resolution='720p', frames=30, densities=DENSITIES):
+    height, width = data_specs.RESOLUTIONS[resolution]
+    backends = ['opencv'] + (['sep'] if objects.load_sep() is not None else [])
+    print(f"{resolution}, {frames} frames, backends: {', '.join(backends)}")
+    for blobs in densities:
+        probabilities = create_probabilities(height, width, blobs, frames)
+        for backend in backends:
+            result = measure_extraction(probabilities, backend)
+            print(f"{blobs:>5} blobs {backend:>7}: {result['fps']:7.1f} fps, "
+                  f"{result['objects_per_frame']:6.1f} objects, "
+                  f"{result['record_bytes_per_frame']:8.0f} B of records per frame "
+                  f"({result['map_bytes_per_frame'] / max(result['record_bytes_per_frame'], 1):8.0f}x smaller "
+                  f"than the float64 map)")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,43 @@
+"""
+Speed of rendering the processed clip for the review: inspects.render montages written to a video
+compared to matplotlib figures of inspects.utils.show_all.
+    python -m benchmark.render --data blobs_720p
+"""
+import os
+import tempfile
+import time
+
+import fire
+
+from benchmark import data_specs, storage
+import inspects.render as render
+import inspects.utils as utils
+
+
+def measure_render(images, probabilities, path) -> float:
+    start = time.perf_counter()
+    render.write_review_video(path, images, probabilities)
+    return len(images) / (time.perf_counter() - start)
+
+
+def measure_show_all(images, probabilities, frames=3, scale=5) -> float:
+    start = time.perf_counter()
+    for image, probability in zip(images[:frames], probabilities[:frames]):
+        figure = utils.show_all(1, 2, image, probability, display_now=False, scale=scale)
+        figure.canvas.draw()
+    return frames / (time.perf_counter() - start)
+
+
+def main(data='blobs_720p', frames=50):
+    images, _ = data_specs.load_frames(data, frames)
+    probabilities = storage.calc_probabilities(data, frames)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        render_fps = measure_render(images, probabilities, os.path.join(temp_dir, "review.avi"))
+    show_all_fps = measure_show_all(images, probabilities)
+    print(f"{data}, {frames} frames")
+    print(f"{'render review video':>20}: {render_fps:7.1f} fps")
+    print(f"{'show_all figures':>20}: {show_all_fps:7.1f} fps (render is {render_fps / show_all_fps:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
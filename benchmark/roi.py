@@ -0,0 +1,51 @@
+"""
+Speed and memory of ForegroundFinder restricted to the regions of interest covering a part of the frame
+compared to the processing of the whole frame.
+    python -m benchmark.roi --data blobs_720p --model in_place
+"""
+import time
+
+import fire
+
+from benchmark import data_specs, model_specs, utils
+import see.foreground
+
+
+def roi_polygons(height, width, fraction) -> list:
+    """
+    Two rectangles (at the left and the right edge, as tall as the frame) covering together the fraction of the frame.
+    """
+    box_width = int(round(width * fraction / 2))
+    return [[(x, 0), (x + box_width - 1, 0), (x + box_width - 1, height - 1), (x, height - 1)]
+            for x in [0, width - box_width]]
+
+
+def run_roi(images, masks, model, roi, warmup=5) -> dict:
+    spec = model_specs.get_model_spec(model)
+    finder = see.foreground.ForegroundFinder.create_from_dicts(**spec, roi=roi)
+    for image, mask in zip(images[:warmup], masks[:warmup]):
+        finder.process(image, mask)
+    start = time.perf_counter()
+    for image, mask in zip(images[warmup:], masks[warmup:]):
+        finder.process(image, mask)
+    crops = [region.crop for region in finder.regions] if roi is not None else []
+    crop_area = sum((rows.stop - rows.start) * (cols.stop - cols.start) for rows, cols in crops)
+    return {'fps': (len(images) - warmup) / (time.perf_counter() - start), 'state_mb': utils.state_mb(finder),
+            'crop_fraction': crop_area / images[0].shape[0] / images[0].shape[1]}
+
+
+def main(data='blobs_720p', model='in_place', frames=30, warmup=5, fractions=(0.5, 0.25, 0.1)):
+    images, masks = data_specs.load_frames(data, frames + warmup)
+    height, width = images.shape[1:3]
+    full = run_roi(images, masks, model, None, warmup)
+    print(f"{data}, {model}, {frames} frames")
+    print(f"{'whole frame':>16}: {full['fps']:7.1f} fps, state {full['state_mb']:7.2f} MB")
+    for fraction in fractions:
+        result = run_roi(images, masks, model, {'polygons': roi_polygons(height, width, fraction)}, warmup)
+        print(f"{f'roi {fraction:.0%} of frame':>16}: {result['fps']:7.1f} fps "
+              f"({result['fps'] / full['fps']:4.1f}x), state {result['state_mb']:7.2f} MB, "
+              f"crops with the halo {result['crop_fraction']:.0%} of frame")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,42 @@
+"""
+Run the benchmark of the models on the synthetic scenes and save the results to json.
+    python -m benchmark.run --data blobs_vga,blobs_1080p --models default,in_place --frames 50
+"""
+import fire
+
+from benchmark import model_specs, utils
+
+DEFAULT_DATA = ('static_vga', 'blobs_vga', 'drift_vga', 'blobs_1080p')
+
+
+def as_names(names):
+    if isinstance(names, str):
+        return [name.strip() for name in names.split(',')]
+    return list(names)
+
+
+def main(data=DEFAULT_DATA, models=tuple(model_specs.MODEL_SPECS), frames=50, warmup=5,
+         output='benchmark/results', isolate=True):
+    """
+    Args:
+        data: names of the scenes (see data_specs.get_data_spec)
+        models: names of the models (see model_specs.MODEL_SPECS)
+        frames: number of measured frames
+        warmup: number of frames processed before the measurement
+        output: directory for the json with results
+        isolate: run every case in a separate process so that the peak memory is measured per case
+    """
+    run_case = utils.run_case_isolated if isolate else utils.run_case
+    results = []
+    for data_name in as_names(data):
+        for model_name in as_names(models):
+            result = run_case(data_name, model_name, frames=frames, warmup=warmup)
+            results.append(result)
+            print(f"{data_name:>14} {model_name:>14}: {result['fps']:7.1f} fps, "
+                  f"p50 {result['latency']['p50_ms']:7.1f} ms, p99 {result['latency']['p99_ms']:7.1f} ms, "
+                  f"peak rss {result['peak_rss_mb']:7.1f} MB")
+    print("Saved to", utils.save_results(results, output))
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
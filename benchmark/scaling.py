@@ -0,0 +1,99 @@
+"""
+Speed, memory and accuracy of ForegroundFinder processing at reduced resolution compared to the full resolution.
+    python -m benchmark.scaling --data blobs_720p
+"""
+import time
+
+import cv2
+import fire
+import numpy as np
+
+from benchmark import data_specs, model_specs, utils
+import see.foreground
+
+SCALINGS = {
+    'full': None,
+    'half': {'scale': 0.5},
+    'half_refined': {'scale': 0.5, 'refine_edges': True},
+    'quarter': {'levels': 2},
+    'quarter_refined': {'levels': 2, 'refine_edges': True},
+}
+
+
+def create_finder(scaling=None) -> see.foreground.ForegroundFinder:
+    return see.foreground.ForegroundFinder.create_from_dicts(**model_specs.get_model_spec('in_place'),
+                                                             scaling=scaling)
+
+
+def edge_band(mask, width=4) -> np.ndarray:
+    """
+    Pixels closer than width to the edge of the mask.
+    """
+    kernel = np.ones((2 * width + 1, 2 * width + 1), np.uint8)
+    return cv2.dilate(mask.view(np.uint8), kernel) != cv2.erode(mask.view(np.uint8), kernel)
+
+
+def run_scaling(images, masks, scaling, warmup=5, threshold=0.5) -> dict:
+    """
+    Every frame is scored and then used for the update with the true mask.
+    Returns:
+        speed, size of the model state and accuracy of the thresholded probability against the true masks
+        (overall and near the edges of the objects),
+        the probabilities are returned under 'probabilities' for the comparison of the scalings
+    """
+    finder = create_finder(scaling)
+    for image, mask in zip(images[:warmup], masks[:warmup]):
+        finder.process(image, mask)
+
+    probabilities = []
+    start = time.perf_counter()
+    for image, mask in zip(images[warmup:], masks[warmup:]):
+        probabilities.append(finder.calc_prob(image))
+        finder.update(image, mask)
+    seconds = time.perf_counter() - start
+    probabilities = np.stack(probabilities)
+
+    allocation_mb = utils.measure_allocation_mb(lambda: finder.process(images[-1], masks[-1]))
+    detected = probabilities > threshold
+    true = masks[warmup:]
+    return {
+        'fps': len(probabilities) / seconds,
+        'state_mb': utils.state_mb(finder),
+        'allocation_per_frame_mb': allocation_mb,
+        'iou': float((detected & true).sum() / max((detected | true).sum(), 1)),
+        'false_positive_rate': float((detected & ~true).sum() / max((~true).sum(), 1)),
+        'edge_accuracy': float(np.mean([(frame_detected == mask)[edge_band(mask)].mean()
+                                        for frame_detected, mask in zip(detected, true) if mask.any()])),
+        'probabilities': probabilities,
+    }
+
+
+def measure_scaling(data='blobs_720p', frames=30, warmup=5, seed=0) -> list:
+    images, masks = data_specs.load_frames(data, frames + warmup, seed=seed)
+    results = []
+    for name, scaling in SCALINGS.items():
+        result = run_scaling(images, masks, scaling, warmup)
+        results.append({'scaling': name, **result})
+
+    full = results[0]
+    full_probabilities = full['probabilities']
+    for result in results:
+        result['speedup'] = result['fps'] / full['fps']
+        result['state_ratio'] = full['state_mb'] / result['state_mb']
+        probabilities = result.pop('probabilities')
+        result['mean_abs_prob_diff'] = float(np.abs(probabilities - full_probabilities).mean())
+    return results
+
+
+def main(data='blobs_720p', frames=30, warmup=5):
+    print(f"{data}, {frames} frames")
+    for result in measure_scaling(data, frames, warmup):
+        print(f"{result['scaling']:>16}: {result['fps']:7.1f} fps ({result['speedup']:5.2f}x), "
+              f"state {result['state_mb']:7.2f} MB ({result['state_ratio']:5.1f}x smaller), "
+              f"iou {result['iou']:.3f}, false positives {result['false_positive_rate']:.4f}, "
+              f"edge accuracy {result['edge_accuracy']:.3f}, "
+              f"mean |prob - full| {result['mean_abs_prob_diff']:.4f}")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,67 @@
+"""
+Latency of ForegroundFinder with and without the update scheduling under load spikes:
+on the spike frames additional work (busy waiting) runs between calc_prob and update of the frame.
+    python -m benchmark.scheduling --data drift_720p --budget_ms 40 --spike_ms 20
+"""
+import time
+
+import fire
+import numpy as np
+
+from benchmark import data_specs, model_specs
+import see.foreground
+
+
+def busy_wait(ms):
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def run_schedule(images, masks, budget_ms, spike_ms, spike_frames, scheduling=None, warmup=5, threshold=0.5) -> dict:
+    finder = see.foreground.ForegroundFinder.create_from_dicts(**model_specs.get_model_spec('float32'),
+                                                               scheduling=scheduling)
+    for image, mask in zip(images[:warmup], masks[:warmup]):
+        finder.process(image, mask)
+
+    latencies = []
+    intersection = union = 0
+    for i, (image, mask) in enumerate(zip(images[warmup:], masks[warmup:])):
+        start = time.perf_counter()
+        detected = finder.calc_prob(image) > threshold
+        if i in spike_frames:
+            busy_wait(spike_ms)
+        finder.update(image, mask)
+        latencies.append((time.perf_counter() - start) * 1000)
+        intersection += (detected & mask).sum()
+        union += (detected | mask).sum()
+
+    latencies = np.array(latencies)
+    return {
+        'fps': len(latencies) / latencies.sum() * 1000,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'over_budget': float(np.mean(latencies > budget_ms)),
+        'iou': float(intersection / max(union, 1)),
+        'counts': finder.scheduler.counts if finder.scheduler is not None else None,
+    }
+
+
+def main(data='drift_720p', frames=100, budget_ms=40.0, spike_ms=20.0, warmup=5):
+    images, masks = data_specs.load_frames(data, frames + warmup)
+    # every other quarter of the clip is under load
+    spike_frames = {i for i in range(frames) if (4 * i // frames) % 2 == 1}
+    configs = {
+        'every frame': None,
+        'scheduled': {'budget_ms': budget_ms},
+    }
+    print(f"{data}, {frames} frames, budget {budget_ms:.0f} ms, spikes of {spike_ms:.0f} ms on half of the frames")
+    for name, scheduling in configs.items():
+        result = run_schedule(images, masks, budget_ms, spike_ms, spike_frames, scheduling, warmup)
+        print(f"{name:>12}: {result['fps']:6.1f} fps, p50 {result['p50_ms']:6.1f} ms, p99 {result['p99_ms']:6.1f} ms, "
+              f"over budget {result['over_budget']:6.1%}, iou {result['iou']:.3f}"
+              + (f", updates {result['counts']}" if result['counts'] else ""))
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
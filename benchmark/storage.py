@@ -0,0 +1,74 @@
+"""
+Size and speed of storing the probability maps of ForegroundFinder compared to the raw float64 maps.
+    python -m benchmark.storage --data blobs_720p
+"""
+import os
+import tempfile
+import time
+
+import fire
+import numpy as np
+
+from benchmark import data_specs, model_specs
+import see.foreground.storage as storage
+
+FORMATS = {
+    'chunked': {'chunk_frames': 16, 'rle': False},
+    'chunked_rle': {'chunk_frames': 16, 'rle': True},
+    'single_frames_rle': {'chunk_frames': 1, 'rle': True},
+}
+
+
+def calc_probabilities(data, frames, seed=0) -> np.ndarray:
+    images, masks = data_specs.load_frames(data, frames, seed=seed)
+    finder = model_specs.create_model('in_place')
+    probabilities = []
+    for image, mask in zip(images, masks):
+        probabilities.append(finder.calc_prob(image))
+        finder.update(image, mask)
+    return np.stack(probabilities)
+
+
+def measure_format(probabilities, path, chunk_frames, rle, seeks=20, seed=0) -> dict:
+    start = time.perf_counter()
+    with storage.ProbabilityWriter(path, chunk_frames=chunk_frames, rle=rle) as writer:
+        for probability in probabilities:
+            writer.write(probability)
+    write_seconds = time.perf_counter() - start
+
+    random = np.random.RandomState(seed)
+    with storage.ProbabilityReader(path) as reader:
+        start = time.perf_counter()
+        for frame_index in random.randint(0, len(reader), seeks):
+            reader._cached_chunk = None
+            reader[frame_index]
+        seek_seconds = (time.perf_counter() - start) / seeks
+
+        start = time.perf_counter()
+        for _ in reader:
+            pass
+        read_seconds = time.perf_counter() - start
+
+    return {
+        'bytes_per_frame': os.path.getsize(path) / len(probabilities),
+        'write_fps': len(probabilities) / write_seconds,
+        'read_fps': len(probabilities) / read_seconds,
+        'seek_ms': seek_seconds * 1000,
+    }
+
+
+def main(data='blobs_720p', frames=64):
+    probabilities = calc_probabilities(data, frames)
+    raw_bytes = probabilities[0].size * np.dtype(np.float64).itemsize
+    print(f"{data}, {frames} frames, float64 map {raw_bytes / 2 ** 20:.2f} MB per frame")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, parameters in FORMATS.items():
+            result = measure_format(probabilities, os.path.join(temp_dir, name), **parameters)
+            print(f"{name:>18}: {result['bytes_per_frame'] / 1024:8.1f} KB per frame "
+                  f"({raw_bytes / result['bytes_per_frame']:6.0f}x smaller), "
+                  f"write {result['write_fps']:6.1f} fps, read {result['read_fps']:6.1f} fps, "
+                  f"seek {result['seek_ms']:6.2f} ms")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,76 @@
+"""
+Cost of a parameter sweep of ForegroundFinder configurations over a video: sweep.run_sweep decoding every frame once
+compared to separate passes over the video, one per configuration.
+    python -m benchmark.sweep --data blobs_vga --frames 40
+"""
+import os
+import tempfile
+import time
+
+import fire
+import numpy as np
+
+from benchmark import data_specs, model_specs
+import see._commons.video as video
+import see.foreground
+import see.foreground.sweep as sweep
+
+GRID = {
+    'config_background_model.update_inertia': [5.0, 10.0, 20.0, 40.0],
+    'config_background_model.error_inertia': [5.0, 10.0, 20.0],
+    'cleaning.size': [3, 5],
+    'confident_size': [1, 3],
+}
+
+
+def measure_decode(path) -> float:
+    start = time.perf_counter()
+    for _ in video.read_frames(path):
+        pass
+    return time.perf_counter() - start
+
+
+def run_passes(configs, path, masks, warmup) -> float:
+    """
+    Returns:
+        time of processing the video once per configuration
+    """
+    start = time.perf_counter()
+    for config in configs:
+        finder = see.foreground.ForegroundFinder.create_from_dicts(**config)
+        for i, (frame, mask) in enumerate(zip(video.read_frames(path), masks)):
+            detected = finder.process(frame, mask) > 0.5
+            if i >= warmup:
+                np.count_nonzero(detected & mask)
+    return time.perf_counter() - start
+
+
+def main(data='blobs_vga', frames=40, warmup=10, workers=None, chunk_frames=16):
+    images, masks = data_specs.load_frames(data, frames)
+    configs = sweep.expand_grid(model_specs.get_model_spec('float32'), GRID)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "clip.avi")
+        with video.VideoWriter(path) as writer:
+            for image in images:
+                writer.write(image)
+        # the masks are compared with the decoded frames, the compression does not move the foreground
+        decode_seconds = measure_decode(path)
+
+        start = time.perf_counter()
+        results = sweep.run_sweep(configs, video.read_frames(path), masks, workers=workers,
+                                  chunk_frames=chunk_frames, warmup_frames=warmup)
+        sweep_seconds = time.perf_counter() - start
+        passes_seconds = run_passes(configs, path, masks, warmup)
+
+    compute_seconds = sum(result['frames'] / result['fps'] for result in results)
+    print(sweep.format_table(results[:10]))
+    print(f"{data}, {frames} frames, {len(configs)} configurations, {len(os.sched_getaffinity(0))} cpus")
+    print(f"{'decode once':>24}: {decode_seconds:7.2f} s")
+    print(f"{'compute (sum)':>24}: {compute_seconds:7.2f} s")
+    print(f"{'sweep':>24}: {sweep_seconds:7.2f} s")
+    print(f"{'pass per configuration':>24}: {passes_seconds:7.2f} s "
+          f"(sweep is {passes_seconds / sweep_seconds:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,56 @@
+"""
+Speedup of the tiled ForegroundFinder over the processing of the whole image for different numbers of threads.
+    python -m benchmark.tiling --height 2160 --width 3840
+"""
+import os
+import time
+
+import fire
+import numpy as np
+
+import see.foreground
+
+
+def create_finder(tiling=None):
+    return see.foreground.ForegroundFinder.create_from_dicts(
+        {'update_inertia': 10.0, 'error_inertia': 10.0, 'diff_method': 'rgb', 'in_place': True},
+        cleaning={'method': 'median', 'size': 5}, confident_size=3, tiling=tiling)
+
+
+def time_finder(finder, frames, masks) -> float:
+    finder.update(frames[0], masks[0])
+    start = time.perf_counter()
+    for frame, mask in zip(frames[1:], masks[1:]):
+        finder.calc_prob(frame)
+        finder.update(frame, mask)
+    return (time.perf_counter() - start) / (len(frames) - 1)
+
+
+def measure_tiling_speedup(height=2160, width=3840, threads=(1, 2, 4, 8), band_rows=256, frames=6, seed=0) -> list:
+    """
+    Returns:
+        list of results for the whole image (threads = 0) and for each of the numbers of threads
+    """
+    random = np.random.RandomState(seed)
+    background = random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    frame_stack = [np.clip(background + random.normal(0, 5, background.shape), 0, 255).astype(np.uint8)
+                   for _ in range(frames)]
+    masks = [random.random_sample((height, width)) > 0.9 for _ in range(frames)]
+
+    untiled_seconds = time_finder(create_finder(), frame_stack, masks)
+    results = [{'threads': 0, 'seconds': untiled_seconds, 'speedup': 1.0}]
+    for thread_count in threads:
+        seconds = time_finder(create_finder({'rows': band_rows, 'threads': thread_count}), frame_stack, masks)
+        results.append({'threads': thread_count, 'seconds': seconds, 'speedup': untiled_seconds / seconds})
+    return results
+
+
+def main(height=2160, width=3840, threads=(1, 2, 4, 8), band_rows=256, frames=6):
+    print(f"{height}x{width}, band of {band_rows} rows, {os.cpu_count()} cpus")
+    for result in measure_tiling_speedup(height, width, threads, band_rows, frames):
+        name = "whole image" if result['threads'] == 0 else f"{result['threads']} threads"
+        print(f"{name:>12}: {result['seconds'] * 1000:8.1f} ms/frame, speedup {result['speedup']:.2f}x")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
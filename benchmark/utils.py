@@ -0,0 +1,160 @@
+"""
+Measurement of the speed and memory of ForegroundFinder on the synthetic scenes.
+"""
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+import typing as t
+
+import numpy as np
+
+from benchmark import data_specs, model_specs
+
+
+def latency_summary(seconds: t.Sequence[float]) -> dict:
+    seconds = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(seconds) == 0:
+        return {'calls': 0, 'total_ms': 0.0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {'calls': len(seconds), 'total_ms': float(seconds.sum()), 'mean_ms': float(seconds.mean()),
+            'p50_ms': float(np.percentile(seconds, 50)), 'p99_ms': float(np.percentile(seconds, 99)),
+            'max_ms': float(seconds.max())}
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of this process so far.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_allocation_mb(function: t.Callable) -> float:
+    """
+    Peak memory allocated by Python and NumPy during the call.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def state_mb(finder) -> float:
+    if finder.regions is not None:
+        return sum(state_mb(region.finder) for region in finder.regions)
+    model = finder.static_background
+    names = ['background_mean', 'background_error', 'modes', 'background_mask']
+    arrays = [getattr(model, name, None) for name in names]
+    return sum(array.nbytes for array in arrays if array is not None) / 2 ** 20
+
+
+def run_case(data_name, model_name, frames=50, warmup=5, seed=0) -> dict:
+    """
+    Process the scene with the model, every frame is scored and then used for the update with the true mask.
+    Returns:
+        frames per second, latency percentiles of the whole frame and of each stage, peak memory
+    """
+    images, masks = data_specs.load_frames(data_name, frames + warmup, seed=seed)
+    finder = model_specs.create_model(model_name)
+    for image, mask in zip(images[:warmup], masks[:warmup]):
+        finder.process(image, mask)
+
+    finder.profiler.enabled = True
+    latencies = []
+    for image, mask in zip(images[warmup:], masks[warmup:]):
+        start = time.perf_counter()
+        finder.process(image, mask)
+        latencies.append(time.perf_counter() - start)
+    stages = finder.stats()
+    finder.profiler.enabled = False
+
+    allocation_mb = measure_allocation_mb(lambda: finder.process(images[-1], masks[-1]))
+    return {
+        'data': data_name,
+        'model': model_name,
+        'shape': list(images.shape[1:]),
+        'frames': frames,
+        'fps': frames / sum(latencies),
+        'latency': latency_summary(latencies),
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'allocation_per_frame_mb': allocation_mb,
+        'state_mb': state_mb(finder),
+    }
+
+
+def _run_case_in_queue(result_queue, args, kwargs):
+    result_queue.put(run_case(*args, **kwargs))
+
+
+def run_case_isolated(*args, **kwargs) -> dict:
+    """
+    Same as run_case but in a new process so that the peak memory is measured for this case only.
+    """
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_run_case_in_queue, args=(result_queue, args, kwargs))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def machine_info() -> dict:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def save_results(results: t.List[dict], output_dir, name=None) -> str:
+    """
+    Save results of one run as a json file named with the time of the run.
+    """
+    timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name or timestamp.replace(':', '-')}.json")
+    with open(path, "w") as file:
+        json.dump({'timestamp': timestamp, 'machine': machine_info(), 'results': results}, file, indent=2)
+    return path
+
+
+def load_results(output_dir) -> t.List[dict]:
+    """
+    Returns:
+        all runs saved in the directory ordered by time
+    """
+    runs = []
+    for path in glob.glob(os.path.join(output_dir, "*.json")):
+        with open(path) as file:
+            runs.append(json.load(file))
+    return sorted(runs, key=lambda run: run['timestamp'])
+
+
+def flatten_results(runs: t.List[dict]) -> t.List[dict]:
+    """
+    One row per run and case with the main numbers, convenient for pandas.
+    """
+    rows = []
+    for run in runs:
+        for result in run['results']:
+            row = {'timestamp': run['timestamp'], 'commit': run['machine'].get('commit'),
+                   'data': result['data'], 'model': result['model'], 'fps': result['fps'],
+                   'p50_ms': result['latency']['p50_ms'], 'p99_ms': result['latency']['p99_ms'],
+                   'peak_rss_mb': result['peak_rss_mb'], 'allocation_per_frame_mb': result['allocation_per_frame_mb'],
+                   'state_mb': result['state_mb']}
+            for stage, summary in result['stages'].items():
+                row[f"{stage}_ms"] = summary['mean_ms']
+            rows.append(row)
+    return rows
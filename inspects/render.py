@@ -0,0 +1,176 @@
+"""
+Rendering of the arrays with cv2 and numpy only, an alternative to utils.show_all when many frames are reviewed:
+montage grids, probability overlays and label maps written directly to image or video files.
+All images are RGB uint8.
+"""
+import functools
+import typing as t
+
+import cv2
+import numpy as np
+
+import see._commons.video as video
+
+LABEL_COLOURS = 20000
+
+
+@functools.lru_cache(maxsize=None)
+def get_label_colours(seed=0) -> np.ndarray:
+    """
+    Random colour for every label (the 'rand' cmap of utils.show_all), label 0 is black.
+    """
+    colours = np.random.RandomState(seed).randint(0, 256, (LABEL_COLOURS + 1, 3)).astype(np.uint8)
+    colours[0] = 0
+    return colours
+
+
+def get_colormap(cmap) -> int:
+    """
+    Args:
+        cmap: name of the OpenCV colormap e.g. 'jet', 'viridis', 'inferno'
+    """
+    colormap = getattr(cv2, 'COLORMAP_' + cmap.upper(), None)
+    if colormap is None:
+        raise NotImplementedError(cmap)
+    return colormap
+
+
+def scale_to_uint8(array, value_range=None) -> np.ndarray:
+    """
+    Scale the array to 0-255.
+    Args:
+        array: array of any numeric type
+        value_range: (min, max) mapped to (0, 255), if None the range of the array is used
+    """
+    if value_range is None:
+        if array.dtype == np.uint8:
+            return array
+        value_range = (float(array.min()), float(array.max()))
+    low, high = value_range
+    scale = 255 / (high - low) if high > low else 0
+    # values below the range would be mirrored by the absolute value of convertScaleAbs
+    array = np.maximum(array.astype(np.float32, copy=False), low)
+    return cv2.convertScaleAbs(array, alpha=scale, beta=-low * scale)
+
+
+def to_rgb(array, cmap='gray', value_range=None) -> np.ndarray:
+    """
+    Args:
+        array: RGB image (uint16 and uint32 are scaled by the maximum of the type, float by value_range) or 2D array
+        cmap: how the 2D array is coloured
+            - gray: grayscale
+            - rand: random colour for every integer label, 0 is black
+            - name of the OpenCV colormap e.g. jet, viridis
+        value_range: range of the 2D array mapped to the colours, if None the range of the array is used,
+            range of the float RGB image, if None (0, 1) as in matplotlib
+    """
+    if array.ndim == 3:
+        if array.dtype in (np.uint16, np.uint32):
+            array = (array / np.iinfo(array.dtype).max * 255).astype(np.uint8)
+        elif np.issubdtype(array.dtype, np.floating):
+            array = scale_to_uint8(array, value_range or (0, 1))
+        return array
+    if cmap == 'rand':
+        labels = array.astype(np.int64, copy=False)
+        indices = np.where(labels > 0, (labels - 1) % LABEL_COLOURS + 1, 0)
+        return get_label_colours()[indices]
+    gray = scale_to_uint8(array, value_range)
+    if cmap == 'gray':
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+    return cv2.cvtColor(cv2.applyColorMap(gray, get_colormap(cmap)), cv2.COLOR_BGR2RGB)
+
+
+def overlay(image, probability, alpha=0.5, cmap='jet') -> np.ndarray:
+    """
+    Colour the probability and blend it with the image.
+    Args:
+        image: RGB image
+        probability: float probability in [0, 1] or uint8 probability scaled to 0-255
+        alpha: weight of the coloured probability
+    """
+    colour = to_rgb(video.to_uint8(probability), cmap, value_range=(0, 255))
+    return cv2.addWeighted(image, 1 - alpha, colour, alpha, 0)
+
+
+def montage(arrays: t.Sequence[np.ndarray], cols=None, titles=None, cmap='gray', value_range=None,
+            tile_shape=None, gap=2) -> np.ndarray:
+    """
+    Arrange the arrays in a grid.
+    Args:
+        arrays: RGB images or 2D arrays
+        cols: number of columns, by default all arrays are in one row
+        titles: text written in the corner of every tile
+        cmap: cmap of each 2D array (see to_rgb), several separated by commas are used in turns
+        value_range: range of the 2D arrays mapped to the colours, if None the range of each array is used
+        tile_shape: (height, width) of the tiles, by default the shape of the first array
+        gap: number of black pixels between the tiles
+    """
+    cols = cols or len(arrays)
+    rows = (len(arrays) + cols - 1) // cols
+    height, width = tile_shape or arrays[0].shape[:2]
+    cmaps = [m.strip() for m in cmap.split(',')]
+    grid = np.zeros((rows * (height + gap) - gap, cols * (width + gap) - gap, 3), np.uint8)
+    for i, array in enumerate(arrays):
+        tile = to_rgb(array, cmaps[i % len(cmaps)], value_range)
+        if tile.shape[:2] != (height, width):
+            interpolation = cv2.INTER_NEAREST if array.ndim == 2 and cmaps[i % len(cmaps)] == 'rand' \
+                else cv2.INTER_AREA
+            tile = cv2.resize(tile, (width, height), interpolation=interpolation)
+        top, left = (i // cols) * (height + gap), (i % cols) * (width + gap)
+        grid[top:top + height, left:left + width] = tile
+        if titles is not None and i < len(titles) and titles[i]:
+            draw_title(grid[top:top + height, left:left + width], titles[i])
+    return grid
+
+
+def draw_title(image, title, scale=None):
+    """
+    Write the title in the top left corner, white with a black outline so it is readable on any background.
+    """
+    scale = scale or max(0.4, image.shape[0] / 600)
+    origin = (5, int(20 * scale) + 5)
+    cv2.putText(image, str(title), origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3, cv2.LINE_AA)
+    cv2.putText(image, str(title), origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 1, cv2.LINE_AA)
+
+
+def save_image(path, image):
+    if not cv2.imwrite(str(path), cv2.cvtColor(image, cv2.COLOR_RGB2BGR)):
+        raise IOError(f"Cannot write image {path}")
+
+
+def write_video(path, frames: t.Iterable[np.ndarray], fps=25.0) -> int:
+    """
+    Returns:
+        number of written frames
+    """
+    count = 0
+    with video.VideoWriter(path, fps=fps) as writer:
+        for frame in frames:
+            writer.write(frame)
+            count += 1
+    return count
+
+
+def review_frames(images: t.Iterable[np.ndarray], probabilities: t.Iterable[np.ndarray], scale=0.5,
+                  alpha=0.5, cmap='jet') -> t.Iterator[np.ndarray]:
+    """
+    Yields montages of the frame, its probability and their overlay, downscaled by scale.
+    """
+    for i, (image, probability) in enumerate(zip(images, probabilities)):
+        height, width = image.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        # everything is rendered at the size of the tiles
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        probability = cv2.resize(video.to_uint8(probability), size, interpolation=cv2.INTER_AREA)
+        yield montage([image, probability, overlay(image, probability, alpha, cmap)],
+                      titles=[f"frame {i}", "probability", "overlay"], cmap=cmap, value_range=(0, 255))
+
+
+def write_review_video(path, images: t.Iterable[np.ndarray], probabilities: t.Iterable[np.ndarray],
+                       fps=25.0, scale=0.5) -> int:
+    """
+    Render the processed clip as a review video (see review_frames).
+    Returns:
+        number of written frames
+    """
+    return write_video(path, review_frames(images, probabilities, scale), fps)
@@ -1,13 +1,24 @@
+import functools
 import os
 import sys
 from pathlib import Path
 
 import numpy as np
-from IPython.display import Markdown, display, HTML
-from matplotlib import pyplot as plt
-from matplotlib.colors import ListedColormap, NoNorm
 
-random_colormap = ListedColormap([(0, 0, 0)] + list(np.random.rand(20000, 3)))
+# IPython and matplotlib are imported on the first use so that importing the module stays cheap
+
+
+@functools.lru_cache(maxsize=None)
+def get_random_colormap():
+    from matplotlib.colors import ListedColormap
+    return ListedColormap([(0, 0, 0)] + list(np.random.rand(20000, 3)))
+
+
+def __getattr__(name):
+    if name == 'random_colormap':
+        return get_random_colormap()
+    raise AttributeError(f"module {__name__} has no attribute {name}")
+
 
 def add_root_to_path(steps_up):
     root_dir = Path(__file__)
@@ -54,6 +65,10 @@ def show_all(rows, cols, *args, display_now=True, **kwargs):
     Returns:
         matplotlib figure to show in notebook
     """
+    from IPython.display import display
+    from matplotlib import pyplot as plt
+    from matplotlib.colors import NoNorm
+
     scale = 30
     if 'scale' in kwargs:
         scale = kwargs['scale']
@@ -61,7 +76,6 @@ def show_all(rows, cols, *args, display_now=True, **kwargs):
     subtitles = kwargs.get("titles", [""])
 
     gray_cmaps = ['gray']
-    random_map = random_colormap
     normalization = [True]
     if 'cmap' in kwargs:
         gray_cmap_params = kwargs['cmap'].split(',')
@@ -71,7 +85,7 @@ def show_all(rows, cols, *args, display_now=True, **kwargs):
             is_rand = m.strip() == 'rand'
             normalization.append(not is_rand)
             if is_rand:
-                gray_cmaps.append(random_map)
+                gray_cmaps.append(get_random_colormap())
             else:
                 gray_cmaps.append(m)
 
@@ -114,8 +128,10 @@ def show_all(rows, cols, *args, display_now=True, **kwargs):
 
 
 def printmd(*text):
+    from IPython.display import Markdown, display
     display(Markdown(" ".join([str(t) for t in text])))
 
 
 def display_width(size_perc):
+    from IPython.display import HTML, display
     display(HTML("<style>.container { width:{0}% !important; }</style>".format(size_perc)))
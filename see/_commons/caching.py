@@ -0,0 +1,42 @@
+import collections
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    Small least recently used cache of values computed from images keyed by the identity of the image array.
+    Cached images are referenced so their identity is not reused and a copy of their pixels is compared
+    in full, so the arrays refilled in place (e.g. reused decoding buffers) are never served a stale value.
+    """
+    def __init__(self, frames=2):
+        self.frames = frames
+        self._entries = collections.OrderedDict()
+
+    def get(self, image):
+        entry = self._entries.get(id(image))
+        if entry is None:
+            return None
+        cached_image, cached_copy, value = entry
+        if cached_image is not image or not np.array_equal(cached_copy, image):
+            del self._entries[id(image)]
+            return None
+        self._entries.move_to_end(id(image))
+        return value
+
+    def put(self, image, value):
+        if self.frames <= 0:
+            return
+        self._entries[id(image)] = (image, np.array(image), value)
+        self._entries.move_to_end(id(image))
+        while len(self._entries) > self.frames:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        return {'frames': self.frames, '_entries': collections.OrderedDict()}
@@ -4,3 +4,12 @@ import numpy as np
 def multi_linear_mapping_2d(xs, lx, ly, rx, ry):
     ys = ly + (xs - lx) / np.maximum(rx - lx, 0.0001) * (ry - ly)
     return ys
+
+
+def piecewise_linear_mapping(xs, knots_x, knots_y, dtype=np.float64):
+    """
+    Maps xs in a single pass through the piecewise linear curve going through (knots_x, knots_y).
+    Values outside of the knots are mapped to the values of the edge knots.
+    """
+    ys = np.interp(xs, knots_x, knots_y)
+    return ys.astype(dtype, copy=False)
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+import typing as t
+
+_END = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {'name': self.name, 'items': self.items, 'busy_seconds': self.busy_seconds}
+
+
+class PipelineStats:
+    def __init__(self, stage_names):
+        self.stages = [StageStats(name) for name in stage_names]
+        self.frames = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def fps(self) -> float:
+        return self.frames / max(self.seconds, 1e-9)
+
+    def as_dict(self) -> dict:
+        return {'frames': self.frames, 'seconds': self.seconds, 'fps': self.fps,
+                'stages': [stage.as_dict() for stage in self.stages]}
+
+
+def run_pipeline(source: t.Iterable, stages: t.List[t.Tuple[str, t.Callable]], queue_size=8,
+                 report: t.Callable[[PipelineStats], None] = None, report_every=100) -> PipelineStats:
+    """
+    Run items from source through the stages, each stage in its own thread.
+    Stages are connected with bounded queues so a slow stage blocks the ones before it (back-pressure)
+    and stages that release the GIL (decoding, encoding, OpenCV, NumPy) overlap.
+    Args:
+        source: iterable of items, consumed in its own thread
+        stages: list of (name, function) applied in order, results of the last one are dropped
+        queue_size: maximum number of items waiting between two stages
+        report: called with the current stats every report_every items leaving the pipeline
+    Returns:
+        stats of the whole run, fps is measured end to end
+    """
+    stats = PipelineStats([name for name, _ in stages])
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def put(target, item):
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(source_queue):
+        while not stop.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def produce():
+        iterator = iter(source)
+        try:
+            for item in iterator:
+                if not put(queues[0], item):
+                    break
+            put(queues[0], _END)
+        except BaseException as e:
+            fail(e)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def consume(stage_index):
+        function = stages[stage_index][1]
+        stage_stats = stats.stages[stage_index]
+        is_last = stage_index == len(stages) - 1
+        try:
+            while True:
+                item = get(queues[stage_index])
+                if item is _END:
+                    if not is_last:
+                        put(queues[stage_index + 1], _END)
+                    return
+                start = time.perf_counter()
+                result = function(item)
+                stage_stats.busy_seconds += time.perf_counter() - start
+                stage_stats.items += 1
+                if is_last:
+                    stats.frames += 1
+                    if report is not None and stats.frames % report_every == 0:
+                        report(stats)
+                elif not put(queues[stage_index + 1], result):
+                    return
+        except BaseException as e:
+            fail(e)
+
+    threads = [threading.Thread(target=produce, name="pipeline-source", daemon=True)]
+    threads += [threading.Thread(target=consume, args=(i,), name=f"pipeline-{name}", daemon=True)
+                for i, (name, _) in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+    stats.finished = time.perf_counter()
+
+    if errors:
+        raise errors[0]
+    return stats
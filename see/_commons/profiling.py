@@ -0,0 +1,130 @@
+import threading
+import time
+import typing as t
+
+import numpy as np
+
+# edges of the latency histograms in milliseconds: 0.01 ms to ~10 s, four bins per octave
+HISTOGRAM_EDGES_MS = np.concatenate([[0], 0.01 * 2 ** (np.arange(81) / 4)])
+
+
+class _NoMeasure:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_MEASURE = _NoMeasure()
+
+
+class _Measure:
+    __slots__ = ('profiler', 'stage', 'start')
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _StageSamples:
+    def __init__(self, window):
+        self.latencies = np.zeros(window, dtype=np.float64)
+        self.calls = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.latencies[self.calls % len(self.latencies)] = seconds
+        self.calls += 1
+        self.total += seconds
+
+    def recent(self) -> np.ndarray:
+        return self.latencies[:min(self.calls, len(self.latencies))]
+
+
+class StageProfiler:
+    """
+    Per stage timers and call counters with latency histograms of the recent calls.
+    When disabled measure returns a shared no-op context so it costs only the call.
+    """
+    def __init__(self, enabled=False, window=1000, sink: t.Callable[[dict], None] = None, sink_period=10.0):
+        """
+        Args:
+            enabled: whether the stages are measured
+            window: number of the most recent calls of each stage used for percentiles and histograms
+            sink: called with stats at most every sink_period seconds (e.g. to push them to the monitoring)
+            sink_period: seconds between the calls of the sink
+        """
+        self.enabled = enabled
+        self.window = window
+        self.sink = sink
+        self.sink_period = sink_period
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._last_sink = time.perf_counter()
+
+    def measure(self, stage):
+        if not self.enabled:
+            return _NO_MEASURE
+        return _Measure(self, stage)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._stages.get(stage)
+            if samples is None:
+                samples = self._stages[stage] = _StageSamples(self.window)
+            samples.add(seconds)
+
+        if self.sink is not None:
+            now = time.perf_counter()
+            if now - self._last_sink >= self.sink_period:
+                self._last_sink = now
+                self.sink(self.stats())
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            for each stage: number of calls and total time since the reset,
+            mean, percentiles and histogram of the recent calls in milliseconds
+        """
+        with self._lock:
+            stages = {stage: (samples.calls, samples.total, samples.recent() * 1000)
+                      for stage, samples in self._stages.items()}
+        result = {}
+        for stage, (calls, total, recent_ms) in stages.items():
+            counts, _ = np.histogram(recent_ms, bins=HISTOGRAM_EDGES_MS)
+            non_zero = np.nonzero(counts)[0]
+            result[stage] = {
+                'calls': calls,
+                'total_ms': total * 1000,
+                'mean_ms': float(recent_ms.mean()),
+                'p50_ms': float(np.percentile(recent_ms, 50)),
+                'p90_ms': float(np.percentile(recent_ms, 90)),
+                'p99_ms': float(np.percentile(recent_ms, 99)),
+                'max_ms': float(recent_ms.max()),
+                'histogram': {'edges_ms': HISTOGRAM_EDGES_MS[non_zero[0]:non_zero[-1] + 2].tolist(),
+                              'counts': counts[non_zero[0]:non_zero[-1] + 1].tolist()},
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['sink'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
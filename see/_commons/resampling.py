@@ -0,0 +1,36 @@
+import typing as t
+
+import cv2
+import numpy as np
+
+
+def scaled_size(shape, scale) -> t.Tuple[int, int]:
+    """
+    Returns:
+        (width, height) of the image of the given shape resized by the scale, as expected by cv2.resize
+    """
+    height, width = shape[:2]
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def downscale(image, size) -> np.ndarray:
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def downscale_mask(mask, size) -> np.ndarray:
+    """
+    Pixel of the downscaled mask is set if any of the pixels it covers is set.
+    """
+    # 0 / 255 so that a single set pixel does not round to zero in the average
+    return cv2.resize(mask.view(np.uint8) * np.uint8(255), size, interpolation=cv2.INTER_AREA) > 0
+
+
+def upscale(image, size) -> np.ndarray:
+    return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+
+def source_coordinates(positions, source_length, target_length) -> np.ndarray:
+    """
+    Positions of the pixel centres of the target in the source coordinates, same as used by cv2.resize.
+    """
+    return (positions + 0.5) * (source_length / target_length) - 0.5
@@ -0,0 +1,39 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """
+    Fixed number of slots for arrays of the same shape and type kept in shared memory,
+    so that frames can be passed between processes without pickling.
+    """
+    def __init__(self, slots, shape, dtype, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, slots * int(np.prod(self.shape)) * self.dtype.itemsize)
+        self._owner = name is None
+        self._memory = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self._array = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self._memory.buf)
+
+    @property
+    def description(self) -> tuple:
+        return self._memory.name, self.slots, self.shape, self.dtype.str
+
+    @staticmethod
+    def attach(description) -> 'SharedFrameRing':
+        name, slots, shape, dtype = description
+        return SharedFrameRing(slots, shape, dtype, name=name)
+
+    def __getitem__(self, slot) -> np.ndarray:
+        return self._array[slot]
+
+    def __setitem__(self, slot, value):
+        self._array[slot] = value
+
+    def close(self):
+        self._array = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
@@ -0,0 +1,96 @@
+import concurrent.futures
+import typing as t
+
+import cv2
+import numpy as np
+
+
+def split_rows(height, band_rows) -> t.List[slice]:
+    """
+    Split rows of the image into horizontal bands of at most band_rows rows.
+    """
+    return [slice(start, min(start + band_rows, height)) for start in range(0, height, band_rows)]
+
+
+def with_halo(rows: slice, halo, height) -> t.Tuple[slice, slice]:
+    """
+    Extend the band with halo rows on both sides (clipped to the image).
+    Returns:
+        rows of the extended band and the position of the original band inside of it
+    """
+    start = max(0, rows.start - halo)
+    stop = min(height, rows.stop + halo)
+    return slice(start, stop), slice(rows.start - start, rows.stop - start)
+
+
+def mask_from_polygons(shape, polygons) -> np.ndarray:
+    """
+    Args:
+        shape: (H, W) of the mask
+        polygons: list of polygons, each a list of (x, y) points
+    Returns:
+        bool mask of the pixels inside of the polygons
+    """
+    mask = np.zeros(shape[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, [np.round(polygon).astype(np.int32).reshape(-1, 1, 2) for polygon in polygons], 1)
+    return mask.astype(bool)
+
+
+def crop_boxes(mask, halo=0) -> t.List[t.Tuple[slice, slice]]:
+    """
+    Bounding boxes of the connected areas of the mask extended with halo pixels on all sides (clipped to the mask),
+    the overlapping ones are merged so that each pixel is in at most one box.
+    Returns:
+        (rows, columns) slices of the boxes ordered by their top left corner
+    """
+    height, width = mask.shape[:2]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    boxes = [[max(0, top - halo), max(0, left - halo), min(height, top + box_height + halo),
+              min(width, left + box_width + halo)]
+             for left, top, box_width, box_height, _ in stats[1:count]]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                first, second = boxes[i], boxes[j]
+                if first[0] < second[2] and second[0] < first[2] and first[1] < second[3] and second[1] < first[3]:
+                    boxes[i] = [min(first[0], second[0]), min(first[1], second[1]),
+                                max(first[2], second[2]), max(first[3], second[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [(slice(top, bottom), slice(left, right)) for top, left, bottom, right in sorted(boxes)]
+
+
+class BandExecutor:
+    """
+    Thread pool processing bands of the image, OpenCV and NumPy release the GIL so the bands run in parallel.
+    """
+    def __init__(self, band_rows=256, threads=4):
+        self.band_rows = band_rows
+        self.threads = threads
+        self._pool = None
+
+    def map(self, function: t.Callable[[slice], t.Any], height) -> list:
+        """
+        Call function for each of the bands of the image with given height, returns the results in order.
+        """
+        bands = split_rows(height, self.band_rows)
+        if self.threads <= 1 or len(bands) == 1:
+            return [function(rows) for rows in bands]
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix="band")
+        return list(self._pool.map(function, bands))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
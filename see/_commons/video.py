@@ -0,0 +1,79 @@
+import typing as t
+
+import cv2
+import numpy as np
+
+
+def read_frames(path) -> t.Iterator[np.ndarray]:
+    """
+    Yields RGB uint8 frames of the video.
+    """
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video {path}")
+    try:
+        while True:
+            success, frame = capture.read()
+            if not success:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def read_masks(path, threshold=127) -> t.Iterator[np.ndarray]:
+    """
+    Yields boolean masks from the video, pixels brighter than the threshold are set.
+    """
+    for frame in read_frames(path):
+        yield cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) > threshold
+
+
+def read_fps(path, default=25.0) -> float:
+    capture = cv2.VideoCapture(str(path))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps > 0 else default
+
+
+def to_uint8(probability: np.ndarray) -> np.ndarray:
+    """
+    Scale probability in [0, 1] to 0-255, uint8 probability is already scaled.
+    """
+    if probability.dtype == np.uint8:
+        return probability
+    return (probability * 255 + 0.5).astype(np.uint8)
+
+
+class VideoWriter:
+    """
+    Writes RGB or grayscale uint8 frames, the video is opened with the size of the first frame.
+    """
+    def __init__(self, path, fps=25.0, fourcc='MJPG'):
+        self.path = str(path)
+        self.fps = fps
+        self.fourcc = fourcc
+        self._writer = None
+
+    def write(self, frame: np.ndarray):
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+            if not self._writer.isOpened():
+                raise IOError(f"Cannot open video writer {self.path}")
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        else:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        self._writer.write(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
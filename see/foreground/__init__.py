@@ -1,2 +1,2 @@
-from .backgrounds import StaticBackgroundModel
+from .backgrounds import MixtureBackgroundModel, StaticBackgroundModel
 from .finder import ForegroundFinder
\ No newline at end of file
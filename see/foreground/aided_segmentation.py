@@ -2,7 +2,8 @@ from abc import abstractmethod, ABC
 
 import numpy as np
 
-import vendor.SEP.sep as sep
+import see._commons.pipeline as pipeline
+import see._commons.video as video
 
 
 class AidedSegmentation(ABC):
@@ -14,6 +15,63 @@ class AidedSegmentation(ABC):
     def calc_prob(self, image) -> np.ndarray:
         pass
 
+    def process(self, image, rough_foreground_mask=None, threshold=0.5) -> np.ndarray:
+        """
+        Calculate the foreground probability of the image and then update the model with it.
+        Args:
+            image: image to process
+            rough_foreground_mask: foreground mask used for the update,
+                if None the pixels with the probability above threshold are used
+            threshold: probability above which the pixel is considered foreground
+        """
+        probability = self.calc_prob(image)
+        if rough_foreground_mask is None:
+            rough_foreground_mask = self.foreground_mask(probability, threshold)
+        self.update(image, rough_foreground_mask)
+        return probability
 
-def run_on_video(video_path, aided_segmentator: AidedSegmentation, output_path):
-    video_loader = MovieLoader
\ No newline at end of file
+    @staticmethod
+    def foreground_mask(probability, threshold=0.5) -> np.ndarray:
+        """
+        Args:
+            probability: float probability in [0, 1] or uint8 probability scaled to 0-255
+            threshold: probability above which the pixel is considered foreground
+        Returns:
+            mask of the pixels with the probability above the threshold
+        """
+        if probability.dtype == np.uint8:
+            threshold = np.rint(threshold * 255)
+        return probability > threshold
+
+
+def run_on_video(video_path, aided_segmentator: AidedSegmentation, output_path,
+                 mask_path=None, threshold=0.5, queue_size=8, report=None, report_every=100) -> pipeline.PipelineStats:
+    """
+    Run the segmentation over the video and save the foreground probability as a grayscale video.
+    Decoding, segmentation and encoding run as separate threads connected with bounded queues.
+    Args:
+        video_path: path to the input video
+        aided_segmentator: segmentation to run
+        output_path: path to the output video
+        mask_path: optional video with rough foreground masks used to update the model,
+            if None the thresholded probability is used
+        threshold: probability above which the pixel is considered foreground
+        queue_size: maximum number of frames waiting between the stages
+        report: called with pipeline stats every report_every frames
+    Returns:
+        pipeline stats with the end to end fps
+    """
+    frames = video.read_frames(video_path)
+    if mask_path is not None:
+        source = zip(frames, video.read_masks(mask_path))
+    else:
+        source = ((frame, None) for frame in frames)
+
+    def segment(item):
+        image, rough_foreground_mask = item
+        return aided_segmentator.process(image, rough_foreground_mask, threshold=threshold)
+
+    with video.VideoWriter(output_path, fps=video.read_fps(video_path)) as writer:
+        stages = [("segment", segment),
+                  ("encode", lambda probability: writer.write(video.to_uint8(probability)))]
+        return pipeline.run_pipeline(source, stages, queue_size=queue_size, report=report, report_every=report_every)
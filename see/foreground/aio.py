@@ -0,0 +1,169 @@
+"""
+asyncio adapter of AidedSegmentation: the computation runs in an executor so that the event loop is not blocked.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import typing as t
+
+import numpy as np
+
+import see._commons.video as video
+from see.foreground.aided_segmentation import AidedSegmentation
+
+POLICIES = ('block', 'drop_oldest')
+
+FrameResult = collections.namedtuple('FrameResult', ['index', 'probability'])
+
+_END = object()
+
+
+class AsyncSegmentation:
+    """
+    Wraps the segmentation of one stream, calls are executed one at a time in the order they were made
+    so the state of the stream stays consistent while different streams can share the executor.
+    """
+    def __init__(self, segmentation: AidedSegmentation, executor: concurrent.futures.Executor = None,
+                 queue_size=4, policy='block', threshold=0.5):
+        """
+        Args:
+            segmentation: segmentation of the stream
+            executor: executor running the computation, if None the default executor of the loop is used
+            queue_size: maximum number of frames waiting for the computation in run
+            policy: what run does when the queue is full
+                - block: wait (the source is not read until there is space)
+                - drop_oldest: drop the oldest waiting frame
+            threshold: probability above which the pixel is considered foreground if no mask is given
+        """
+        if policy not in POLICIES:
+            raise NotImplementedError(policy)
+        self.segmentation = segmentation
+        self.executor = executor
+        self.queue_size = queue_size
+        self.policy = policy
+        self.threshold = threshold
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self._queue = None
+        self._lock = None
+
+    async def calc_prob(self, image) -> np.ndarray:
+        return await self._call(self.segmentation.calc_prob, image)
+
+    async def update(self, image, rough_foreground_mask):
+        await self._call(self.segmentation.update, image, rough_foreground_mask)
+
+    async def process(self, image, rough_foreground_mask=None) -> np.ndarray:
+        return await self._call(self.segmentation.process, image, rough_foreground_mask, self.threshold)
+
+    async def run(self, source: t.AsyncIterable) -> t.AsyncIterator[FrameResult]:
+        """
+        Process the frames from the source and yield their probabilities, the source is read concurrently.
+        Args:
+            source: async iterable of images or (image, rough_foreground_mask) pairs
+        Yields:
+            index of the frame in the source and its foreground probability
+        """
+        self._queue = collections.deque()
+        changed = asyncio.Condition()
+        reader = asyncio.ensure_future(self._read(source, changed))
+        try:
+            while True:
+                async with changed:
+                    await changed.wait_for(lambda: self._queue)
+                    item = self._queue.popleft()
+                    changed.notify_all()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                index, (image, rough_foreground_mask) = item
+                probability = await self.process(image, rough_foreground_mask)
+                self.processed += 1
+                yield FrameResult(index, probability)
+        finally:
+            reader.cancel()
+            self._queue = None
+
+    def metrics(self) -> dict:
+        return {'queue_depth': len(self._queue or ()), 'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted, 'processed': self.processed, 'dropped': self.dropped}
+
+    async def _read(self, source, changed):
+        queue = self._queue
+        try:
+            index = 0
+            async for item in source:
+                if not isinstance(item, tuple):
+                    item = (item, None)
+                async with changed:
+                    if self.policy == 'block':
+                        await changed.wait_for(lambda: len(queue) < self.queue_size)
+                    elif len(queue) >= self.queue_size:
+                        queue.popleft()
+                        self.dropped += 1
+                    queue.append((index, item))
+                    self.submitted += 1
+                    self.max_queue_depth = max(self.max_queue_depth, len(queue))
+                    changed.notify_all()
+                index += 1
+            ending = _END
+        except Exception as error:
+            ending = error
+        async with changed:
+            queue.append(ending)
+            changed.notify_all()
+
+    async def _call(self, function, *args):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+async def video_frames(path, mask_path=None, executor: concurrent.futures.Executor = None) -> t.AsyncIterator:
+    """
+    Yields frames of the video (or (frame, mask) pairs with mask_path) decoded in the executor.
+    """
+    frames = video.read_frames(path)
+    if mask_path is not None:
+        frames = zip(frames, video.read_masks(mask_path))
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(executor, next, frames, _END)
+        if item is _END:
+            break
+        yield item
+
+
+async def raw_frames(reader: asyncio.StreamReader, shape, dtype=np.uint8) -> t.AsyncIterator[np.ndarray]:
+    """
+    Yields frames of the given shape sent as raw bytes one after another (e.g. over a socket) until the end of stream.
+    """
+    frame_size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    while True:
+        try:
+            data = await reader.readexactly(frame_size)
+        except asyncio.IncompleteReadError as error:
+            if error.partial:
+                raise
+            break
+        yield np.frombuffer(data, dtype=dtype).reshape(shape)
+
+
+async def write_video(results: t.AsyncIterable[FrameResult], path, fps=25.0,
+                      executor: concurrent.futures.Executor = None) -> int:
+    """
+    Encode the probabilities as a grayscale video in the executor.
+    Returns:
+        number of written frames
+    """
+    loop = asyncio.get_running_loop()
+    written = 0
+    with video.VideoWriter(path, fps=fps) as writer:
+        async for result in results:
+            await loop.run_in_executor(executor, writer.write, video.to_uint8(result.probability))
+            written += 1
+    return written
@@ -1,78 +1,646 @@
+import json
+import os
+import shutil
+import threading
 import typing as t
 
 import cv2
 import numpy as np
 
+import see.foreground.differences as differences
 
-class StaticBackgroundModel:
+
+class _CheckpointedModel:
+    """
+    Checkpoints of the background models: directories with the CHECKPOINT_ARRAYS of the state in .npy files
+    and model.json with the config, the models define _restored (called after the arrays are loaded)
+    and _drift (difference of the state from the saved model).
+    """
+    CHECKPOINT_FORMAT = None
+    CHECKPOINT_VERSION = 1
+    CHECKPOINT_ARRAYS = ()
+
+    def save(self, path, min_drift=None, wait=True) -> bool:
+        """
+        Save the state of the model as a checkpoint directory with the arrays in .npy files which can be memory mapped.
+        Args:
+            path: checkpoint directory, replaced if exists
+            min_drift: if set and the checkpoint exists, save only if the state has drifted from it more than this
+                (see _drift of the model)
+            wait: if False the state is copied and written in the background thread,
+                the next save waits for it to finish and raises its error if it failed
+        Returns:
+            whether the checkpoint was written
+        """
+        path = str(path)
+        if self._saving is not None:
+            self._saving.join()
+            self._saving = None
+            error, self._saving_error = self._saving_error, None
+            if error is not None:
+                raise error
+
+        state = self._checkpoint_state()
+        if min_drift is not None and not self._empty(state) and self._checkpoint_drift(path) < min_drift:
+            return False
+
+        if wait:
+            self._write_checkpoint(path, state)
+        else:
+            state = {name: None if array is None else array.copy() for name, array in state.items()}
+            self._saving = threading.Thread(target=self._write_in_background, args=(path, state), daemon=True)
+            self._saving.start()
+        return True
+
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        """
+        Restore the model from the checkpoint directory.
+        Args:
+            path: checkpoint directory
+            mmap_mode: how the arrays are mapped (see np.load), with the default copy on write mode restoring is
+                instant and the checkpoint is never modified, None reads everything into memory
+        """
+        with open(os.path.join(str(path), "model.json")) as file:
+            description = json.load(file)
+        if description.get('format') != cls.CHECKPOINT_FORMAT:
+            raise ValueError(f"{path} is not a checkpoint of {cls.__name__}")
+        if description['version'] > cls.CHECKPOINT_VERSION:
+            raise ValueError(f"unsupported checkpoint version {description['version']}")
+
+        model = cls(**description['config'])
+        if description['empty']:
+            return model
+        for name in cls.CHECKPOINT_ARRAYS:
+            setattr(model, name, np.load(os.path.join(str(path), name + ".npy"), mmap_mode=mmap_mode))
+        model._restored()
+        return model
+
+    def _checkpoint_drift(self, path) -> float:
+        try:
+            saved = type(self).load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return np.inf
+        state, saved_state = self._checkpoint_state(), saved._checkpoint_state()
+        if self._empty(saved_state) or any(saved_state[name].shape != state[name].shape for name in state):
+            return np.inf
+        return self._drift(saved)
+
+    def _checkpoint_state(self) -> dict:
+        return {name: getattr(self, name) for name in self.CHECKPOINT_ARRAYS}
+
+    @staticmethod
+    def _empty(state) -> bool:
+        return any(array is None for array in state.values())
+
+    def _write_in_background(self, path, state):
+        try:
+            self._write_checkpoint(path, state)
+        except Exception as error:
+            self._saving_error = error
+
+    def _write_checkpoint(self, path, state):
+        temp_path = path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        for name, array in state.items():
+            if array is not None:
+                saved = np.lib.format.open_memmap(os.path.join(temp_path, name + ".npy"), mode='w+',
+                                                  dtype=array.dtype, shape=array.shape)
+                saved[...] = array
+                saved.flush()
+                del saved
+        description = {'format': self.CHECKPOINT_FORMAT, 'version': self.CHECKPOINT_VERSION,
+                       'config': self.config, 'empty': self._empty(state)}
+        with open(os.path.join(temp_path, "model.json"), "w") as file:
+            json.dump(description, file, indent=2)
+
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_saving'] = None
+        state['_saving_error'] = None
+        return state
+
+
+class StaticBackgroundModel(_CheckpointedModel):
+    CHECKPOINT_FORMAT = "see.StaticBackgroundModel"
+    CHECKPOINT_VERSION = 1
+    CHECKPOINT_ARRAYS = ('background_mean', 'background_error', 'background_mask')
     UNKNOWN_PIXEL = (128, 128, 128)
     UNKNOWN_PIXEL_ERROR = 64
+    PRECISIONS = {'float64': np.float64, 'float32': np.float32, 'fixed16': np.uint16}
+    # fixed16 stores the values multiplied by FIXED_SCALE (8 fractional bits)
+    FIXED_SCALE = 256
 
-    def __init__(self, update_inertia=None, error_inertia=None, diff_method=None):
+    def __init__(self, update_inertia=None, error_inertia=None, diff_method=None,
+                 in_place=False, precision='float64'):
         """
         Args:
             update_inertia [0-inf): the more the more time has to pass for background to adapt
             error_inertia [0-inf): the more the longer it takes to the error to adapt
-            diff_method:
+            diff_method: name of the method registered in see.foreground.differences
                 - rgb (simple average of red, green, blue)
-                - rgs (red, green, lightness)
+                - rgs (red and green chromaticity, lightness)
+            in_place: update the state with masked running averages written directly into
+                preallocated arrays so that no memory is allocated per frame
+            precision: type of the state arrays:
+                - float64
+                - float32 (half of the memory, differences below 1e-4 of the pixel value)
+                - fixed16 (quarter of the memory, uint16 fixed point with 8 fractional bits, updated only on the
+                  background pixels with round to nearest, in_place is ignored),
+                  values are within 1/512 of a pixel level after each update but the mean stops following
+                  changes smaller than (1 + inertia) / 512 levels, get and get_details return float32 copies
         """
+        if precision not in self.PRECISIONS:
+            raise NotImplementedError(precision)
         self.background_mean = None
         self.background_error = None
         self.background_mask = None
-        self.config = {"update_inertia" : update_inertia, "error_inertia": error_inertia, "diff_method": diff_method}
+        self.config = {"update_inertia" : update_inertia, "error_inertia": error_inertia, "diff_method": diff_method,
+                       "in_place": in_place, "precision": precision}
+        self._buffers = None
+        self._saving = None
+        self._saving_error = None
+
+    @property
+    def dtype(self):
+        return self.PRECISIONS[self.config['precision']]
 
     def update(self, image: np.ndarray, background_mask: np.ndarray):
         assert image.ndim == 3 and image.dtype == np.uint8, f"incorrect ndim={image.ndim}, dtype={image.dtype}"
         assert background_mask.dtype == np.bool, f"dtype={image.dtype}"
 
         if self.background_mask is None:
-            self.background_mean = image.copy().astype(np.float)
+            scale = self.FIXED_SCALE if self._fixed else 1
+            self.background_mean = image.astype(self.dtype) * self.dtype(scale)
             self.background_mask = background_mask.copy()
             # TODO return only when the error is sensible (at least two values)
-            self.background_error = np.ones(background_mask.shape, dtype=np.float) * self.UNKNOWN_PIXEL_ERROR
-            self.background_error[background_mask] = 1
+            self.background_error = np.full(background_mask.shape, self.UNKNOWN_PIXEL_ERROR * scale, dtype=self.dtype)
+            self.background_error[background_mask] = scale
+            if self.config['in_place'] and not self._fixed:
+                self._allocate_buffers()
         else:
-            new_background_areas = background_mask > self.background_mask
-            self.background_mean[new_background_areas] = image[new_background_areas]
-            self.background_mask = background_mask | self.background_mask
-
-            update_inertia = self.config['update_inertia']
-            self.background_mean[background_mask] = \
-                (update_inertia * self.background_mean[background_mask]
-                 + image[background_mask]) / (1 + update_inertia)
-
-            error_inertia = self.config['error_inertia']
-            new_diff = self.calc_diff(self.background_mean, image)
-            self.background_error[new_background_areas] = np.maximum(1, new_diff[new_background_areas])  # it should never be zero
-            self.background_error[background_mask] = \
-                (error_inertia * self.background_error[background_mask]
-                 + new_diff[background_mask]) / (1 + error_inertia)
-
-    def get(self) -> t.Optional[np.ndarray]:
+            self._update_rows(image, background_mask, slice(None))
+
+    def update_rows(self, image: np.ndarray, background_mask: np.ndarray, rows: slice, frames=1):
+        """
+        Update only the given rows of the model, image and background_mask contain just these rows.
+        Updates of different rows are independent so they can run in parallel.
+        The model has to be already initialized with the full image.
+        Args:
+            frames: number of frames since the last update of the rows, the update has the weight
+                of that many updates with the same image so that skipped frames do not slow down the adaptation
+        """
+        assert image.ndim == 3 and image.dtype == np.uint8, f"incorrect ndim={image.ndim}, dtype={image.dtype}"
+        assert self.background_mask is not None, "model has to be initialized with the full image"
+        self._update_rows(image, background_mask, rows, frames)
+
+    def _update_rows(self, image, background_mask, rows, frames=1):
+        if self._fixed:
+            self._update_fixed(image, background_mask, rows, frames)
+            return
+        if self.config['in_place']:
+            self._update_in_place(image, background_mask, rows, frames)
+            return
+
+        background_mean = self.background_mean[rows]
+        background_error = self.background_error[rows]
+        known_mask = self.background_mask[rows]
+
+        new_background_areas = background_mask > known_mask
+        background_mean[new_background_areas] = image[new_background_areas]
+        known_mask |= background_mask
+
+        update_inertia = self._inertia('update_inertia', frames)
+        background_mean[background_mask] = \
+            (update_inertia * background_mean[background_mask]
+             + image[background_mask]) / (1 + update_inertia)
+
+        error_inertia = self._inertia('error_inertia', frames)
+        new_diff = self.calc_diff(background_mean, image)
+        if frames != 1:
+            new_diff *= self._diff_scale(frames)
+        background_error[new_background_areas] = np.maximum(1, new_diff[new_background_areas])  # it should never be zero
+        background_error[background_mask] = \
+            (error_inertia * background_error[background_mask]
+             + new_diff[background_mask]) / (1 + error_inertia)
+
+    def update_batch(self, images: np.ndarray, background_masks: np.ndarray):
+        """
+        Same as calling update for each of the images in order.
+        Args:
+            images: (N, H, W, 3) uint8 stack of images
+            background_masks: (N, H, W) bool stack of masks
+        """
+        assert images.ndim == 4 and images.dtype == np.uint8, f"incorrect ndim={images.ndim}, dtype={images.dtype}"
+        assert background_masks.shape == images.shape[:3], f"shape={background_masks.shape}"
+        for image, background_mask in zip(images, background_masks):
+            self.update(image, background_mask)
+
+    def get(self, step=1) -> t.Optional[np.ndarray]:
+        """
+        Args:
+            step: only every step-th pixel in both directions is returned
+        """
         if self.background_mean is None:
             return None
-        res = self.background_mean.copy()
-        res[self.background_mask == 0] = self.UNKNOWN_PIXEL
+        background_mean = self.background_mean[::step, ::step]
+        res = self._dequantize(background_mean) if self._fixed else background_mean.copy()
+        res[self.background_mask[::step, ::step] == 0] = self.UNKNOWN_PIXEL
         return res
 
-    def get_details(self) -> t.Optional[dict]:
+    def get_details(self, step=1) -> t.Optional[dict]:
+        """
+        Args:
+            step: only every step-th pixel in both directions is returned
+        """
         if self.background_mean is None:
             return None
-        return {'background': self.background_mean, 'error': self.background_error, 'mask': self.background_mask}
+        background_mean = self.background_mean[::step, ::step]
+        background_error = self.background_error[::step, ::step]
+        background_mask = self.background_mask[::step, ::step]
+        if self._fixed:
+            return {'background': self._dequantize(background_mean),
+                    'error': self._dequantize(background_error), 'mask': background_mask}
+        return {'background': background_mean, 'error': background_error, 'mask': background_mask}
 
     def reset(self):
         self.background_mean = None
         self.background_error = None
         self.background_mask = None
+        self._buffers = None
+
+    def _restored(self):
+        if self.config['in_place']:
+            self._allocate_buffers()
+
+    def _drift(self, saved) -> float:
+        details, saved_details = self.get_details(), saved.get_details()
+        return max(np.abs(details['background'] - saved_details['background']).mean(),
+                   np.abs(details['error'] - saved_details['error']).mean())
+
+    def calc_diff(self, image1, image2, method=None, out=None) -> np.ndarray:
+        """
+        Returns:
+            (H, W) float32 difference of the images (uint8 or float) by the diff_method (see differences)
+        """
+        return differences.calc_diff(image1, image2, method or self.config['diff_method'], out=out)
 
-    def calc_diff(self, image1, image2, method=None) -> np.ndarray:
+    def calc_diff_batch(self, images, image, method=None) -> np.ndarray:
+        """
+        Difference of each of the images (N, H, W, 3) to the single image (H, W, 3), same as calc_diff for each.
+        """
         method = method or self.config['diff_method']
-        if method == 'rgb':
-            diff_per_channel = cv2.absdiff(image1.astype(np.int8), image2.astype(np.int8))
-            mean_diff_per_pixel = np.mean(diff_per_channel, axis=-1)
-            return mean_diff_per_pixel
-        elif method == 'rgs':
-            raise NotImplementedError(method)
+        mean_diff_per_pixel = np.empty(images.shape[:-1], dtype=np.float32)
+        work = np.empty(images.shape[1:], dtype=np.float32)
+        for one_image, one_diff in zip(images, mean_diff_per_pixel):
+            differences.calc_diff(one_image, image, method, out=one_diff, work=work)
+        return mean_diff_per_pixel
+
+    def _allocate_buffers(self):
+        shape = self.background_mean.shape
+        self._buffers = {
+            'new_areas': np.zeros(shape[:2], dtype=np.bool),
+            'diff_work': np.zeros(shape, dtype=np.float32),
+            'diff': np.zeros(shape[:2], dtype=np.float32),
+        }
+
+    def _update_in_place(self, image, background_mask, rows, frames=1):
+        """
+        Same update as the default one but expressed as masked running averages:
+            mean = (inertia * mean + image) / (1 + inertia) = (1 - alpha) * mean + alpha * image
+        where alpha = 1 / (1 + inertia), so that cv2.accumulateWeighted can do it in place.
+        """
+        background_mean = self.background_mean[rows]
+        background_error = self.background_error[rows]
+        known_mask = self.background_mask[rows]
+
+        new_background_areas = np.greater(background_mask, known_mask, out=self._buffers['new_areas'][rows])
+        np.copyto(background_mean, image, where=new_background_areas[..., np.newaxis])
+        np.logical_or(background_mask, known_mask, out=known_mask)
+
+        mask = background_mask.view(np.uint8)
+        update_alpha = 1 / (1 + self._inertia('update_inertia', frames))
+        cv2.accumulateWeighted(image, background_mean, update_alpha, mask=mask)
+
+        error_alpha = 1 / (1 + self._inertia('error_inertia', frames))
+        new_diff = self._calc_diff_in_place(background_mean, image, rows)
+        if frames != 1:
+            new_diff *= self._diff_scale(frames)
+        np.copyto(background_error, new_diff, where=new_background_areas)
+        np.maximum(background_error, 1, out=background_error, where=new_background_areas)
+        cv2.accumulateWeighted(new_diff, background_error, error_alpha, mask=mask)
+
+    def _inertia(self, name, frames):
+        """
+        Inertia of the update with the weight of the given number of updates with the same image:
+        the remaining weight of the old value is (inertia / (1 + inertia)) ** frames.
+        """
+        inertia = self.config[name]
+        if frames == 1:
+            return inertia
+        remaining = (inertia / (1 + inertia)) ** frames
+        return remaining / (1 - remaining)
+
+    def _diff_scale(self, frames) -> float:
+        """
+        The error is updated with the difference to the already updated mean which is closer to the image
+        when the update has the weight of several frames, the scale makes it as large as after one frame update.
+        """
+        inertia = self.config['update_inertia']
+        return (inertia / (1 + inertia)) ** (1 - frames) if inertia > 0 else 1.0
+
+    @property
+    def _fixed(self):
+        return self.config['precision'] == 'fixed16'
+
+    def _dequantize(self, array) -> np.ndarray:
+        return np.multiply(array, 1 / self.FIXED_SCALE, dtype=np.float32)
+
+    @staticmethod
+    def _round_step(current, target, alpha):
+        """
+        Running average step of the fixed point values (as float32, in place) rounded to nearest
+        (half away from zero) so that rounding does not push the values in one direction.
+        """
+        step = np.subtract(target, current)
+        np.multiply(step, alpha, out=step)
+        np.trunc(step + np.copysign(np.float32(0.5), step), out=step)
+        current += step
+
+    def _update_fixed(self, image, background_mask, rows, frames=1):
+        """
+        Same update as the default one computed in float32 and stored as fixed point on the background pixels.
+        """
+        background_mean = self.background_mean[rows]
+        background_error = self.background_error[rows]
+        known_mask = self.background_mask[rows]
+
+        new_background_areas = background_mask > known_mask
+        known_mask |= background_mask
+
+        pixels = np.multiply(image, np.float32(self.FIXED_SCALE), dtype=np.float32)
+        mean = background_mean.astype(np.float32)
+        np.copyto(mean, pixels, where=new_background_areas[..., np.newaxis])
+        self._round_step(mean, pixels, 1 / (1 + self._inertia('update_inertia', frames)))
+        np.copyto(background_mean, mean, where=background_mask[..., np.newaxis], casting='unsafe')
+
+        new_diff = self.calc_diff(np.multiply(mean, 1 / self.FIXED_SCALE, out=mean), image)
+        new_diff *= self.FIXED_SCALE * self._diff_scale(frames)
+        error = background_error.astype(np.float32)
+        np.copyto(error, np.maximum(self.FIXED_SCALE, np.rint(new_diff)), where=new_background_areas)
+        self._round_step(error, new_diff, 1 / (1 + self._inertia('error_inertia', frames)))
+        np.copyto(background_error, error, where=background_mask, casting='unsafe')
+
+    def _calc_diff_in_place(self, background_mean, image, rows) -> np.ndarray:
+        return differences.calc_diff(background_mean, image, self.config['diff_method'],
+                                     out=self._buffers['diff'][rows], work=self._buffers['diff_work'][rows])
+
+
+class MixtureBackgroundModel(_CheckpointedModel):
+    """
+    Background with several modes per pixel (e.g. swaying trees, flickering screens) as a mixture of gaussians
+    with the isotropic variance, updated like cv2.BackgroundSubtractorMOG2: the image is matched to the closest
+    mode, the matched mode moves towards it, when nothing matches the weakest mode is replaced.
+    The modes with the largest weights making up background_ratio of the total weight are the background.
+    Same interface as StaticBackgroundModel so ForegroundFinder can use it:
+    get_details()['background'] is the (H, W, modes, FIELDS) view of the state which calc_diff compares the image to
+    and the error is ERROR everywhere (the difference is already relative to the variance of the mode).
+    The modes and the background mask are checkpointed with save and load.
+    """
+    CHECKPOINT_FORMAT = "see.MixtureBackgroundModel"
+    CHECKPOINT_VERSION = 1
+    CHECKPOINT_ARRAYS = ('modes', 'background_mask')
+    UNKNOWN_PIXEL = StaticBackgroundModel.UNKNOWN_PIXEL
+    # fields of the modes, the state is the (modes, FIELDS, H, W) float32 array (a plane per field)
+    MEAN, VARIANCE, WEIGHT, BACKGROUND = slice(0, 3), 3, 4, 5
+    FIELDS = 6
+    # ratio difference / error of the image at the match threshold of the mode, the background probability
+    # is 0.05 there (see ForegroundFinder.PROBABILITY_CURVE)
+    MATCH_RATIO = 3.0
+    # constant error, the differences are scaled by it so that they keep the precision when quantized to uint8
+    ERROR = 16.0
+    # mean of the modes which were not used yet, far from every pixel so they are never matched
+    UNUSED_MEAN = 1e4
+    # squared distance relative to the variance of the pixels which do not match any background mode
+    MAX_RATIO = 1e6
+
+    def __init__(self, update_inertia=10.0, modes=3, var_threshold=16.0, background_ratio=0.9,
+                 initial_variance=15.0, min_variance=4.0, max_variance=75.0):
+        """
+        Args:
+            update_inertia [0-inf): the more the more time has to pass for background to adapt,
+                the learning rate of the weights, means and variances is 1 / (1 + update_inertia)
+            modes: number of modes per pixel
+            var_threshold: the image matches the mode if the squared distance (summed over the channels)
+                is below var_threshold * variance
+            background_ratio: total weight of the modes considered background
+            initial_variance, min_variance, max_variance: variance of the new mode and its limits
+        """
+        self.modes = None
+        self.background_mask = None
+        self.config = {"update_inertia": update_inertia, "modes": modes, "var_threshold": var_threshold,
+                       "background_ratio": background_ratio, "initial_variance": initial_variance,
+                       "min_variance": min_variance, "max_variance": max_variance}
+        self._error = None
+        self._saving = None
+        self._saving_error = None
+
+    def update(self, image: np.ndarray, background_mask: np.ndarray):
+        assert image.ndim == 3 and image.dtype == np.uint8, f"incorrect ndim={image.ndim}, dtype={image.dtype}"
+        assert background_mask.dtype == np.bool_, f"dtype={image.dtype}"
+
+        if self.modes is None:
+            height, width = image.shape[:2]
+            self.modes = np.zeros((self.config['modes'], self.FIELDS, height, width), dtype=np.float32)
+            self.modes[:, self.MEAN] = self.UNUSED_MEAN
+            self.modes[:, self.VARIANCE] = self.config['initial_variance']
+            self.background_mask = np.zeros((height, width), dtype=np.bool_)
+            self._error = np.full((height, width), self.ERROR, dtype=np.float32)
+        self._update_rows(image, background_mask, slice(None))
+
+    def update_rows(self, image: np.ndarray, background_mask: np.ndarray, rows: slice, frames=1):
+        """
+        Update only the given rows of the model, image and background_mask contain just these rows.
+        Args:
+            frames: number of frames since the last update of the rows, the update has the weight
+                of that many updates with the same image
+        """
+        assert image.ndim == 3 and image.dtype == np.uint8, f"incorrect ndim={image.ndim}, dtype={image.dtype}"
+        assert self.modes is not None, "model has to be initialized with the full image"
+        self._update_rows(image, background_mask, rows, frames)
+
+    def update_batch(self, images: np.ndarray, background_masks: np.ndarray):
+        """
+        Same as calling update for each of the images in order.
+        """
+        assert images.ndim == 4 and images.dtype == np.uint8, f"incorrect ndim={images.ndim}, dtype={images.dtype}"
+        assert background_masks.shape == images.shape[:3], f"shape={background_masks.shape}"
+        for image, background_mask in zip(images, background_masks):
+            self.update(image, background_mask)
+
+    def get(self, step=1) -> t.Optional[np.ndarray]:
+        """
+        Args:
+            step: only every step-th pixel in both directions is returned
+        Returns:
+            mean of the strongest mode of every pixel
+        """
+        if self.modes is None:
+            return None
+        modes = self.modes[..., ::step, ::step]
+        strongest = np.argmax(modes[:, self.WEIGHT], axis=0)
+        res = np.take_along_axis(modes[:, self.MEAN], strongest[np.newaxis, np.newaxis], axis=0)[0]
+        res = np.moveaxis(res, 0, -1).copy()
+        res[self.background_mask[::step, ::step] == 0] = self.UNKNOWN_PIXEL
+        return res
+
+    def get_details(self, step=1) -> t.Optional[dict]:
+        """
+        Args:
+            step: only every step-th pixel in both directions is returned
+        """
+        if self.modes is None:
+            return None
+        return {'background': np.moveaxis(self.modes[..., ::step, ::step], (0, 1), (2, 3)),
+                'error': self._error[::step, ::step], 'mask': self.background_mask[::step, ::step]}
+
+    def reset(self):
+        self.modes = None
+        self.background_mask = None
+        self._error = None
+
+    def _restored(self):
+        self._error = np.full(self.background_mask.shape, self.ERROR, dtype=np.float32)
+
+    def _drift(self, saved) -> float:
+        """
+        Mean absolute difference of the means of the modes weighted by their weights, so that the strongest mode
+        switching between the modes of the flicker does not count as the drift.
+        """
+        difference = np.abs(self.modes[:, self.MEAN] - saved.modes[:, self.MEAN]).mean(axis=1)
+        return (difference * self.modes[:, self.WEIGHT]).sum(axis=0).mean()
+
+    def calc_diff(self, image, background, method=None, out=None) -> np.ndarray:
+        """
+        Args:
+            image: (H, W, 3) image
+            background: (H, W, modes, FIELDS) modes from get_details
+        Returns:
+            (H, W) float32 distance to the closest background mode relative to its standard deviation,
+            MATCH_RATIO * ERROR at the match threshold
+        """
+        modes = np.moveaxis(background, (2, 3), (0, 1))
+        pixels = [plane.astype(np.float32) for plane in cv2.split(image)]
+        difference = np.full(image.shape[:2], np.inf, dtype=np.float32) if out is None else out
+        difference[...] = np.inf
+        ratio = np.empty_like(difference)
+        for mode in modes:
+            self._squared_distance(pixels, mode[self.MEAN], out=ratio)
+            cv2.divide(ratio, mode[self.VARIANCE], dst=ratio)
+            # the modes which are not background are as far as the pixels without any background mode
+            np.maximum(ratio, (1 - mode[self.BACKGROUND]) * self.MAX_RATIO, out=ratio)
+            np.minimum(difference, ratio, out=difference)
+        np.minimum(difference, self.MAX_RATIO, out=difference)
+        np.multiply(difference, (self.MATCH_RATIO * self.ERROR) ** 2 / self.config['var_threshold'], out=difference)
+        return np.sqrt(difference, out=difference)
+
+    def calc_diff_batch(self, images, background, method=None) -> np.ndarray:
+        """
+        Difference of each of the images (N, H, W, 3) to the modes, same as calc_diff for each.
+        """
+        differences_per_image = np.empty(images.shape[:-1], dtype=np.float32)
+        for image, difference in zip(images, differences_per_image):
+            self.calc_diff(image, background, out=difference)
+        return differences_per_image
+
+    @staticmethod
+    def _squared_distance(pixels, means, out=None) -> np.ndarray:
+        """
+        Args:
+            pixels: float32 planes of the image channels
+            means: (3, H, W) planes of the mode means
+        Returns:
+            (H, W) squared distance summed over the channels
+        """
+        if out is None:
+            out = np.zeros(pixels[0].shape, dtype=np.float32)
         else:
-            raise NotImplementedError(method)
+            out[...] = 0
+        for pixel_plane, mean_plane in zip(pixels, means):
+            cv2.accumulateSquare(cv2.subtract(pixel_plane, mean_plane), out)
+        return out
+
+    def _update_rows(self, image, background_mask, rows, frames=1):
+        """
+        The (H, W) planes of each mode are updated with cv2 running averages, only on the background pixels.
+        """
+        config = self.config
+        modes = self.modes[:, :, rows]
+        pixels = [plane.astype(np.float32) for plane in cv2.split(image)]
+        mask = np.ascontiguousarray(background_mask).view(np.uint8)
+        alpha = 1 - (config['update_inertia'] / (1 + config['update_inertia'])) ** frames
+
+        # match: the closest mode (relative to its variance) if it is within the threshold
+        distances = np.empty((len(modes),) + background_mask.shape, dtype=np.float32)
+        closest_ratio = np.full(background_mask.shape, np.inf, dtype=np.float32)
+        closest = np.zeros(background_mask.shape, dtype=np.uint8)
+        for k, mode in enumerate(modes):
+            self._squared_distance(pixels, mode[self.MEAN], out=distances[k])
+            ratio = cv2.divide(distances[k], mode[self.VARIANCE])
+            # the modes are visited in order so the closer one always has the largest index so far
+            np.maximum(closest, np.multiply(ratio < closest_ratio, k, dtype=np.uint8), out=closest)
+            np.minimum(closest_ratio, ratio, out=closest_ratio)
+        is_matched = (closest_ratio < config['var_threshold']) & background_mask
+
+        # update: weights decay, the matched mode gains and moves towards the image at the rate alpha / weight
+        for k, mode in enumerate(modes):
+            matched = (closest == k) & is_matched
+            weights, variances = mode[self.WEIGHT], mode[self.VARIANCE]
+            cv2.accumulateWeighted(matched.view(np.uint8), weights, alpha, mask=mask)
+            rates = cv2.divide(alpha, weights)
+            np.minimum(rates, 1, out=rates)
+            np.multiply(rates, matched, out=rates)
+            for pixel_plane, mean_plane in zip(pixels, mode[self.MEAN]):
+                cv2.accumulateProduct(cv2.subtract(pixel_plane, mean_plane), rates, mean_plane)
+            cv2.accumulateProduct(cv2.subtract(distances[k], variances), rates, variances)
+            np.clip(variances, config['min_variance'], config['max_variance'], out=variances)
+
+        # replace: when nothing matches the weakest mode starts at the image (rare once the model is learned)
+        unmatched = background_mask & ~is_matched
+        if cv2.countNonZero(unmatched.view(np.uint8)):
+            ys, xs = np.nonzero(unmatched)
+            weakest = np.argmin(modes[:, self.WEIGHT, ys, xs], axis=0)
+            for channel, pixel_plane in enumerate(pixels):
+                modes[weakest, channel, ys, xs] = pixel_plane[ys, xs]
+            modes[weakest, self.VARIANCE, ys, xs] = config['initial_variance']
+            modes[weakest, self.WEIGHT, ys, xs] = alpha
+            modes[:, self.WEIGHT, ys, xs] /= modes[:, self.WEIGHT, ys, xs].sum(axis=0)
+
+        self._update_background_modes(modes)
+        self.background_mask[rows] |= background_mask
+
+    def _update_background_modes(self, modes):
+        """
+        The mode is background if the total weight of the stronger modes is below background_ratio.
+        """
+        weight_before = np.empty_like(modes[0, self.WEIGHT])
+        stronger_weight = np.empty_like(weight_before)
+        for k, mode in enumerate(modes):
+            weight_before[...] = 0
+            for j, other in enumerate(modes):
+                if j == k:
+                    continue
+                # equal weights are ordered by the index of the mode
+                is_stronger = other[self.WEIGHT] > mode[self.WEIGHT] if j > k else \
+                    other[self.WEIGHT] >= mode[self.WEIGHT]
+                np.multiply(other[self.WEIGHT], is_stronger, out=stronger_weight)
+                weight_before += stronger_weight
+            mode[self.BACKGROUND] = (weight_before < self.config['background_ratio']) & (mode[self.WEIGHT] > 0)
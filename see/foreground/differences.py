@@ -0,0 +1,68 @@
+"""
+Per pixel differences of two images (H, W, C), the result is (H, W) float32.
+New methods can be added with register_diff_method and then used as diff_method of StaticBackgroundModel.
+"""
+import typing as t
+
+import cv2
+import numpy as np
+
+DIFF_METHODS: t.Dict[str, t.Callable] = {}
+
+
+def register_diff_method(name, function: t.Callable = None):
+    """
+    Register function(image1, image2, out=None, work=None) -> (H, W) float32 difference under the name,
+    out is the optional output array and work an optional (H, W, C) float32 scratch array.
+    Can be used as a decorator.
+    """
+    if function is None:
+        return lambda decorated: register_diff_method(name, decorated)
+    DIFF_METHODS[name] = function
+    return function
+
+
+def calc_diff(image1, image2, method, out=None, work=None) -> np.ndarray:
+    if method not in DIFF_METHODS:
+        raise NotImplementedError(method)
+    return DIFF_METHODS[method](image1, image2, out=out, work=work)
+
+
+def channel_mean(image, out=None) -> np.ndarray:
+    """
+    Mean over the channels of float32 image in a single pass.
+    """
+    channels = image.shape[-1]
+    return cv2.transform(image, np.full((1, channels), 1 / channels), dst=out)
+
+
+def to_rgs(image, out=None) -> np.ndarray:
+    """
+    Convert the image to normalized red and green chromaticity and the intensity (all in 0-255) so that
+    the changes of the lighting affect mostly the intensity.
+    """
+    image = image.astype(np.float32, copy=False)
+    total = cv2.transform(image, np.ones((1, 3)))
+    rgs = cv2.transform(image, np.array([[255, 0, 0], [0, 255, 0], [0, 0, 0]]), dst=out)
+    np.divide(total, 3, out=rgs[..., 2])
+    np.maximum(total, 1, out=total)
+    np.divide(rgs[..., :2], total[..., np.newaxis], out=rgs[..., :2])
+    return rgs
+
+
+@register_diff_method('rgb')
+def rgb_difference(image1, image2, out=None, work=None) -> np.ndarray:
+    """
+    Mean absolute difference of the channels, any combination of uint8 and float types.
+    """
+    work = cv2.subtract(image1, image2, dst=work, dtype=cv2.CV_32F)
+    np.absolute(work, out=work)
+    return channel_mean(work, out=out)
+
+
+@register_diff_method('rgs')
+def rgs_difference(image1, image2, out=None, work=None) -> np.ndarray:
+    """
+    Mean absolute difference of red and green chromaticity and intensity (see to_rgs).
+    """
+    return rgb_difference(to_rgs(image1, out=work), to_rgs(image2), out=out, work=work)
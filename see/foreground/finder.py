@@ -1,58 +1,283 @@
+import collections
+import copy
+import os
+import time
+import typing as t
+
 import cv2
 import numpy as np
 
+import see._commons.caching as caching
 import see._commons.mathmap as mathmap
-import see.foreground.aided_segmentation
-from see.foreground.backgrounds import StaticBackgroundModel
+import see._commons.profiling as profilers
+import see._commons.resampling as resampling
+import see._commons.tiling as tiles
+from see.foreground.aided_segmentation import AidedSegmentation
+from see.foreground.backgrounds import MixtureBackgroundModel, StaticBackgroundModel
+from see.foreground.scene_change import SceneChangeDetector
+from see.foreground.scheduling import UpdateScheduler
+
+Region = collections.namedtuple("Region", ["crop", "inside", "finder"])
 
 
-class ForegroundFinder(see.foreground.aided_segmentation.AidedSegmentation):
-    def __init__(self, background_model: StaticBackgroundModel, confident_size=1, cleaning=None):
+class ForegroundFinder(AidedSegmentation):
+    # background probability as a function of difference / error
+    PROBABILITY_CURVE = ((0.0, 1.0, 3.0, 5.0), (1.0, 0.8, 0.05, 0.0))
+    PROBABILITY_DTYPES = {'float64': np.float64, 'float32': np.float32, 'uint8': np.uint8}
+    DEFAULT_PROBABILITY = {'method': 'linear', 'dtype': 'float64'}
+    BACKGROUND_MODELS = {'static': StaticBackgroundModel, 'mixture': MixtureBackgroundModel}
+    MIN_ERROR = 0.0001
+
+    def __init__(self, background_model: StaticBackgroundModel, confident_size=1, cleaning=None, probability=None,
+                 tiling=None, profiling=None, scaling=None, cache=None, scene_change=None, scheduling=None,
+                 roi=None):
         """
         Args:
             background_model: background model
             confident_size: size of the erosion of the background mask to get confident (should be odd)
             cleaning: dict with cleaning params
                 method and specific params
+            probability: dict with probability conversion params
+                - method: linear (default) or lut (lookup table of quantized uint8 differences and errors)
+                - dtype: float64 (default), float32 or uint8 (probability scaled to 0-255)
+            tiling: dict with params of the parallel processing of horizontal bands of the image
+                (results are identical to the processing of the whole image), if None the image is not split
+                - rows: number of rows in the band
+                - threads: number of threads processing the bands
+            profiling: dict with params of the per stage timers (see stats), if None they are disabled
+                - window: number of the most recent calls of each stage used for percentiles and histograms
+                - sink_period: seconds between the calls of profiler.sink (set it to e.g. push the stats)
+            scaling: dict with params of the processing at reduced resolution, if None the full resolution is used
+                cleaning, update and difference run on the downscaled image and the probability is upsampled back
+                - scale: factor of the image size (e.g. 0.5) or
+                - levels: number of pyramid levels (scale 0.5 ** levels)
+                - refine_edges: recompute the upsampled probability near the edges of the foreground guided
+                  by the full resolution image (joint bilateral upsampling), default False
+                - edge_sigma: colour distance (mean over channels) of the pixels considered different, default 10
+            cache: dict with params of the cache of the cleaned images keyed by the identity of the image array
+                so that calc_prob and update of the same array clean it once, if None nothing is cached
+                (the pixels are compared in full so the arrays modified in place are cleaned again)
+                - frames: number of the cached images
+            scene_change: dict with params of SceneChangeDetector which resets the background model
+                when the whole scene changes (see verify_static), if None the model is never reset
+            scheduling: dict with params of UpdateScheduler which limits the update so that calc_prob and update
+                of the frame fit into budget_ms (the frame starts with calc_prob or process),
+                if None the whole model is updated with every frame
+            roi: dict with the regions of interest, if None the whole image is processed
+                only the bounding crops of the regions extended with the halo of the cleaning and the erosion
+                are processed, each by its own finder with the same params (and a copy of the background model)
+                so the state covers just the crops (see regions), inside the regions the probability is the same
+                as of the whole image processing when the rough masks are given (without scaling),
+                the finders of the crops share the tiling threads, the scene change is checked inside all the regions
+                at once and resets all of them, budget_ms of the scheduling is split between the crops
+                by their area (each measures the time from the start of its own crop), the cache is not used
+                - mask: (H, W) bool mask of the regions or
+                - polygons: list of polygons of the regions, each a list of (x, y) points
+                - fill: foreground probability outside of the regions, default 0
         """
         cleaning = cleaning or {}
+        probability = {**self.DEFAULT_PROBABILITY, **(probability or {})}
+        if probability['dtype'] not in self.PROBABILITY_DTYPES:
+            raise NotImplementedError(probability['dtype'])
         self.static_background = background_model
-        self.config = {"confident_size": confident_size, "cleaning": cleaning}
+        self.config = {"confident_size": confident_size, "cleaning": cleaning, "probability": probability,
+                       "tiling": tiling, "profiling": profiling, "scaling": scaling, "cache": cache,
+                       "scene_change": scene_change, "scheduling": scheduling, "roi": roi}
+        self._cleaned = caching.FrameCache(cache.get('frames', 2)) if cache is not None else None
+        self._scene_change = SceneChangeDetector(**scene_change) if scene_change is not None else None
+        self.scheduler = UpdateScheduler(**scheduling) if scheduling is not None else None
+        self._frame_started = None
+        self._scale = None
+        if scaling is not None:
+            self._scale = scaling['scale'] if 'scale' in scaling else 0.5 ** scaling['levels']
+        self.profiler = profilers.StageProfiler(enabled=profiling is not None, **(profiling or {}))
+        self._probability_lut = None
+        self._bands = None
+        if tiling is not None:
+            self._bands = tiles.BandExecutor(band_rows=tiling.get('rows', 256), threads=tiling.get('threads', 4))
+        self._regions = None
+        self._roi_mask = None
+        self._regions_checkpoint = None
+
+    @property
+    def regions(self) -> t.Optional[t.List[Region]]:
+        """
+        Regions of interest created for the shape of the first image: crop of the image, mask of the regions inside
+        of it and the finder with the background model of the crop, None if roi is not used or no image was seen.
+        """
+        return self._regions
 
     @staticmethod
-    def create_from_dicts(config_background_model: dict = None, confident_size=1, cleaning=None):
+    def create_from_dicts(config_background_model: dict = None, confident_size=1, cleaning=None, probability=None,
+                          tiling=None, profiling=None, scaling=None, cache=None, scene_change=None, scheduling=None,
+                          roi=None):
         """
         Args:
-            config_background_model: dictionary with parameters to static background model
+            config_background_model: dictionary with parameters to the background model,
+                its 'model' is the key of BACKGROUND_MODELS ('static' by default)
             confident_size: size of the erosion of the background mask to get confident (should be odd)
             cleaning: dict with cleaning params
                 method and specific params
+            probability: dict with probability conversion params
+            tiling: dict with params of the parallel processing of horizontal bands of the image
+            profiling: dict with params of the per stage timers
+            scaling: dict with params of the processing at reduced resolution
+            cache: dict with params of the cache of the cleaned images
+            scene_change: dict with params of the detector of the changes of the whole scene
+            scheduling: dict with params of the scheduler of the updates within the latency budget
+            roi: dict with the regions of interest
         """
-        config_background_model = config_background_model or {}
-        return ForegroundFinder(StaticBackgroundModel(**config_background_model),
-                                confident_size=confident_size, cleaning=cleaning)
+        config_background_model = dict(config_background_model or {})
+        model_name = config_background_model.pop('model', 'static')
+        if model_name not in ForegroundFinder.BACKGROUND_MODELS:
+            raise NotImplementedError(model_name)
+        background_model = ForegroundFinder.BACKGROUND_MODELS[model_name](**config_background_model)
+        return ForegroundFinder(background_model,
+                                confident_size=confident_size, cleaning=cleaning, probability=probability,
+                                tiling=tiling, profiling=profiling, scaling=scaling, cache=cache,
+                                scene_change=scene_change, scheduling=scheduling, roi=roi)
 
     def update(self, image, rough_foreground_mask):
         assert image.dtype == np.uint8
         assert rough_foreground_mask.dtype == np.bool
 
-        image_clean = self._clean_image(image)
-        background_mask = self._get_confident_background(image_clean, foreground_mask=rough_foreground_mask)
-        self.static_background.update(image_clean, background_mask)
+        with self.profiler.measure('update'):
+            if self.config['roi'] is not None:
+                for crop, _, finder in self._get_regions(image.shape):
+                    finder.update(image[crop], rough_foreground_mask[crop])
+                return
+            self._update_clean(self._prepare(image), rough_foreground_mask)
+
+    def update_batch(self, images, rough_foreground_masks, chunk_size=16):
+        """
+        Same as calling update for each of the images in order.
+        Args:
+            images: (N, H, W, 3) uint8 stack of images
+            rough_foreground_masks: (N, H, W) bool stack of masks
+            chunk_size: number of images cleaned at once, bounds the additional memory
+        """
+        assert images.ndim == 4 and images.dtype == np.uint8
+        assert rough_foreground_masks.shape == images.shape[:3] and rough_foreground_masks.dtype == np.bool
+
+        if self.config['roi'] is not None:
+            for crop, _, finder in self._get_regions(images.shape[1:]):
+                finder.update_batch(images[(slice(None),) + crop], rough_foreground_masks[(slice(None),) + crop],
+                                    chunk_size)
+            return
+        for start in range(0, len(images), chunk_size):
+            chunk = images[start:start + chunk_size]
+            chunk_masks = rough_foreground_masks[start:start + chunk_size]
+            if self._scale is not None:
+                chunk = self._downscale_images(chunk)
+                chunk_masks = np.stack([self._downscale_mask(mask, chunk.shape[1:]) for mask in chunk_masks])
+            images_clean = self._clean_images(chunk)
+            with self.profiler.measure('confident_background'):
+                background_masks = np.stack([self._get_confident_background(image_clean, foreground_mask=mask)
+                                             for image_clean, mask in zip(images_clean, chunk_masks)])
+            with self.profiler.measure('background_update'):
+                self.static_background.update_batch(images_clean, background_masks)
 
     def calc_prob(self, image) -> np.ndarray:
         assert image.dtype == np.uint8
 
-        image_clean = self._clean_image(image)
+        if self.config['roi'] is not None:
+            with self.profiler.measure('calc_prob'):
+                probability = self._map_regions(image, lambda finder, crop: finder.calc_prob(image[crop]))
+            return self._verified(image, probability)
+        self._frame_started = time.perf_counter()
         background_info = self.static_background.get_details()
-        difference = self.static_background.calc_diff(image_clean, background_info['background'])
-        foreground_probability = 1 - self._convert_to_percentage(difference, background_info['error'])
-        foreground_probability[background_info['mask'] == 0] = 0.5
-        if self.verify_static(image, foreground_probability):
-            return foreground_probability
+        if background_info is None:
+            return np.full(image.shape[:2], self._unknown_probability(), dtype=self._probability_dtype())
+
+        with self.profiler.measure('calc_prob'):
+            foreground_probability = self._calc_prob_clean(image, self._prepare(image), background_info)
+        return self._verified(image, foreground_probability)
+
+    def process(self, image, rough_foreground_mask=None, threshold=0.5) -> np.ndarray:
+        """
+        Same as calc_prob followed by update of the same image but the image is cleaned only once.
+        Args:
+            image: image to process
+            rough_foreground_mask: foreground mask used for the update,
+                if None the pixels with the probability above threshold are used
+            threshold: probability above which the pixel is considered foreground
+        """
+        assert image.dtype == np.uint8
+
+        if self.config['roi'] is not None:
+            probability = self._map_regions(image, lambda finder, crop: finder.process(
+                image[crop], rough_foreground_mask[crop] if rough_foreground_mask is not None else None, threshold))
+            verified = self._verified(image, probability)
+            if verified is not probability:
+                # the crops were updated before the reset, they start again from this frame as the whole image does
+                self.update(image, rough_foreground_mask if rough_foreground_mask is not None
+                            else self.foreground_mask(verified, threshold))
+            return verified
+        self._frame_started = time.perf_counter()
+        image_clean = self._prepare(image)
+        background_info = self.static_background.get_details()
+        if background_info is None:
+            foreground_probability = np.full(image.shape[:2], self._unknown_probability(),
+                                             dtype=self._probability_dtype())
         else:
-            self.static_background.reset()
-            return np.ones_like(foreground_probability) * 0.5
+            with self.profiler.measure('calc_prob'):
+                foreground_probability = self._calc_prob_clean(image, image_clean, background_info)
+            foreground_probability = self._verified(image, foreground_probability)
+
+        if rough_foreground_mask is None:
+            rough_foreground_mask = self.foreground_mask(foreground_probability, threshold)
+        assert rough_foreground_mask.dtype == np.bool
+        with self.profiler.measure('update'):
+            self._update_clean(image_clean, rough_foreground_mask)
+        return foreground_probability
+
+    def calc_prob_batch(self, images, chunk_size=16) -> np.ndarray:
+        """
+        Calculate the foreground probability of each of the images against the current background model.
+        Gives the same results as calling calc_prob for each of the images but the conversion to probability
+        is done for the whole chunk at once.
+        Args:
+            images: (N, H, W, 3) uint8 stack of images
+            chunk_size: number of images processed at once, bounds the additional memory
+        Returns:
+            (N, H, W) stack of foreground probabilities
+        """
+        assert images.ndim == 4 and images.dtype == np.uint8
+
+        if self.config['roi'] is not None:
+            probabilities = self._map_regions(
+                images, lambda finder, crop: finder.calc_prob_batch(images[crop], chunk_size), stacked=True)
+            self._verify_batch(images, probabilities, 0, len(images))
+            return probabilities
+        probabilities = np.full(images.shape[:3], self._unknown_probability(), dtype=self._probability_dtype())
+        background_info = self.static_background.get_details()
+        if background_info is None:
+            return probabilities
+
+        for start in range(0, len(images), chunk_size):
+            chunk = images[start:start + chunk_size]
+            images_clean = self._clean_images(chunk if self._scale is None else self._downscale_images(chunk))
+            with self.profiler.measure('calc_diff'):
+                difference = self.static_background.calc_diff_batch(images_clean, background_info['background'])
+            chunk_probabilities = self._calc_prob_from_difference(difference, background_info)
+            if self._scale is None:
+                probabilities[start:start + chunk_size] = chunk_probabilities
+            else:
+                for image, image_clean, probability, scaled_probability in zip(
+                        chunk, images_clean, probabilities[start:start + chunk_size], chunk_probabilities):
+                    probability[...] = self._upscale_probability(scaled_probability, image, image_clean)
+            if not self._verify_batch(images, probabilities, start, start + len(chunk)):
+                return probabilities
+        return probabilities
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            timings of the stages (clean, confident_background, background_update, calc_diff, convert)
+            and of the whole update and calc_prob calls, empty if the profiling is disabled
+            (see StageProfiler.stats for the fields)
+        """
+        return self.profiler.stats()
 
     def rectify_mask(self, image, foreground_mask,
                      remove_lower=0.01,
@@ -60,12 +285,109 @@ class ForegroundFinder(see.foreground.aided_segmentation.AidedSegmentation):
         pass
 
     def verify_static(self, image, diff) -> bool:
-        # TODO
-        return True
+        """
+        Returns:
+            False if the scene changed as a whole so the background model should be reset
+            (checked on a sparse grid of pixels, only inside the regions of interest with roi,
+            if scene_change is configured, otherwise always True)
+        """
+        if self._scene_change is None:
+            return True
+        with self.profiler.measure('scene_change'):
+            return not self._scene_change.check(image, diff, scale=self._probability_scale(), mask=self._roi_mask)
+
+    def save_background(self, path, min_drift=None, wait=True) -> bool:
+        """
+        Save the background model as a checkpoint directory (see save of the model),
+        with roi the model of every region is saved in the subdirectory region_<index>.
+        Returns:
+            whether any checkpoint was written
+        """
+        if self.config['roi'] is None:
+            return self.static_background.save(path, min_drift=min_drift, wait=wait)
+        saved = False
+        for index, region in enumerate(self._regions or []):
+            saved |= region.finder.static_background.save(self._region_checkpoint(path, index),
+                                                          min_drift=min_drift, wait=wait)
+        return saved
+
+    def load_background(self, path):
+        """
+        Restore the background model from the checkpoint directory written by save_background,
+        with roi the models are restored when the regions are created (for the first image).
+        """
+        if self.config['roi'] is None:
+            self.static_background = type(self.static_background).load(path)
+        elif self._regions is None:
+            self._regions_checkpoint = path
+        else:
+            self._load_regions(path)
+
+    def _get_regions(self, shape) -> t.List[Region]:
+        """
+        Returns:
+            regions created for the shape of the first image (see regions)
+        """
+        if self._regions is None:
+            roi = self.config['roi']
+            mask = roi['mask'] if 'mask' in roi else tiles.mask_from_polygons(shape[:2], roi['polygons'])
+            assert mask.shape == tuple(shape[:2]), f"roi mask shape={mask.shape} does not match image shape={shape}"
+            self._roi_mask = mask
+            halo = max(self.config['cleaning'].get('size', 1), self.config['confident_size']) // 2
+            config = {**self.config, 'roi': None, 'profiling': None, 'tiling': None, 'cache': None,
+                      'scene_change': None}
+            self._regions = []
+            crops = tiles.crop_boxes(mask, halo)
+            areas = [(rows.stop - rows.start) * (cols.stop - cols.start) for rows, cols in crops]
+            for crop, area in zip(crops, areas):
+                background_model = copy.deepcopy(self.static_background)
+                background_model.reset()
+                if self.config['scheduling'] is not None:
+                    # the crops are processed one after another so they share the budget of the frame
+                    scheduling = self.config['scheduling']
+                    config['scheduling'] = {**scheduling, 'budget_ms': scheduling['budget_ms'] * area / sum(areas)}
+                finder = ForegroundFinder(background_model, **config)
+                finder._bands = self._bands
+                self._regions.append(Region(crop, mask[crop].copy(), finder))
+            if self._regions_checkpoint is not None:
+                self._load_regions(self._regions_checkpoint)
+                self._regions_checkpoint = None
+        return self._regions
+
+    def _load_regions(self, path):
+        for index, region in enumerate(self._regions):
+            region_path = self._region_checkpoint(path, index)
+            if os.path.exists(region_path):
+                region.finder.load_background(region_path)
+
+    @staticmethod
+    def _region_checkpoint(path, index) -> str:
+        return os.path.join(str(path), f"region_{index}")
+
+    def _reset_background(self):
+        self.static_background.reset()
+        for region in self._regions or []:
+            region.finder.static_background.reset()
+
+    def _map_regions(self, images, function, stacked=False) -> np.ndarray:
+        """
+        Compute the probability of each crop with function(finder, crop) and fill the rest of the image.
+        Args:
+            images: image or (N, H, W, 3) stack of images if stacked
+        """
+        shape = images.shape[:3] if stacked else images.shape[:2]
+        fill = self.config['roi'].get('fill', 0.0)
+        if self._probability_dtype() == np.uint8:
+            fill = np.rint(fill * 255)
+        probability = np.full(shape, fill, dtype=self._probability_dtype())
+        for crop, inside, finder in self._get_regions(shape[1:] if stacked else shape):
+            crop = (slice(None),) + crop if stacked else crop
+            np.copyto(probability[crop], function(finder, crop), where=inside)
+        return probability
 
     def _get_confident_background(self, image, foreground_mask) -> np.ndarray:
         assert foreground_mask.dtype == np.bool
-        erosion_size = self.config['confident_size']
+        erosion_size = self._kernel_size(self.config['confident_size'])
         kernel = np.ones((erosion_size, erosion_size), np.uint8)
         confident_background = cv2.erode((1 - foreground_mask).astype(np.uint8), kernel).astype(np.bool)
         return confident_background
@@ -74,37 +396,291 @@ class ForegroundFinder(see.foreground.aided_segmentation.AidedSegmentation):
         assert image.dtype == np.uint8
 
         if self.config['cleaning']['method'] == 'median':
-            median_size = self.config['cleaning']['size']
+            median_size = self._kernel_size(self.config['cleaning']['size'])
             return cv2.medianBlur(image, median_size)
         else:
             raise NotImplementedError(self.config['cleaning_method']['method'])
 
-    def _convert_to_percentage(self, difference, errors) -> np.ndarray:
-        # TODO now i really do not like it
-        # TODO it does work with initial error (big error means that everything can be background)
-        prob = np.ones(difference.shape, dtype=np.float)
-        top_fraction_on_2e = 0.8
-        bottom_fraction_on_3e = 0.05
+    def _cleaning_halo(self):
+        return self._kernel_size(self.config['cleaning'].get('size', 1)) // 2
+
+    def _kernel_size(self, size):
+        """
+        Sizes are given in the pixels of the full resolution, returns the odd size at the processed resolution.
+        """
+        if self._scale is None:
+            return size
+        return max(1, 2 * int(round((size * self._scale - 1) / 2)) + 1)
 
-        step_1_pixels = difference <= errors
-        step_2_pixels = (errors < difference) & (difference <= 3 * errors)
-        step_3_pixels = 3 * errors < difference
+    def _prepare(self, image) -> np.ndarray:
+        """
+        Returns:
+            the image downscaled (if scaling is used) and cleaned, from the cache if the same image was prepared
+        """
+        if self._cleaned is not None:
+            image_clean = self._cleaned.get(image)
+            if image_clean is not None:
+                return image_clean
+
+        scaled_image = image if self._scale is None else self._downscale(image)
+        with self.profiler.measure('clean'):
+            image_clean = self._clean_image(scaled_image) if self._bands is None else self._clean_tiled(scaled_image)
+        if self._cleaned is not None:
+            self._cleaned.put(image, image_clean)
+        return image_clean
+
+    def _update_clean(self, image_clean, rough_foreground_mask):
+        if self._scale is not None:
+            rough_foreground_mask = self._downscale_mask(rough_foreground_mask, image_clean.shape)
+        if self.scheduler is not None and self.static_background.background_mask is not None:
+            self._update_scheduled(image_clean, rough_foreground_mask)
+            return
+        if self.scheduler is not None:
+            self.scheduler.reset()
+        self._update_full(image_clean, rough_foreground_mask)
+
+    def _update_full(self, image_clean, rough_foreground_mask):
+        if self._bands is not None and self.static_background.background_mask is not None:
+            self._update_tiled(image_clean, rough_foreground_mask)
+            return
+
+        with self.profiler.measure('confident_background'):
+            background_mask = self._get_confident_background(image_clean, foreground_mask=rough_foreground_mask)
+        with self.profiler.measure('background_update'):
+            self.static_background.update(image_clean, background_mask)
+
+    def _calc_prob_clean(self, image, image_clean, background_info) -> np.ndarray:
+        if self._bands is not None:
+            foreground_probability = self._calc_prob_tiled(image_clean, background_info)
+        else:
+            with self.profiler.measure('calc_diff'):
+                difference = self.static_background.calc_diff(image_clean, background_info['background'])
+            foreground_probability = self._calc_prob_from_difference(difference, background_info)
+        if self._scale is not None:
+            foreground_probability = self._upscale_probability(foreground_probability, image, image_clean)
+        return foreground_probability
+
+    def _verified(self, image, foreground_probability) -> np.ndarray:
+        if self.verify_static(image, foreground_probability):
+            return foreground_probability
+        else:
+            self._reset_background()
+            unknown = foreground_probability.copy()
+            self._fill_unknown(unknown)
+            return unknown
+
+    def _verify_batch(self, images, probabilities, start, stop) -> bool:
+        """
+        Verify the images from start to stop, after the scene change the model is reset
+        and the rest of the probabilities is unknown.
+        Returns:
+            False if the scene changed
+        """
+        for i in range(start, stop):
+            if not self.verify_static(images[i], probabilities[i]):
+                self._reset_background()
+                self._fill_unknown(probabilities[i:])
+                return False
+        return True
+
+    def _fill_unknown(self, probability):
+        """
+        Set the probability (of one or more images) to unknown, with roi only inside the regions
+        so that the rest keeps the fill.
+        """
+        if self._roi_mask is None:
+            probability[...] = self._unknown_probability()
+        else:
+            probability[..., self._roi_mask] = self._unknown_probability()
 
-        step_1_probs = mathmap.multi_linear_mapping_2d(difference[step_1_pixels],
-                                                       lx=0, rx=errors[step_1_pixels],
-                                                       ly=1.0, ry=top_fraction_on_2e)
+    def _downscale(self, image) -> np.ndarray:
+        with self.profiler.measure('scale'):
+            return resampling.downscale(image, resampling.scaled_size(image.shape, self._scale))
 
-        step_2_probs = mathmap.multi_linear_mapping_2d(difference[step_2_pixels],
-                                                       lx=errors[step_2_pixels], rx=3 * errors[step_2_pixels],
-                                                       ly=top_fraction_on_2e, ry=bottom_fraction_on_3e)
+    def _downscale_mask(self, rough_foreground_mask, shape) -> np.ndarray:
+        """
+        Downscale the mask to the shape so that the pixel is foreground if any of the pixels it covers is.
+        """
+        with self.profiler.measure('scale'):
+            return resampling.downscale_mask(rough_foreground_mask, (shape[1], shape[0]))
 
-        step_3_probs = mathmap.multi_linear_mapping_2d(difference[step_3_pixels],
-                                                       lx=3 * errors[step_3_pixels], rx=5 * errors[step_3_pixels],
-                                                       ly=bottom_fraction_on_3e, ry=0.0)
+    def _downscale_images(self, images) -> np.ndarray:
+        return np.stack([self._downscale(image) for image in images])
 
-        prob[step_1_pixels] = step_1_probs
-        prob[step_2_pixels] = step_2_probs
-        prob[step_3_pixels] = step_3_probs
+    def _upscale_probability(self, scaled_probability, image, scaled_image) -> np.ndarray:
+        with self.profiler.measure('scale'):
+            foreground_probability = resampling.upscale(scaled_probability, (image.shape[1], image.shape[0]))
+        if self.config['scaling'].get('refine_edges', False):
+            with self.profiler.measure('refine_edges'):
+                self._refine_edges(foreground_probability, scaled_probability, image, scaled_image)
+        return foreground_probability
 
-        prob = np.minimum(np.maximum(prob, 0), 1)
-        return prob
+    def _refine_edges(self, foreground_probability, scaled_probability, image, scaled_image):
+        """
+        Recompute in place the probability of the pixels near the edges of the foreground (at the reduced resolution)
+        by joint bilateral upsampling: the probabilities of the four nearest downscaled pixels are weighted
+        by the bilinear weights and by the similarity of their colour to the colour of the full resolution pixel.
+        Isolated foreground pixels are not refined.
+        """
+        kernel = np.ones((3, 3), np.uint8)
+        foreground = (scaled_probability > self._unknown_probability()).view(np.uint8)
+        foreground = cv2.morphologyEx(foreground, cv2.MORPH_OPEN, kernel)
+        scaled_edges = cv2.morphologyEx(foreground, cv2.MORPH_GRADIENT, kernel)
+        edges = cv2.resize(scaled_edges, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+        ys, xs = np.nonzero(edges)
+        if len(ys) == 0:
+            return
+
+        scaled_height, scaled_width = scaled_probability.shape
+        pixels = image[ys, xs].astype(np.float32)
+        scaled_colours = scaled_image.reshape(-1, scaled_image.shape[-1]).astype(np.float32)
+        scaled_probability = scaled_probability.reshape(-1).astype(np.float32)
+        sigma = self.config['scaling'].get('edge_sigma', 10.0)
+        weighted_sum = np.zeros(len(ys), dtype=np.float32)
+        weights_sum = np.zeros(len(ys), dtype=np.float32)
+        scaled_xs = np.clip(resampling.source_coordinates(xs, scaled_width, image.shape[1]), 0, scaled_width - 1)
+        scaled_ys = np.clip(resampling.source_coordinates(ys, scaled_height, image.shape[0]), 0, scaled_height - 1)
+        x0 = np.minimum(scaled_xs.astype(np.intp), max(scaled_width - 2, 0))
+        y0 = np.minimum(scaled_ys.astype(np.intp), max(scaled_height - 2, 0))
+        fx = (scaled_xs - x0).astype(np.float32)
+        fy = (scaled_ys - y0).astype(np.float32)
+        for dy, wy in [(0, 1 - fy), (1, fy)]:
+            for dx, wx in [(0, 1 - fx), (1, fx)]:
+                neighbours = (np.minimum(y0 + dy, scaled_height - 1) * scaled_width +
+                              np.minimum(x0 + dx, scaled_width - 1))
+                colour_distance = np.abs(pixels - scaled_colours.take(neighbours, axis=0)).mean(axis=-1)
+                # small epsilon falls back to the bilinear interpolation if no neighbour is similar
+                weights = wx * wy * (np.exp(-0.5 * (colour_distance / sigma) ** 2) + 1e-6)
+                weighted_sum += weights * scaled_probability.take(neighbours)
+                weights_sum += weights
+        refined = weighted_sum / weights_sum
+        if foreground_probability.dtype == np.uint8:
+            refined = np.rint(refined)
+        foreground_probability[ys, xs] = refined
+
+    def _clean_tiled(self, image) -> np.ndarray:
+        height = image.shape[0]
+        image_clean = np.empty_like(image)
+
+        def clean_band(rows):
+            extended_rows, band_rows = tiles.with_halo(rows, self._cleaning_halo(), height)
+            image_clean[rows] = self._clean_image(image[extended_rows])[band_rows]
+
+        self._bands.map(clean_band, height)
+        return image_clean
+
+    def _update_scheduled(self, image_clean, rough_foreground_mask):
+        """
+        Update the whole model, some of its bands or nothing as planned by the scheduler
+        for the time left from the budget of the frame.
+        """
+        frame_started, self._frame_started = self._frame_started, None
+        with self.profiler.measure('schedule'):
+            change = self.scheduler.change_rate(self.static_background, image_clean, rough_foreground_mask)
+            now = time.perf_counter()
+            elapsed_ms = (now - frame_started) * 1000 if frame_started is not None else 0.0
+            bands = self.scheduler.plan(image_clean.shape[0], elapsed_ms, change)
+
+        if self.scheduler.last['decision'] == 'full' and all(frames == 1 for _, frames in bands):
+            self._update_full(image_clean, rough_foreground_mask)
+        else:
+            for rows, frames in bands:
+                self._update_band(image_clean, rough_foreground_mask, rows, frames)
+        self.scheduler.record(sum(rows.stop - rows.start for rows, _ in bands), time.perf_counter() - now)
+
+    def _update_band(self, image_clean, rough_foreground_mask, rows, frames=1):
+        """
+        Update the rows of the model, the confident background is computed with the halo of the erosion
+        so the result is the same as of the update of the whole image.
+        Args:
+            frames: number of frames since the last update of the rows (see StaticBackgroundModel.update_rows)
+        """
+        halo = self._kernel_size(self.config['confident_size']) // 2
+        extended_rows, band_rows = tiles.with_halo(rows, halo, image_clean.shape[0])
+        with self.profiler.measure('confident_background'):
+            background_mask = self._get_confident_background(
+                image_clean[extended_rows], foreground_mask=rough_foreground_mask[extended_rows])
+        with self.profiler.measure('background_update'):
+            self.static_background.update_rows(image_clean[rows], background_mask[band_rows], rows, frames)
+
+    def _update_tiled(self, image_clean, rough_foreground_mask):
+        self._bands.map(lambda rows: self._update_band(image_clean, rough_foreground_mask, rows), image_clean.shape[0])
+
+    def _calc_prob_tiled(self, image_clean, background_info) -> np.ndarray:
+        foreground_probability = np.empty(image_clean.shape[:2], dtype=self._probability_dtype())
+
+        def calc_band(rows):
+            band_info = {key: value[rows] for key, value in background_info.items()}
+            with self.profiler.measure('calc_diff'):
+                difference = self.static_background.calc_diff(image_clean[rows], band_info['background'])
+            foreground_probability[rows] = self._calc_prob_from_difference(difference, band_info)
+
+        self._bands.map(calc_band, image_clean.shape[0])
+        return foreground_probability
+
+    def _clean_images(self, images) -> np.ndarray:
+        images_clean = np.empty_like(images)
+        with self.profiler.measure('clean'):
+            for image, image_clean in zip(images, images_clean):
+                image_clean[...] = self._clean_image(image)
+        return images_clean
+
+    def _calc_prob_from_difference(self, difference, background_info) -> np.ndarray:
+        """
+        Calculate the foreground probability from the difference (one image or a stack of them) to the background.
+        """
+        with self.profiler.measure('convert'):
+            foreground_probability = self._convert_to_percentage(difference, background_info['error'])
+            np.subtract(self._probability_scale(), foreground_probability, out=foreground_probability)
+            foreground_probability[..., background_info['mask'] == 0] = self._unknown_probability()
+        return foreground_probability
+
+    def _probability_dtype(self):
+        return self.PROBABILITY_DTYPES[self.config['probability']['dtype']]
+
+    def _probability_scale(self):
+        return 255 if self._probability_dtype() == np.uint8 else 1.0
+
+    def _unknown_probability(self):
+        return 128 if self._probability_dtype() == np.uint8 else 0.5
+
+    def _convert_to_percentage(self, difference, errors) -> np.ndarray:
+        """
+        Calculate the probability that the difference is just a background noise given its expected error.
+        It is a piecewise linear function of the ratio difference / error (see PROBABILITY_CURVE)
+        evaluated in a single pass.
+        """
+        # TODO it does work with initial error (big error means that everything can be background)
+        if self.config['probability']['method'] == 'lut':
+            return self._convert_to_percentage_lut(difference, errors)
+        elif self.config['probability']['method'] == 'linear':
+            dtype = self._probability_dtype()
+            ratio_dtype = np.float64 if dtype == np.float64 else np.float32
+            ratio = np.divide(difference, np.maximum(errors, self.MIN_ERROR, dtype=ratio_dtype), dtype=ratio_dtype)
+            return self._map_ratio(ratio, dtype)
+        else:
+            raise NotImplementedError(self.config['probability']['method'])
+
+    def _convert_to_percentage_lut(self, difference, errors) -> np.ndarray:
+        if self._probability_lut is None:
+            lut_errors, lut_differences = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+            lut_ratio = lut_differences / np.maximum(lut_errors, self.MIN_ERROR)
+            self._probability_lut = self._map_ratio(lut_ratio, self._probability_dtype()).ravel()
+
+        index = self._quantize(errors).astype(np.intp)
+        np.left_shift(index, 8, out=index)
+        # errors can be broadcast against a stack of differences
+        index = np.bitwise_or(index, self._quantize(difference))
+        return self._probability_lut.take(index)
+
+    def _map_ratio(self, ratio, dtype) -> np.ndarray:
+        if dtype == np.uint8:
+            prob = mathmap.piecewise_linear_mapping(ratio, *self.PROBABILITY_CURVE, dtype=np.float32)
+            return np.rint(np.multiply(prob, 255, out=prob), out=prob).astype(np.uint8)
+        return mathmap.piecewise_linear_mapping(ratio, *self.PROBABILITY_CURVE, dtype=dtype)
+
+    @staticmethod
+    def _quantize(values) -> np.ndarray:
+        if values.dtype == np.uint8:
+            return values
+        return np.clip(np.rint(values), 0, 255).astype(np.uint8)
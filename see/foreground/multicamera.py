@@ -0,0 +1,347 @@
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import traceback
+import typing as t
+from multiprocessing import resource_tracker
+
+import numpy as np
+
+from see._commons.sharedmem import SharedFrameRing
+from see.foreground.finder import ForegroundFinder
+
+
+StreamResult = collections.namedtuple("StreamResult", ["stream_id", "seq", "probability"])
+
+
+class _Stream:
+    def __init__(self, stream_id, worker, config, frames, masks, probabilities):
+        self.stream_id = stream_id
+        self.worker = worker
+        self.config = config
+        self.frames = frames
+        self.masks = masks
+        self.probabilities = probabilities
+        self.free_slots = threading.Semaphore(frames.slots)
+        self.next_seq = 0
+        self.in_flight = collections.OrderedDict()  # seq -> (slot, has_mask, submit time)
+        self.done = 0
+        self.latency = 0.0
+        self.busy = 0.0
+        self.first_submit = None
+        self.last_result = None
+        self.restarts = 0
+        self.failed = 0
+        self.checkpoint_errors = 0
+        self.last_checkpoint_error = None
+
+    @property
+    def rings(self):
+        return self.frames.description, self.masks.description, self.probabilities.description
+
+
+class MultiCameraScheduler:
+    """
+    Runs one ForegroundFinder per camera stream in a pool of worker processes.
+    Each stream is pinned to one worker which keeps its background model, frames and probabilities
+    are passed through shared memory ring buffers and only small messages go through the queues.
+    Frames of one stream are processed and returned in the order of submission.
+    """
+    def __init__(self, workers=2, slots=4, threshold=0.5, checkpoint_dir=None, checkpoint_every=100,
+                 checkpoint_drift=None, pin_cpus=False, mp_context=None):
+        """
+        Args:
+            workers: number of worker processes
+            slots: number of frames of each stream that can be in flight, submit blocks when all are used
+            threshold: probability above which the pixel is considered foreground (if no mask is submitted)
+            checkpoint_dir: directory for the checkpoints of the models used to recover from worker crashes,
+                if None crashed worker starts its streams from scratch
+            checkpoint_every: number of frames between checkpoints of a stream
+            checkpoint_drift: if set the checkpoint is written only if the background drifted more than this
+                (see ForegroundFinder.save_background)
+            pin_cpus: pin each worker process to one cpu (linux only)
+            mp_context: multiprocessing context to use
+        """
+        self.config = {"workers": workers, "slots": slots, "threshold": threshold, "checkpoint_dir": checkpoint_dir,
+                       "checkpoint_every": checkpoint_every, "checkpoint_drift": checkpoint_drift, "pin_cpus": pin_cpus}
+        self._context = mp_context or multiprocessing.get_context()
+        self._workers = [None] * workers
+        self._tasks = [None] * workers
+        # every worker has its own channels so that a crash can only break the ones of the crashed worker
+        self._results = [None] * workers
+        self._received = collections.deque()
+        self._streams = {}
+        self._lock = threading.RLock()
+        # workers have to share the tracker of the shared memory with this process,
+        # otherwise the memory would be unlinked when any of them exits
+        resource_tracker.ensure_running()
+        for index in range(workers):
+            self._start_worker(index)
+
+    def add_stream(self, stream_id, shape, finder_config: dict = None):
+        """
+        Args:
+            stream_id: name of the stream, used also as the name of its checkpoint
+            shape: shape of the stream images (H, W, 3)
+            finder_config: parameters of ForegroundFinder.create_from_dicts
+        """
+        finder_config = finder_config or {}
+        dtype = {**ForegroundFinder.DEFAULT_PROBABILITY, **(finder_config.get('probability') or {})}['dtype']
+        if dtype not in ForegroundFinder.PROBABILITY_DTYPES:
+            raise NotImplementedError(dtype)
+        probability_dtype = ForegroundFinder.PROBABILITY_DTYPES[dtype]
+        slots = self.config['slots']
+        with self._lock:
+            assert stream_id not in self._streams, f"stream {stream_id} already added"
+            load = [sum(1 for s in self._streams.values() if s.worker == index) for index in range(len(self._workers))]
+            stream = _Stream(stream_id, int(np.argmin(load)), finder_config,
+                             SharedFrameRing(slots, shape, np.uint8),
+                             SharedFrameRing(slots, shape[:2], np.bool_),
+                             SharedFrameRing(slots, shape[:2], probability_dtype))
+            self._streams[stream_id] = stream
+            self._tasks[stream.worker].put(('add', stream_id, stream.rings, finder_config))
+
+    def submit(self, stream_id, image, rough_foreground_mask=None, timeout=None) -> int:
+        """
+        Queue the image of the stream for processing, blocks while all slots of the stream are in flight.
+        Returns:
+            sequence number of the frame in the stream
+        """
+        stream = self._streams[stream_id]
+        while not stream.free_slots.acquire(timeout=0.1):
+            self._check_workers()
+            if timeout is not None:
+                timeout -= 0.1
+                if timeout <= 0:
+                    raise TimeoutError(f"no free slot in stream {stream_id}")
+        with self._lock:
+            seq = stream.next_seq
+            stream.next_seq += 1
+            slot = seq % stream.frames.slots
+            stream.frames[slot] = image
+            has_mask = rough_foreground_mask is not None
+            if has_mask:
+                stream.masks[slot] = rough_foreground_mask
+            now = time.perf_counter()
+            stream.first_submit = stream.first_submit or now
+            stream.in_flight[seq] = (slot, has_mask, now)
+            self._tasks[stream.worker].put(('frame', stream_id, seq, slot, has_mask))
+        return seq
+
+    def get_result(self, timeout=None) -> t.Optional[StreamResult]:
+        """
+        Returns:
+            next processed frame of any stream or None if nothing arrived before the timeout
+        Raises:
+            RuntimeError: if the frame failed in the worker, its slot is freed and the stream goes on
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            self._check_workers()
+            if not self._received:
+                self._receive(timeout=0.1)
+            if not self._received:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                continue
+            result = self._handle_result(self._received.popleft())
+            if result is not None:
+                return result
+
+    def results(self) -> t.Iterator[StreamResult]:
+        """
+        Yields results until there are no frames in flight.
+        """
+        while self.in_flight():
+            result = self.get_result(timeout=1.0)
+            if result is not None:
+                yield result
+
+    def in_flight(self) -> int:
+        return sum(len(stream.in_flight) for stream in self._streams.values())
+
+    def report(self) -> dict:
+        """
+        Returns:
+            throughput of each stream: processed frames, fps since the first submit,
+            mean latency from submit to result, mean processing time in the worker, number of failed frames
+            and of failed checkpoints (the frames are still returned)
+        """
+        report = {}
+        for stream_id, stream in self._streams.items():
+            elapsed = (stream.last_result or time.perf_counter()) - (stream.first_submit or time.perf_counter())
+            report[stream_id] = {
+                'worker': stream.worker,
+                'frames': stream.done,
+                'fps': stream.done / elapsed if elapsed > 0 else 0.0,
+                'latency': stream.latency / max(1, stream.done),
+                'processing': stream.busy / max(1, stream.done),
+                'in_flight': len(stream.in_flight),
+                'restarts': stream.restarts,
+                'failed': stream.failed,
+                'checkpoint_errors': stream.checkpoint_errors,
+            }
+        return report
+
+    def close(self):
+        for index, worker in enumerate(self._workers):
+            if worker.is_alive():
+                self._tasks[index].put(('stop',))
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for connection in self._results:
+            connection.close()
+        for stream in self._streams.values():
+            stream.frames.close()
+            stream.masks.close()
+            stream.probabilities.close()
+        self._streams = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _receive(self, timeout):
+        for connection in multiprocessing.connection.wait(self._results, timeout=timeout):
+            try:
+                self._received.append(connection.recv())
+            except (EOFError, OSError):
+                pass  # the worker is gone, it will be restarted by the next check
+
+    def _handle_result(self, message) -> t.Optional[StreamResult]:
+        kind, stream_id, seq = message[:3]
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                return None
+            if kind == 'checkpoint_error':
+                stream.checkpoint_errors += 1
+                stream.last_checkpoint_error = message[3]
+                return None
+            if seq not in stream.in_flight:
+                return None  # duplicate from a worker that was restarted
+            assert seq == next(iter(stream.in_flight)), "frames of a stream should be processed in order"
+            slot, _, submitted = stream.in_flight.pop(seq)
+            stream.free_slots.release()
+            if kind == 'error':
+                # the slot is freed first so that the stream goes on with the next frames
+                stream.failed += 1
+                raise RuntimeError(f"stream {stream_id} failed on frame {seq}:\n{message[3]}")
+            probability = stream.probabilities[slot].copy()
+            now = time.perf_counter()
+            stream.done += 1
+            stream.latency += now - submitted
+            stream.busy += message[3]
+            stream.last_result = now
+            return StreamResult(stream_id, seq, probability)
+
+    def _start_worker(self, index):
+        cpu = None
+        if self.config['pin_cpus'] and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+            cpu = cpus[index % len(cpus)]
+        self._tasks[index] = self._context.Queue()
+        self._results[index], results = self._context.Pipe(duplex=False)
+        self._workers[index] = self._context.Process(
+            target=_worker_main, name=f"camera-worker-{index}", daemon=True,
+            args=(self._tasks[index], results, self.config['threshold'],
+                  self.config['checkpoint_dir'], self.config['checkpoint_every'], self.config['checkpoint_drift'], cpu))
+        self._workers[index].start()
+        results.close()
+
+    def _check_workers(self):
+        with self._lock:
+            for index, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    self._restart_worker(index)
+
+    def _restart_worker(self, index):
+        self._workers[index].join()
+        while self._results[index].poll():
+            try:
+                self._received.append(self._results[index].recv())
+            except (EOFError, OSError):
+                break
+        self._results[index].close()
+        self._start_worker(index)
+        for stream in self._streams.values():
+            if stream.worker == index:
+                stream.restarts += 1
+                self._tasks[index].put(('add', stream.stream_id, stream.rings, stream.config))
+                for seq, (slot, has_mask, _) in stream.in_flight.items():
+                    self._tasks[index].put(('frame', stream.stream_id, seq, slot, has_mask))
+
+
+def checkpoint_path(checkpoint_dir, stream_id) -> str:
+    return os.path.join(checkpoint_dir, str(stream_id))
+
+
+def _load_finder(checkpoint_dir, stream_id, config) -> ForegroundFinder:
+    finder = ForegroundFinder.create_from_dicts(**config)
+    if checkpoint_dir is not None and os.path.exists(checkpoint_path(checkpoint_dir, stream_id)):
+        finder.load_background(checkpoint_path(checkpoint_dir, stream_id))
+    return finder
+
+
+class _WorkerStream:
+    def __init__(self, finder, rings):
+        self.finder = finder
+        self.frames, self.masks, self.probabilities = [SharedFrameRing.attach(ring) for ring in rings]
+        self.processed = 0
+
+    def close(self):
+        self.frames.close()
+        self.masks.close()
+        self.probabilities.close()
+
+
+def _worker_main(tasks, results, threshold, checkpoint_dir, checkpoint_every, checkpoint_drift, cpu):
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    streams = {}
+    failed = {}  # stream_id -> error of the stream which could not be added, its frames fail with it
+    try:
+        while True:
+            message = tasks.get()
+            kind = message[0]
+            if kind == 'stop':
+                break
+            elif kind == 'add':
+                _, stream_id, rings, config = message
+                failed.pop(stream_id, None)
+                try:
+                    streams[stream_id] = _WorkerStream(_load_finder(checkpoint_dir, stream_id, config), rings)
+                except Exception:
+                    failed[stream_id] = traceback.format_exc()
+            elif kind == 'frame':
+                _, stream_id, seq, slot, has_mask = message
+                if stream_id in failed:
+                    results.send(('error', stream_id, seq, f"stream could not be added:\n{failed[stream_id]}"))
+                    continue
+                stream = streams[stream_id]
+                start = time.perf_counter()
+                try:
+                    mask = stream.masks[slot] if has_mask else None
+                    stream.probabilities[slot] = stream.finder.process(stream.frames[slot], mask, threshold=threshold)
+                except Exception:
+                    results.send(('error', stream_id, seq, traceback.format_exc()))
+                    continue
+                stream.processed += 1
+                if checkpoint_dir is not None and stream.processed % checkpoint_every == 0:
+                    # the frame is processed whatever happens to its checkpoint, the next one is tried again
+                    try:
+                        stream.finder.save_background(checkpoint_path(checkpoint_dir, stream_id),
+                                                      min_drift=checkpoint_drift, wait=False)
+                    except Exception:
+                        results.send(('checkpoint_error', stream_id, seq, traceback.format_exc()))
+                results.send(('result', stream_id, seq, time.perf_counter() - start))
+    finally:
+        for stream in streams.values():
+            stream.close()
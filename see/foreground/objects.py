@@ -0,0 +1,157 @@
+"""
+Extraction of the foreground objects from the probability maps: connected groups of the pixels above the threshold
+described with a compact record instead of the whole map.
+"""
+import typing as t
+
+import cv2
+import numpy as np
+
+import see._commons.pipeline as pipeline
+import see._commons.video as video
+from see.foreground.aided_segmentation import AidedSegmentation
+
+BACKENDS = ('auto', 'sep', 'opencv')
+
+# 32 bytes per object, the centroid is weighted with the probability
+OBJECT_DTYPE = np.dtype([('left', np.int32), ('top', np.int32), ('width', np.int32), ('height', np.int32),
+                         ('area', np.int32), ('x', np.float32), ('y', np.float32),
+                         ('mean_probability', np.float32)])
+
+
+def load_sep():
+    """
+    Returns:
+        the vendored SEP module or None if it is not available (the submodule is not checked out or built)
+    """
+    try:
+        import vendor.SEP.sep as sep
+    except ImportError:
+        return None
+    return sep if hasattr(sep, 'extract') else None
+
+
+class ObjectExtractor:
+    def __init__(self, threshold=0.5, min_area=1, backend='auto'):
+        """
+        Args:
+            threshold: probability above which the pixel belongs to an object
+            min_area: objects with fewer pixels are dropped
+            backend: extraction implementation
+                - sep: C extraction from the vendored SEP
+                - opencv: cv2.connectedComponentsWithStats
+                - auto: sep if it is available, opencv otherwise
+        """
+        if backend not in BACKENDS:
+            raise NotImplementedError(backend)
+        self.threshold = threshold
+        self.min_area = min_area
+        self._sep = None
+        if backend in ('auto', 'sep'):
+            self._sep = load_sep()
+            if self._sep is None and backend == 'sep':
+                raise ImportError("SEP is not available, checkout and build vendor/SEP")
+        self.backend = 'sep' if self._sep is not None else 'opencv'
+
+    def extract(self, probability: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            probability: float probability in [0, 1] or uint8 probability scaled to 0-255
+        Returns:
+            OBJECT_DTYPE array with one record per object (8-connected pixels above the threshold)
+        """
+        if self.backend == 'sep':
+            return self._extract_sep(probability)
+        return self._extract_opencv(probability)
+
+    def stream(self, probabilities: t.Iterable[np.ndarray]) -> t.Iterator[np.ndarray]:
+        for probability in probabilities:
+            yield self.extract(probability)
+
+    def _extract_sep(self, probability):
+        data = np.ascontiguousarray(probability, dtype=np.float32)
+        if probability.dtype == np.uint8:
+            data *= 1 / 255
+        # the pixel stack has to hold the largest object
+        self._sep.set_extract_pixstack(max(self._sep.get_extract_pixstack(), data.size))
+        found = self._sep.extract(data, self.threshold, minarea=self.min_area, filter_kernel=None,
+                                  deblend_cont=1.0, clean=False)
+
+        objects = np.empty(len(found), dtype=OBJECT_DTYPE)
+        objects['left'] = found['xmin']
+        objects['top'] = found['ymin']
+        objects['width'] = found['xmax'] - found['xmin'] + 1
+        objects['height'] = found['ymax'] - found['ymin'] + 1
+        objects['area'] = found['npix']
+        objects['x'] = found['x']
+        objects['y'] = found['y']
+        objects['mean_probability'] = found['flux'] / np.maximum(found['npix'], 1)
+        return objects
+
+    def _extract_opencv(self, probability):
+        mask = AidedSegmentation.foreground_mask(probability, self.threshold)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.view(np.uint8), connectivity=8,
+                                                                   ltype=cv2.CV_32S)
+
+        # only the object pixels are visited for the probability sums
+        ys, xs = np.nonzero(mask)
+        object_labels = labels[ys, xs]
+        weights = probability[ys, xs].astype(np.float64)
+        weight_sums = np.bincount(object_labels, weights, minlength=count)
+        x_sums = np.bincount(object_labels, weights * xs, minlength=count)
+        y_sums = np.bincount(object_labels, weights * ys, minlength=count)
+
+        kept = np.flatnonzero(stats[:, cv2.CC_STAT_AREA] >= self.min_area)
+        kept = kept[kept > 0]
+        areas = stats[kept, cv2.CC_STAT_AREA]
+        weight_sums = np.maximum(weight_sums[kept], np.finfo(np.float64).tiny)
+
+        objects = np.empty(len(kept), dtype=OBJECT_DTYPE)
+        objects['left'] = stats[kept, cv2.CC_STAT_LEFT]
+        objects['top'] = stats[kept, cv2.CC_STAT_TOP]
+        objects['width'] = stats[kept, cv2.CC_STAT_WIDTH]
+        objects['height'] = stats[kept, cv2.CC_STAT_HEIGHT]
+        objects['area'] = areas
+        objects['x'] = x_sums[kept] / weight_sums
+        objects['y'] = y_sums[kept] / weight_sums
+        objects['mean_probability'] = weight_sums / areas / (255 if probability.dtype == np.uint8 else 1)
+        return objects
+
+
+def run_on_video(video_path, aided_segmentator: AidedSegmentation, extractor: ObjectExtractor,
+                 sink: t.Callable[[int, np.ndarray], None], mask_path=None, threshold=0.5, queue_size=8,
+                 report=None, report_every=100) -> pipeline.PipelineStats:
+    """
+    Run the segmentation over the video and pass the objects found in every frame to the sink.
+    Decoding, segmentation and extraction run as separate threads connected with bounded queues.
+    Args:
+        video_path: path to the input video
+        aided_segmentator: segmentation to run
+        extractor: extraction of the objects from the probability
+        sink: called with the index of the frame and its objects, in the order of the frames
+        mask_path: optional video with rough foreground masks used to update the model,
+            if None the thresholded probability is used
+        threshold: probability above which the pixel is considered foreground in the update
+        queue_size: maximum number of frames waiting between the stages
+        report: called with pipeline stats every report_every frames
+    Returns:
+        pipeline stats with the end to end fps
+    """
+    frames = video.read_frames(video_path)
+    if mask_path is not None:
+        source = enumerate(zip(frames, video.read_masks(mask_path)))
+    else:
+        source = enumerate((frame, None) for frame in frames)
+
+    def segment(item):
+        index, (image, rough_foreground_mask) = item
+        return index, aided_segmentator.process(image, rough_foreground_mask, threshold=threshold)
+
+    def extract(item):
+        index, probability = item
+        return index, extractor.extract(probability)
+
+    stages = [("segment", segment),
+              ("extract", extract),
+              ("sink", lambda item: sink(*item))]
+    return pipeline.run_pipeline(source, stages, queue_size=queue_size, report=report, report_every=report_every)
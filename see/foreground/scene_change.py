@@ -0,0 +1,85 @@
+import typing as t
+
+import cv2
+import numpy as np
+
+
+class SceneChangeDetector:
+    """
+    Detects global changes of the scene (moved camera, switched lights) from a sparse grid of pixels:
+    the fraction of the pixels with high foreground probability and the distance of the colour histogram
+    of the grid to the histogram of the recent static frames.
+    The frame is suspicious when any statistic is above its enter threshold and the suspicion ends only
+    when all are below their exit thresholds, the change is reported after the given number of suspicious frames.
+    """
+    def __init__(self, step=8, foreground_fraction: t.Sequence[float] = (0.6, 0.4),
+                 histogram_distance: t.Sequence[float] = (0.5, 0.3), frames=3, histogram_bins=8, adaptation=0.05):
+        """
+        Args:
+            step: distance of the sampled pixels in both directions
+            foreground_fraction: (enter, exit) thresholds of the fraction of the sampled pixels
+                with probability above 0.9
+            histogram_distance: (enter, exit) thresholds of the Bhattacharyya distance of the colour histograms
+            frames: number of consecutive suspicious frames reported as a change
+            histogram_bins: number of bins per channel of the colour histogram
+            adaptation: weight of the new histogram in the reference histogram of the static frames
+        """
+        self.step = step
+        self.foreground_fraction = foreground_fraction
+        self.histogram_distance = histogram_distance
+        self.frames = frames
+        self.histogram_bins = histogram_bins
+        self.adaptation = adaptation
+        self.changes = 0
+        self.last = {}
+        self._reference_histogram = None
+        self._suspicious_frames = 0
+
+    def check(self, image, foreground_probability, scale=1.0, mask=None) -> bool:
+        """
+        Args:
+            image: (H, W, 3) uint8 image
+            foreground_probability: (H, W) foreground probability of the image
+            scale: probability of the certain foreground (1.0 or 255 for uint8)
+            mask: (H, W) bool mask of the checked pixels (e.g. the regions of interest), if None all are checked
+        Returns:
+            True if the scene changed, the detector then starts again from this frame
+        """
+        sampled_mask = mask[::self.step, ::self.step] if mask is not None else None
+        sampled_probability = foreground_probability[::self.step, ::self.step]
+        if sampled_mask is not None:
+            sampled_probability = sampled_probability[sampled_mask]
+        fraction = np.count_nonzero(sampled_probability > 0.9 * scale) / max(sampled_probability.size, 1)
+        histogram = self._histogram(image, sampled_mask)
+        if self._reference_histogram is None:
+            self._reference_histogram = histogram
+        distance = cv2.compareHist(self._reference_histogram, histogram, cv2.HISTCMP_BHATTACHARYYA)
+
+        if fraction > self.foreground_fraction[0] or distance > self.histogram_distance[0]:
+            self._suspicious_frames += 1
+        elif fraction < self.foreground_fraction[1] and distance < self.histogram_distance[1]:
+            self._suspicious_frames = 0
+        if self._suspicious_frames == 0:
+            cv2.addWeighted(self._reference_histogram, 1 - self.adaptation, histogram, self.adaptation, 0,
+                            dst=self._reference_histogram)
+
+        changed = self._suspicious_frames >= self.frames
+        self.last = {'foreground_fraction': fraction, 'histogram_distance': distance,
+                     'suspicious_frames': self._suspicious_frames, 'changed': changed}
+        if changed:
+            self.changes += 1
+            self._reference_histogram = histogram
+            self._suspicious_frames = 0
+        return changed
+
+    def reset(self):
+        self._reference_histogram = None
+        self._suspicious_frames = 0
+
+    def _histogram(self, image, sampled_mask=None) -> np.ndarray:
+        sample = np.ascontiguousarray(image[::self.step, ::self.step])
+        if sampled_mask is not None:
+            sampled_mask = sampled_mask.astype(np.uint8)
+        bins = self.histogram_bins
+        histogram = cv2.calcHist([sample], [0, 1, 2], sampled_mask, [bins, bins, bins], [0, 256, 0, 256, 0, 256])
+        return histogram / max(histogram.sum(), 1)
@@ -0,0 +1,117 @@
+import math
+import typing as t
+
+import numpy as np
+
+import see._commons.tiling as tiles
+
+
+class UpdateScheduler:
+    """
+    Decides per frame how much of the background model is updated so that calc_prob and update of the frame
+    fit into the latency budget: the whole model, a part of the horizontal bands of rows (rotating so that
+    all of them are refreshed in turn) or nothing.
+    When the background is stable (the difference of the sampled background pixels to the model is just noise)
+    only the bands needed to refresh the whole model in refresh_frames frames are updated,
+    when it drifts (e.g. the lighting changes) the whole model is updated if the budget allows.
+    While the background changes the bands which were not updated for several frames are updated with the weight
+    of that many frames (see StaticBackgroundModel.update_rows) so they keep up with the change,
+    while it is stable they are updated with the usual weight so the rarely updated rows just average more frames.
+    """
+    def __init__(self, budget_ms, band_rows=32, change_threshold=0.2, refresh_frames=8, warmup_frames=30, step=8,
+                 cost_adaptation=0.2):
+        """
+        Args:
+            budget_ms: time available for calc_prob and update of one frame
+            band_rows: number of rows in the band, the unit of the partial update
+            change_threshold: change rate (see change_rate) above which the background is considered changing
+            refresh_frames: number of frames in which all bands are updated when the background is stable
+            warmup_frames: number of frames after the initialization of the model in which the background
+                is considered changing (the expected errors of the new model are still converging)
+            step: distance of the pixels sampled for the change rate in both directions
+            cost_adaptation: weight of the new measurement in the estimate of the update time per row
+        """
+        self.budget_ms = budget_ms
+        self.band_rows = band_rows
+        self.change_threshold = change_threshold
+        self.refresh_frames = refresh_frames
+        self.warmup_frames = warmup_frames
+        self.step = step
+        self.cost_adaptation = cost_adaptation
+        self.counts = {'full': 0, 'partial': 0, 'skip': 0}
+        self.last = {}
+        self._ms_per_row = None
+        self._next_band = 0
+        self._frame = 0
+        self._updated_frames = None
+
+    def plan(self, height, elapsed_ms, change) -> t.List[t.Tuple[slice, int]]:
+        """
+        Args:
+            height: number of rows of the model
+            elapsed_ms: time already spent on the frame
+            change: change rate of the background (see change_rate)
+        Returns:
+            bands of rows to update (all of them for the full update, none to skip the update)
+            with the number of frames since their last update
+        """
+        bands = tiles.split_rows(height, self.band_rows)
+        self._frame += 1
+        if self._updated_frames is None or len(self._updated_frames) != len(bands):
+            self._updated_frames = np.full(len(bands), self._frame - 1)
+        changing = change > self.change_threshold or self._frame <= self.warmup_frames
+        if changing:
+            wanted = len(bands)
+        else:
+            wanted = math.ceil(len(bands) / self.refresh_frames)
+        if self._ms_per_row is None:
+            affordable = len(bands)
+        else:
+            affordable = int((self.budget_ms - elapsed_ms) / (self._ms_per_row * self.band_rows))
+        count = max(0, min(wanted, affordable, len(bands)))
+
+        decision = 'full' if count == len(bands) else 'partial' if count > 0 else 'skip'
+        self.counts[decision] += 1
+        self.last = {'decision': decision, 'bands': count, 'change': change, 'elapsed_ms': elapsed_ms}
+        if decision == 'full':
+            indices = np.arange(len(bands))
+        else:
+            indices = (self._next_band + np.arange(count)) % len(bands)
+            self._next_band = (self._next_band + count) % len(bands)
+        planned = [(bands[i], int(self._frame - self._updated_frames[i]) if changing else 1) for i in indices]
+        self._updated_frames[indices] = self._frame
+        return planned
+
+    def record(self, rows, seconds):
+        """
+        Update the estimate of the update time per row with the measured update of the given number of rows.
+        """
+        if rows == 0:
+            return
+        ms_per_row = seconds * 1000 / rows
+        if self._ms_per_row is None:
+            self._ms_per_row = ms_per_row
+        else:
+            self._ms_per_row += self.cost_adaptation * (ms_per_row - self._ms_per_row)
+
+    def change_rate(self, model, image_clean, foreground_mask) -> float:
+        """
+        Systematic part of the difference between the image and the model: absolute value of the mean
+        signed difference (mean over the channels) relative to the mean absolute difference,
+        over the sampled pixels which are known background of the model and are not in the foreground mask.
+        It is close to 0 when the difference is just noise and close to 1 when the whole background drifts.
+        """
+        sampled_mask = ~foreground_mask[::self.step, ::self.step] & model.get_details(step=self.step)['mask']
+        if not sampled_mask.any():
+            return 0.0
+        sampled_image = image_clean[::self.step, ::self.step][sampled_mask]
+        difference = np.mean(sampled_image - model.get(step=self.step)[sampled_mask], axis=1, dtype=np.float32)
+        return float(abs(difference.mean()) / max(np.abs(difference).mean(), 1e-6))
+
+    def reset(self):
+        """
+        Start again with the model initialized by the full update of the current frame.
+        """
+        self._next_band = 0
+        self._frame = 0
+        self._updated_frames = None
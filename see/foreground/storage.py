@@ -0,0 +1,206 @@
+"""
+On-disk format of the probability map sequences.
+
+The maps are quantized to uint8 and stored in zlib compressed chunks of consecutive frames.
+The file ends with the index of the chunks so a reader can decompress only the chunk of the requested frame.
+Optionally the long runs of the constant values (0 and 0.5 from calc_prob) are run-length encoded before
+the compression which makes the compression of the mostly static maps much cheaper.
+
+Layout (little endian):
+    header: magic, version, height, width, chunk_frames, rle flag
+    chunks: zlib(frame count, frame offsets, frames)
+    index: offset and compressed size of every chunk
+    trailer: offset of the index, number of frames, magic
+"""
+import mmap
+import struct
+import typing as t
+import zlib
+
+import numpy as np
+
+import see._commons.video as video
+
+MAGIC = b'SEEPROB\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIB')
+TRAILER = struct.Struct('<QI8s')
+
+# values of the runs encoded with rle: 0 and 0.5 after the quantization
+FILL_VALUES = (0, 128)
+MIN_RUN = 16
+
+
+def rle_encode(frame: np.ndarray, fill_values=FILL_VALUES, min_run=MIN_RUN) -> bytes:
+    """
+    Encode the runs of the fill values not shorter than min_run, other pixels are kept as they are.
+    Returns:
+        number of segments, segment lengths, segment values (-1 for the literal pixels), literal pixels
+    """
+    flat = frame.ravel()
+    starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+    lengths = np.diff(np.append(starts, flat.size))
+    values = flat[starts]
+    fill = np.isin(values, fill_values) & (lengths >= min_run)
+
+    # every fill run is a segment, consecutive other runs are merged into one literal segment
+    new_segment = fill.copy()
+    new_segment[0] = True
+    new_segment[1:] |= fill[:-1]
+    segment_starts = np.flatnonzero(new_segment)
+    segment_lengths = np.add.reduceat(lengths, segment_starts).astype(np.uint32)
+    segment_values = np.where(fill[segment_starts], values[segment_starts], -1).astype(np.int16)
+    literals = flat[~np.repeat(segment_values >= 0, segment_lengths)]
+    return b''.join([struct.pack('<I', len(segment_starts)), segment_lengths.tobytes(), segment_values.tobytes(),
+                     literals.tobytes()])
+
+
+def rle_decode(data, shape) -> np.ndarray:
+    buffer = memoryview(data)
+    count, = struct.unpack_from('<I', buffer)
+    segment_lengths = np.frombuffer(buffer, np.uint32, count, 4)
+    segment_values = np.frombuffer(buffer, np.int16, count, 4 + 4 * count)
+    literals = np.frombuffer(buffer, np.uint8, offset=4 + 6 * count)
+
+    frame = np.repeat(segment_values.astype(np.uint8), segment_lengths)
+    frame[np.repeat(segment_values < 0, segment_lengths)] = literals
+    return frame.reshape(shape)
+
+
+class ProbabilityWriter:
+    """
+    Writes the sequence of the probability maps of the same shape.
+    """
+    def __init__(self, path, chunk_frames=16, rle=False, level=1):
+        """
+        Args:
+            path: output file
+            chunk_frames: number of frames compressed together, reading any frame decompresses its whole chunk
+            rle: run-length encode the long runs of 0 and 0.5 before the compression
+            level: zlib compression level
+        """
+        self.path = str(path)
+        self.chunk_frames = chunk_frames
+        self.rle = rle
+        self.level = level
+        self.frames = 0
+        self.shape = None
+        self._file = open(self.path, 'wb')
+        self._chunk = []
+        self._index = []
+
+    def write(self, probability: np.ndarray):
+        """
+        Args:
+            probability: float probability in [0, 1] or uint8 probability scaled to 0-255
+        """
+        if self.shape is None:
+            self.shape = probability.shape
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.shape[0], self.shape[1], self.chunk_frames, self.rle))
+        elif probability.shape != self.shape:
+            raise ValueError(f"Shape {probability.shape} differs from the shape of the sequence {self.shape}")
+
+        frame = np.ascontiguousarray(video.to_uint8(probability))
+        self._chunk.append(rle_encode(frame) if self.rle else frame.tobytes())
+        self.frames += 1
+        if len(self._chunk) == self.chunk_frames:
+            self._flush_chunk()
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.shape is None:
+            self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, self.chunk_frames, self.rle))
+        self._flush_chunk()
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=np.uint64).reshape(-1, 2).tobytes())
+        self._file.write(TRAILER.pack(index_offset, self.frames, MAGIC))
+        self._file.close()
+        self._file = None
+
+    def _flush_chunk(self):
+        if not self._chunk:
+            return
+        offsets = np.cumsum([0] + [len(frame) for frame in self._chunk], dtype=np.uint32)
+        payload = b''.join([struct.pack('<I', len(self._chunk)), offsets.tobytes()] + self._chunk)
+        compressed = zlib.compress(payload, self.level)
+        self._index.append((self._file.tell(), len(compressed)))
+        self._file.write(compressed)
+        self._chunk = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ProbabilityReader:
+    """
+    Lazy reader of the file written by ProbabilityWriter, the file is memory mapped
+    and only the chunk of the requested frame is decompressed (the last one is kept for the sequential reading).
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size + TRAILER.size or self._mmap[:len(MAGIC)] != MAGIC:
+            raise IOError(f"{self.path} is not a probability file")
+        _, version, height, width, self.chunk_frames, rle = HEADER.unpack_from(self._mmap)
+        if version != VERSION:
+            raise NotImplementedError(f"version {version}")
+        index_offset, self.frames, magic = TRAILER.unpack_from(self._mmap, len(self._mmap) - TRAILER.size)
+        if magic != MAGIC:
+            raise IOError(f"{self.path} is not complete, the writer was not closed")
+        self.shape = (height, width)
+        self.rle = bool(rle)
+        chunks = (len(self._mmap) - TRAILER.size - index_offset) // 16
+        self._index = np.frombuffer(self._mmap, np.uint64, 2 * chunks, index_offset).reshape(-1, 2).copy()
+        self._cached_chunk = None
+        self._cached = None
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, frame_index) -> np.ndarray:
+        """
+        Returns:
+            uint8 probability scaled to 0-255
+        """
+        if frame_index < 0:
+            frame_index += self.frames
+        if not 0 <= frame_index < self.frames:
+            raise IndexError(frame_index)
+        chunk_index, position = divmod(frame_index, self.chunk_frames)
+        if chunk_index != self._cached_chunk:
+            offset, size = (int(value) for value in self._index[chunk_index])
+            self._cached = zlib.decompress(self._mmap[offset:offset + size])
+            self._cached_chunk = chunk_index
+
+        count, = struct.unpack_from('<I', self._cached)
+        start, end = np.frombuffer(self._cached, np.uint32, 2, 4 + 4 * position)
+        if self.rle:
+            return rle_decode(memoryview(self._cached)[start + 4 * (count + 2):end + 4 * (count + 2)], self.shape)
+        return np.frombuffer(self._cached, np.uint8, end - start, start + 4 * (count + 2)).reshape(self.shape).copy()
+
+    def __iter__(self) -> t.Iterator[np.ndarray]:
+        for frame_index in range(self.frames):
+            yield self[frame_index]
+
+    def probability(self, frame_index) -> np.ndarray:
+        """
+        Returns:
+            float32 probability in [0, 1]
+        """
+        return self[frame_index].astype(np.float32) / 255
+
+    def close(self):
+        self._index = None
+        self._cached = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
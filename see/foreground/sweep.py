@@ -0,0 +1,252 @@
+"""
+Parameter sweep of ForegroundFinder configurations over one clip: every frame is decoded once into shared memory
+and processed by all configurations running in a pool of worker processes, each of them scored against
+the ground truth masks.
+"""
+import copy
+import itertools
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+import typing as t
+from multiprocessing import resource_tracker
+
+import numpy as np
+
+from see._commons.sharedmem import SharedFrameRing
+from see.foreground.finder import ForegroundFinder
+
+RANK_KEYS = ('iou', 'f1', 'precision', 'recall', 'fps')
+
+
+def expand_grid(base: dict, grid: t.Dict[str, t.Sequence]) -> t.List[dict]:
+    """
+    Args:
+        base: parameters of ForegroundFinder.create_from_dicts shared by all configurations
+        grid: values of the swept parameters, the nested ones are given by the dotted path
+            e.g. {'config_background_model.update_inertia': [5, 10], 'cleaning.size': [3, 5]}
+    Returns:
+        configuration for every combination of the values
+    """
+    configs = []
+    for values in itertools.product(*grid.values()):
+        config = copy.deepcopy(base)
+        for path, value in zip(grid, values):
+            *parents, name = path.split('.')
+            node = config
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            node[name] = value
+        configs.append(config)
+    return configs
+
+
+def flatten(config: dict, prefix='') -> dict:
+    """
+    Returns:
+        the nested parameters by their dotted path (see expand_grid)
+    """
+    flat = {}
+    for name, value in config.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + '.'))
+        else:
+            flat[prefix + name] = value
+    return flat
+
+
+def run_sweep(configs: t.Sequence[dict], frames: t.Iterable[np.ndarray],
+              masks: t.Optional[t.Iterable[np.ndarray]] = None, workers=None, chunk_frames=16, threshold=0.5,
+              warmup_frames=0, update_with_truth=True, rank_by='iou', mp_context=None, timeout=600.0) -> t.List[dict]:
+    """
+    Process the clip with every configuration.
+    The frames are decoded into one half of a double buffer of chunk_frames frames in shared memory
+    while the workers process the other half, so the clip is read once whatever the number of configurations.
+    Args:
+        configs: parameters of ForegroundFinder.create_from_dicts
+        frames: RGB uint8 frames of the clip e.g. video.read_frames(path)
+        masks: ground truth foreground masks of the frames, if None the configurations are not scored
+        workers: number of worker processes, the configurations are split between them,
+            by default one per cpu (at most one per configuration)
+        chunk_frames: number of frames passed to the workers at once
+        threshold: probability above which the pixel is considered foreground
+        warmup_frames: number of the first frames which are processed but not scored
+        update_with_truth: the finders are updated with the ground truth masks (if given),
+            otherwise with their own foreground above the threshold
+        rank_by: key of the result by which the configurations are ranked (see RANK_KEYS),
+            only fps is available without masks
+        mp_context: multiprocessing context to use
+        timeout: maximum time to wait for the workers to process a chunk
+    Returns:
+        result of every configuration from the best one: config, frames, fps (of the processing in the worker)
+        and if masks are given the iou, precision, recall and f1 of the foreground
+    """
+    if rank_by not in RANK_KEYS:
+        raise NotImplementedError(rank_by)
+    if not configs:
+        return []
+    workers = min(len(configs), workers or os.cpu_count() or 1)
+    context = mp_context or multiprocessing.get_context()
+    frames = iter(frames)
+    masks = iter(masks) if masks is not None else None
+    first = next(frames, None)
+    if first is None:
+        return []
+
+    rings = [SharedFrameRing(2 * chunk_frames, first.shape, np.uint8)]
+    if masks is not None:
+        rings.append(SharedFrameRing(2 * chunk_frames, first.shape[:2], np.bool_))
+    # workers have to share the tracker of the shared memory with this process (see MultiCameraScheduler)
+    resource_tracker.ensure_running()
+    results = context.Queue()
+    tasks = [context.Queue() for _ in range(workers)]
+    processes = [context.Process(target=_worker_main, name=f"sweep-worker-{index}", daemon=True,
+                                 args=(index, tasks[index], results, [ring.description for ring in rings],
+                                       {i: configs[i] for i in range(index, len(configs), workers)},
+                                       threshold, warmup_frames, update_with_truth))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    decode_seconds = 0.0
+    scores = {}
+    stopped = False
+    try:
+        pending = {}  # chunk -> number of workers still processing it
+        frames = itertools.chain([first], frames)
+        chunk = 0
+        while True:
+            # the half of the buffer is written only after all workers finished the chunk which used it before
+            while chunk - 2 in pending:
+                _receive(results, pending, scores, processes, timeout)
+            decode_start = time.perf_counter()
+            base = (chunk % 2) * chunk_frames
+            count = 0
+            for frame in itertools.islice(frames, chunk_frames):
+                rings[0][base + count] = frame
+                if masks is not None:
+                    rings[1][base + count] = next(masks)
+                count += 1
+            decode_seconds += time.perf_counter() - decode_start
+            if count == 0:
+                break
+            pending[chunk] = workers
+            for worker_tasks in tasks:
+                worker_tasks.put(('chunk', chunk, base, count))
+            chunk += 1
+        for worker_tasks in tasks:
+            worker_tasks.put(('stop',))
+        stopped = True
+        while len(scores) < len(configs):
+            _receive(results, pending, scores, processes, timeout)
+    finally:
+        if not stopped:
+            for process in processes:
+                process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for ring in rings:
+            ring.close()
+
+    wall_seconds = time.perf_counter() - start
+    ranked = []
+    for index, config in enumerate(configs):
+        result = _summarize(config, scores[index], masks is not None)
+        result.update({'decode_seconds': decode_seconds, 'wall_seconds': wall_seconds})
+        ranked.append(result)
+    if masks is None and rank_by != 'fps':
+        rank_by = 'fps'
+    return sorted(ranked, key=lambda r: r[rank_by], reverse=True)
+
+
+def format_table(results: t.Sequence[dict], keys=('iou', 'precision', 'recall', 'fps')) -> str:
+    """
+    Table of the ranked results, the configurations are shown by the parameters which differ between them.
+    """
+    flat = [flatten(result['config']) for result in results]
+    names = sorted({name for config in flat for name in config})
+    varied = [name for name in names if len({repr(config.get(name)) for config in flat}) > 1]
+    keys = [key for key in keys if results and key in results[0]]
+    rows = [['rank'] + varied + list(keys)]
+    for rank, (result, config) in enumerate(zip(results, flat), 1):
+        rows.append([str(rank)] + [str(config.get(name, '-')) for name in varied]
+                    + [f"{result[key]:.1f}" if key == 'fps' else f"{result[key]:.3f}" for key in keys])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def _receive(results, pending, scores, processes, timeout):
+    try:
+        message = results.get(timeout=timeout)
+    except queue.Empty:
+        dead = [process.name for process in processes if not process.is_alive()]
+        raise RuntimeError(f"sweep workers did not respond in {timeout} s" + (f", {dead} died" if dead else ""))
+    kind = message[0]
+    if kind == 'error':
+        raise RuntimeError(f"sweep worker {message[1]} failed:\n{message[2]}")
+    elif kind == 'done':
+        pending[message[2]] -= 1
+        if pending[message[2]] == 0:
+            del pending[message[2]]
+    elif kind == 'scores':
+        scores.update(message[2])
+
+
+def _summarize(config, score, scored) -> dict:
+    result = {'config': config, 'frames': score['frames'],
+              'fps': score['frames'] / score['seconds'] if score['seconds'] > 0 else 0.0}
+    if scored:
+        true_positives, false_positives, false_negatives = \
+            score['true_positives'], score['false_positives'], score['false_negatives']
+        precision = true_positives / max(1, true_positives + false_positives)
+        recall = true_positives / max(1, true_positives + false_negatives)
+        result.update({
+            'iou': true_positives / max(1, true_positives + false_positives + false_negatives),
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0,
+        })
+    return result
+
+
+def _worker_main(index, tasks, results, rings, configs, threshold, warmup_frames, update_with_truth):
+    rings = [SharedFrameRing.attach(ring) for ring in rings]
+    frames, masks = rings[0], rings[1] if len(rings) > 1 else None
+    try:
+        finders = {i: ForegroundFinder.create_from_dicts(**config) for i, config in configs.items()}
+        scores = {i: {'frames': 0, 'seconds': 0.0, 'true_positives': 0, 'false_positives': 0,
+                      'false_negatives': 0} for i in configs}
+        seen = 0
+        while True:
+            message = tasks.get()
+            if message[0] == 'stop':
+                break
+            _, chunk, base, count = message
+            # every finder processes the whole chunk in turn so that its state stays in the cache
+            for i, finder in finders.items():
+                for n, slot in enumerate(range(base, base + count)):
+                    mask = masks[slot] if masks is not None else None
+                    start = time.perf_counter()
+                    probability = finder.process(frames[slot], mask if update_with_truth else None,
+                                                 threshold=threshold)
+                    scores[i]['seconds'] += time.perf_counter() - start
+                    scores[i]['frames'] += 1
+                    if mask is not None and seen + n >= warmup_frames:
+                        detected = finder.foreground_mask(probability, threshold)
+                        true_positives = np.count_nonzero(detected & mask)
+                        scores[i]['true_positives'] += true_positives
+                        scores[i]['false_positives'] += np.count_nonzero(detected) - true_positives
+                        scores[i]['false_negatives'] += np.count_nonzero(mask) - true_positives
+            seen += count
+            results.put(('done', index, chunk))
+        results.put(('scores', index, scores))
+    except Exception:
+        results.put(('error', index, traceback.format_exc()))
+    finally:
+        for ring in rings:
+            ring.close()
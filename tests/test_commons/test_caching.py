@@ -0,0 +1,25 @@
+import numpy as np
+
+import see._commons.caching as caching
+import tests.testbase
+
+
+class TestCaching(tests.testbase.TestBase):
+    def test_frame_cache(self):
+        cache = caching.FrameCache(frames=2)
+        images = [np.full((40, 40, 3), i, dtype=np.uint8) for i in range(3)]
+        for i, image in enumerate(images):
+            cache.put(image, i)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(images[0]))
+        self.assertEqual(2, cache.get(images[2]))
+        self.assertIsNone(cache.get(images[2].copy()))
+
+        images[1][...] = 7
+        self.assertIsNone(cache.get(images[1]))
+        # a single changed pixel of a reused buffer is not served the stale value
+        cache.put(images[1], 1)
+        images[1][13, 29, 2] = 8
+        self.assertIsNone(cache.get(images[1]))
+        cache.clear()
+        self.assertIsNone(cache.get(images[2]))
@@ -31,3 +31,12 @@ class TestMathMap(tests.testbase.TestBase):
         self.assertEqual(prob[0, 1], 0.75)
         self.assertEqual(prob[1, 0], 0.75)
         self.assertEqual(prob[1, 1], 0.5)
+
+    def test_piecewise_linear_mapping(self):
+        xs = np.array([-1.0, 0.0, 0.5, 1.0, 2.0, 3.0, 10.0])
+        ys = mathmap.piecewise_linear_mapping(xs, knots_x=(0, 1, 3), knots_y=(1.0, 0.5, 0.0))
+        np.testing.assert_almost_equal(ys, [1.0, 1.0, 0.75, 0.5, 0.25, 0.0, 0.0])
+
+        ys = mathmap.piecewise_linear_mapping(xs.astype(np.float32), knots_x=(0, 1, 3), knots_y=(1.0, 0.5, 0.0),
+                                              dtype=np.float32)
+        self.assertEqual(np.float32, ys.dtype)
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import see._commons.pipeline as pipeline
+import tests.testbase
+
+
+class TestPipeline(tests.testbase.TestBase):
+    def test_stages_keep_order(self):
+        results = []
+        stats = pipeline.run_pipeline(range(50), [("double", lambda x: 2 * x),
+                                                  ("collect", results.append)], queue_size=2)
+        self.assertEqual([2 * x for x in range(50)], results)
+        self.assertEqual(50, stats.frames)
+        self.assertEqual([50, 50], [stage.items for stage in stats.stages])
+        self.assertGreater(stats.fps, 0)
+
+    def test_stages_run_in_threads(self):
+        thread_names = set()
+
+        def slow(item):
+            thread_names.add(threading.current_thread().name)
+            time.sleep(0.01)
+            return item
+
+        start = time.perf_counter()
+        pipeline.run_pipeline(range(20), [("first", slow), ("second", slow)], queue_size=1)
+        elapsed = time.perf_counter() - start
+        self.assertEqual({"pipeline-first", "pipeline-second"}, thread_names)
+        self.assertLess(elapsed, 20 * 2 * 0.01)
+
+    def test_back_pressure(self):
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        def slow_sink(item):
+            time.sleep(0.005)
+            # source can only be ahead by the queued items and the ones being processed
+            self.assertLessEqual(len(produced) - item, 2 * 3 + 3)
+
+        pipeline.run_pipeline(source(), [("pass", lambda x: x), ("sink", slow_sink)], queue_size=3)
+
+    def test_error_is_raised(self):
+        def broken(item):
+            if item == 5:
+                raise ValueError("broken")
+            return item
+
+        with self.assertRaises(ValueError):
+            pipeline.run_pipeline(range(1000), [("broken", broken), ("sink", lambda x: None)])
+
+    def test_report(self):
+        reports = []
+        pipeline.run_pipeline(range(10), [("sink", lambda x: None)], report=lambda s: reports.append(s.frames),
+                              report_every=3)
+        self.assertEqual([3, 6, 9], reports)
@@ -0,0 +1,47 @@
+import pickle
+
+import see._commons.profiling as profiling
+import tests.testbase
+
+
+class TestProfiling(tests.testbase.TestBase):
+    def test_disabled_records_nothing(self):
+        profiler = profiling.StageProfiler()
+        with profiler.measure('stage'):
+            pass
+        self.assertEqual({}, profiler.stats())
+
+    def test_stats(self):
+        profiler = profiling.StageProfiler(enabled=True, window=4)
+        for seconds in [0.001, 0.002, 0.003, 0.004, 0.010]:
+            profiler.record('stage', seconds)
+        with profiler.measure('other'):
+            pass
+
+        stats = profiler.stats()
+        self.assertEqual({'stage', 'other'}, set(stats))
+        self.assertEqual(5, stats['stage']['calls'])
+        self.assertAlmostEqual(20, stats['stage']['total_ms'])
+        # percentiles and histogram only of the last 4 calls
+        self.assertAlmostEqual(4.75, stats['stage']['mean_ms'])
+        self.assertAlmostEqual(10, stats['stage']['max_ms'])
+        self.assertEqual(4, sum(stats['stage']['histogram']['counts']))
+        histogram = stats['stage']['histogram']
+        self.assertEqual(len(histogram['counts']) + 1, len(histogram['edges_ms']))
+        self.assertLessEqual(histogram['edges_ms'][0], 2)
+        self.assertGreater(histogram['edges_ms'][-1], 10)
+
+        profiler.reset()
+        self.assertEqual({}, profiler.stats())
+
+    def test_sink(self):
+        received = []
+        profiler = profiling.StageProfiler(enabled=True, sink=received.append, sink_period=0)
+        profiler.record('stage', 0.001)
+        profiler.record('stage', 0.001)
+        self.assertEqual(2, len(received))
+        self.assertEqual(2, received[-1]['stage']['calls'])
+
+        copy = pickle.loads(pickle.dumps(profiler))
+        self.assertIsNone(copy.sink)
+        self.assertEqual(2, copy.stats()['stage']['calls'])
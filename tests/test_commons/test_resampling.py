@@ -0,0 +1,22 @@
+import numpy as np
+import numpy.testing as nptest
+
+import see._commons.resampling as resampling
+import tests.testbase
+
+
+class TestResampling(tests.testbase.TestBase):
+    def test_scaled_size(self):
+        self.assertEqual((320, 240), resampling.scaled_size((480, 640, 3), 0.5))
+        self.assertEqual((1, 1), resampling.scaled_size((3, 2), 0.1))
+
+    def test_downscale_mask(self):
+        mask = np.zeros((8, 8), dtype=np.bool_)
+        mask[1, 2] = True
+        scaled = resampling.downscale_mask(mask, (4, 4))
+        self.assertEqual(np.bool_, scaled.dtype)
+        self.assertEqual([(0, 1)], list(zip(*np.nonzero(scaled))))
+
+    def test_source_coordinates(self):
+        nptest.assert_allclose([-0.25, 0.25, 0.75, 1.25], resampling.source_coordinates(np.arange(4), 2, 4))
+        nptest.assert_allclose([0.5, 2.5], resampling.source_coordinates(np.arange(2), 4, 2))
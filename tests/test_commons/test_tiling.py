@@ -0,0 +1,41 @@
+import pickle
+
+import numpy as np
+
+import see._commons.tiling as tiling
+import tests.testbase
+
+
+class TestTiling(tests.testbase.TestBase):
+    def test_split_rows(self):
+        self.assertEqual([slice(0, 4), slice(4, 8), slice(8, 10)], tiling.split_rows(10, 4))
+        self.assertEqual([slice(0, 10)], tiling.split_rows(10, 256))
+
+    def test_with_halo(self):
+        self.assertEqual((slice(0, 6), slice(0, 4)), tiling.with_halo(slice(0, 4), 2, 10))
+        self.assertEqual((slice(2, 10), slice(2, 6)), tiling.with_halo(slice(4, 8), 2, 10))
+        self.assertEqual((slice(6, 10), slice(2, 4)), tiling.with_halo(slice(8, 10), 2, 10))
+
+    def test_band_executor(self):
+        executor = tiling.BandExecutor(band_rows=3, threads=2)
+        self.assertEqual([(0, 3), (3, 6), (6, 7)], executor.map(lambda rows: (rows.start, rows.stop), 7))
+        copy = pickle.loads(pickle.dumps(executor))
+        self.assertEqual(3, copy.band_rows)
+        executor.close()
+
+    def test_crop_boxes(self):
+        mask = np.zeros((20, 30), bool)
+        mask[2:5, 2:5] = True
+        mask[6:8, 6:9] = True
+        mask[15:18, 20:28] = True
+        self.assertEqual([(slice(2, 5), slice(2, 5)), (slice(6, 8), slice(6, 9)), (slice(15, 18), slice(20, 28))],
+                         tiling.crop_boxes(mask))
+        # the extended boxes of the first two areas overlap
+        self.assertEqual([(slice(1, 9), slice(1, 10)), (slice(14, 19), slice(19, 29))], tiling.crop_boxes(mask, 1))
+        self.assertEqual([(slice(0, 20), slice(0, 30))], tiling.crop_boxes(mask, 10))
+        self.assertEqual([], tiling.crop_boxes(np.zeros((4, 4), bool)))
+
+    def test_mask_from_polygons(self):
+        mask = tiling.mask_from_polygons((10, 12), [[(1, 1), (4, 1), (4, 3), (1, 3)], [(8, 8), (10, 8), (10, 9)]])
+        self.assertTrue(mask[1:4, 1:5].all())
+        self.assertEqual(12 + 4, mask.sum())
@@ -0,0 +1,78 @@
+import os
+
+import cv2
+import imageio
+import numpy as np
+
+import see._commons.video as video
+import see.foreground
+import see.foreground.aided_segmentation as aided_segmentation
+import tests.testbase
+
+
+class TestRunOnVideo(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = self.create_temp_dir()
+        office_dir = self.root_test_dir("input", "office")
+        self.images = [imageio.imread(os.path.join(office_dir, "images", name))
+                       for name in sorted(os.listdir(os.path.join(office_dir, "images")))]
+        self.masks = [imageio.imread(os.path.join(office_dir, "masks", name))[..., 0]
+                      for name in sorted(os.listdir(os.path.join(office_dir, "masks")))]
+
+    def write_video(self, name, frames):
+        path = os.path.join(self.temp_dir, name)
+        with video.VideoWriter(path, fps=10) as writer:
+            for frame in frames:
+                writer.write(frame)
+        return path
+
+    def count_frames(self, path):
+        return sum(1 for _ in video.read_frames(path))
+
+    def create_finder(self):
+        return see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 1.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 5}, confident_size=3)
+
+    def test_process_uses_probability_as_mask(self):
+        finder = self.create_finder()
+        probability = finder.process(self.images[0])
+        np.testing.assert_equal(probability, 0.5)
+        self.assertTrue(finder.static_background.get_details()['mask'].any())
+
+        probability = finder.process(self.images[0])
+        self.assertLess(probability.mean(), 0.1)
+
+    def test_foreground_mask(self):
+        probability = np.array([[0.0, 0.5, 0.51, 1.0]])
+        np.testing.assert_equal([[False, False, True, True]],
+                                aided_segmentation.AidedSegmentation.foreground_mask(probability))
+        np.testing.assert_equal(aided_segmentation.AidedSegmentation.foreground_mask(probability, 0.3),
+                                aided_segmentation.AidedSegmentation.foreground_mask(video.to_uint8(probability), 0.3))
+        np.testing.assert_equal([[False, False, True, True]],
+                                self.create_finder().foreground_mask(video.to_uint8(probability)))
+
+    def test_run_on_video(self):
+        video_path = self.write_video("office.avi", self.images)
+        output_path = os.path.join(self.temp_dir, "office_prob.avi")
+
+        reports = []
+        stats = aided_segmentation.run_on_video(video_path, self.create_finder(), output_path,
+                                                report=lambda s: reports.append(s.frames), report_every=5)
+        self.assertEqual(len(self.images), stats.frames)
+        self.assertEqual([5, 10], reports)
+        self.assertGreater(stats.fps, 0)
+        self.assertEqual(len(self.images), self.count_frames(output_path))
+
+    def test_run_on_video_with_masks(self):
+        video_path = self.write_video("office.avi", self.images)
+        mask_path = self.write_video("office_masks.avi", self.masks)
+        output_path = os.path.join(self.temp_dir, "office_prob.avi")
+
+        stats = aided_segmentation.run_on_video(video_path, self.create_finder(), output_path, mask_path=mask_path)
+        self.assertEqual(len(self.images), stats.frames)
+
+        last_probability = cv2.cvtColor(list(video.read_frames(output_path))[-1], cv2.COLOR_RGB2GRAY)
+        foreground = self.masks[-1] == 255
+        self.assertGreater(last_probability[foreground].mean(), last_probability[self.masks[-1] == 0].mean())
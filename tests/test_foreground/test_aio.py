@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import numpy.testing as nptest
+
+import see._commons.video as video
+import see.foreground
+import see.foreground.aio as aio
+import tests.testbase
+
+
+class SlowSegmentation(see.foreground.aided_segmentation.AidedSegmentation):
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def update(self, image, rough_foreground_mask):
+        pass
+
+    def calc_prob(self, image):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return np.zeros(image.shape[:2])
+
+
+async def frames_source(frames, delay=0.0):
+    for frame in frames:
+        await asyncio.sleep(delay)
+        yield frame
+
+
+async def collect(results):
+    return [result async for result in results]
+
+
+class TestAsyncSegmentation(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        random = np.random.RandomState(1)
+        background = random.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+        self.frames = [np.clip(background + random.normal(0, 5, background.shape), 0, 255).astype(np.uint8)
+                       for _ in range(6)]
+
+    def create_finder(self):
+        return see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 1.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 3})
+
+    def test_run_same_as_process(self):
+        adapter = aio.AsyncSegmentation(self.create_finder(), queue_size=2)
+        results = asyncio.run(collect(adapter.run(frames_source(self.frames))))
+
+        finder = self.create_finder()
+        self.assertEqual(list(range(len(self.frames))), [result.index for result in results])
+        for frame, result in zip(self.frames, results):
+            nptest.assert_equal(result.probability, finder.process(frame))
+        metrics = adapter.metrics()
+        self.assertLessEqual(metrics.pop('max_queue_depth'), 2)
+        self.assertEqual({'queue_depth': 0, 'submitted': 6, 'processed': 6, 'dropped': 0}, metrics)
+
+    def test_drop_oldest(self):
+        adapter = aio.AsyncSegmentation(SlowSegmentation(0.05), queue_size=1, policy='drop_oldest')
+        results = asyncio.run(collect(adapter.run(frames_source(self.frames))))
+        metrics = adapter.metrics()
+        self.assertGreater(metrics['dropped'], 0)
+        self.assertEqual(len(self.frames), metrics['processed'] + metrics['dropped'])
+        self.assertEqual(len(self.frames) - 1, results[-1].index)
+        self.assertRaises(NotImplementedError, aio.AsyncSegmentation, SlowSegmentation(0), policy='other')
+
+    def test_calls_serialized_and_loop_free(self):
+        segmentation = SlowSegmentation(0.02)
+        adapter = aio.AsyncSegmentation(segmentation)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        async def main():
+            await asyncio.gather(ticker(), *[adapter.calc_prob(frame) for frame in self.frames])
+
+        asyncio.run(main())
+        self.assertEqual(1, segmentation.max_running)
+        self.assertLess(ticks[-1] - ticks[0], 0.1)
+
+    def test_source_error(self):
+        async def failing():
+            yield self.frames[0]
+            raise IOError("camera lost")
+
+        adapter = aio.AsyncSegmentation(self.create_finder())
+        with self.assertRaises(IOError):
+            asyncio.run(collect(adapter.run(failing())))
+
+    def test_raw_frames(self):
+        async def main():
+            reader = asyncio.StreamReader()
+            for frame in self.frames[:3]:
+                reader.feed_data(frame.tobytes())
+            reader.feed_eof()
+            return [frame async for frame in aio.raw_frames(reader, self.frames[0].shape)]
+
+        for expected, frame in zip(self.frames, asyncio.run(main())):
+            nptest.assert_equal(frame, expected)
+
+    def test_video_to_video(self):
+        temp_dir = self.create_temp_dir()
+        input_path = os.path.join(temp_dir, "input.avi")
+        with video.VideoWriter(input_path, fps=10) as writer:
+            for frame in self.frames:
+                writer.write(frame)
+        output_path = os.path.join(temp_dir, "output.avi")
+
+        adapter = aio.AsyncSegmentation(self.create_finder())
+        written = asyncio.run(aio.write_video(adapter.run(aio.video_frames(input_path)), output_path))
+        self.assertEqual(len(self.frames), written)
+        self.assertEqual(len(self.frames), sum(1 for _ in video.read_frames(output_path)))
@@ -1,3 +1,7 @@
+import json
+import os
+import tracemalloc
+
 import numpy as np
 import numpy.testing as nptest
 
@@ -16,9 +20,11 @@ class TestStaticBackgroundModel(tests.testbase.TestBase):
         self.foreground_mask = np.zeros(self.background.shape[:2], dtype=np.bool)
         self.foreground_mask[22:26, 10:24] = 1
 
+    def create_model(self, **config):
+        return see.foreground.backgrounds.StaticBackgroundModel(**config)
+
     def test_update_background(self):
-        model = see.foreground.backgrounds.StaticBackgroundModel(update_inertia=1.0, error_inertia=1.0,
-                                                                 diff_method='rgb')
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
         self.assertIsNone(model.get())  # nothing yet
 
         # all is background
@@ -36,8 +42,7 @@ class TestStaticBackgroundModel(tests.testbase.TestBase):
                              self.background[self.foreground_mask != 0])
 
     def test_never_seen_background(self):
-        model = see.foreground.backgrounds.StaticBackgroundModel(update_inertia=1.0, error_inertia=1.0,
-                                                                 diff_method='rgb')
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
         model.update(self.background, np.invert(self.foreground_mask))
 
         model_background = model.get()
@@ -45,8 +50,7 @@ class TestStaticBackgroundModel(tests.testbase.TestBase):
         nptest.assert_equal(model_background[self.foreground_mask != 0], 128)
 
     def test_get_all_background_info(self):
-        model = see.foreground.backgrounds.StaticBackgroundModel(update_inertia=1.0, error_inertia=1.0,
-                                                                 diff_method='rgb')
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
         model.update(self.background, np.invert(self.foreground_mask))
         background_mask = self.foreground_mask == 0
 
@@ -60,7 +64,170 @@ class TestStaticBackgroundModel(tests.testbase.TestBase):
         nptest.assert_equal(model_details['mask'], self.foreground_mask == 0)
 
     def test_diff_rgb(self):
-        pass
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        bright = np.full((2, 2, 3), (250, 130, 10), dtype=np.uint8)
+        dark = np.full((2, 2, 3), (10, 120, 250), dtype=np.uint8)
+        nptest.assert_allclose(model.calc_diff(bright, dark), (240 + 10 + 240) / 3, rtol=1e-6)
+        nptest.assert_allclose(model.calc_diff(bright, dark.astype(np.float64)), (240 + 10 + 240) / 3, rtol=1e-6)
+
+    def test_diff_rgs(self):
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgs')
+        model.update(self.background, np.ones_like(self.foreground_mask))
+        # darker background differs only in intensity, the foreground also in the colour
+        darker = (self.background * 0.8).astype(np.uint8)
+        model.update(darker, np.invert(self.foreground_mask))
+        foreground = darker.copy()
+        foreground[self.foreground_mask] = (120, 40, 20)
+        difference = model.calc_diff(foreground, model.get_details()['background'])
+        self.assertEqual(np.float32, difference.dtype)
+        self.assertTrue((model.get_details()['error'] < 15).all())
+        self.assertTrue((difference[self.foreground_mask] > 30).all())
+
+    def test_save_and_load(self):
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        self.assertTrue(model.save(checkpoint_path))
+        self.assertIsNone(see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path).get())
+
+        model.update(self.background, np.invert(self.foreground_mask))
+        model.update((self.background + 3).astype(np.uint8), np.invert(self.foreground_mask))
+        self.assertTrue(model.save(checkpoint_path))
+
+        restored = see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path)
+        self.assertEqual(model.config, restored.config)
+        self.assertIsInstance(restored.background_mean, np.memmap)
+        for key, value in model.get_details().items():
+            nptest.assert_equal(restored.get_details()[key], value)
+
+        # restored model continues as the original one and the checkpoint stays untouched
+        model.update(self.foreground, np.invert(self.foreground_mask))
+        restored.update(self.foreground, np.invert(self.foreground_mask))
+        nptest.assert_equal(restored.get(), model.get())
+        reloaded = see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path, mmap_mode=None)
+        self.np_assert_not_equal(reloaded.get(), model.get())
+
+    def test_save_only_on_drift(self):
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        model.update(self.background, np.invert(self.foreground_mask))
+        self.assertTrue(model.save(checkpoint_path, min_drift=1))
+
+        model.update((self.background + 1).astype(np.uint8), np.invert(self.foreground_mask))
+        self.assertFalse(model.save(checkpoint_path, min_drift=1))
+        model.update((self.background + 10).astype(np.uint8), np.invert(self.foreground_mask))
+        self.assertTrue(model.save(checkpoint_path, min_drift=1, wait=False))
+
+        model.save(checkpoint_path + "_other")  # waits for the previous save
+        restored = see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path)
+        nptest.assert_equal(restored.get(), model.get())
+
+    def test_background_save_error(self):
+        path = os.path.join(self.create_temp_dir(), "file")
+        open(path, "w").close()
+        model = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        model.update(self.background, np.invert(self.foreground_mask))
+        self.assertTrue(model.save(os.path.join(path, "checkpoint"), wait=False))
+        checkpoint_path = path + "_checkpoint"
+        with self.assertRaises(OSError):
+            model.save(checkpoint_path)
+        self.assertTrue(model.save(checkpoint_path))
+        nptest.assert_equal(see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path).get(), model.get())
+
+    def test_load_unsupported_version(self):
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb').save(checkpoint_path)
+        with open(os.path.join(checkpoint_path, "model.json")) as file:
+            description = json.load(file)
+        description['version'] += 1
+        with open(os.path.join(checkpoint_path, "model.json"), "w") as file:
+            json.dump(description, file)
+        with self.assertRaises(ValueError):
+            see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path)
+
+    def test_batch(self):
+        images = np.stack([self.background, (self.background + 10).astype(np.uint8), self.foreground])
+        masks = np.stack([np.ones_like(self.foreground_mask), self.foreground_mask == 0, self.foreground_mask == 0])
+
+        sequential = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        for image, mask in zip(images, masks):
+            sequential.update(image, mask)
+        batched = self.create_model(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        batched.update_batch(images, masks)
+        nptest.assert_equal(batched.get(), sequential.get())
+
+        differences = batched.calc_diff_batch(images, batched.get())
+        for image, difference in zip(images, differences):
+            nptest.assert_almost_equal(difference, batched.calc_diff(image, batched.get()))
+
+    def test_fixed16(self):
+        reference = see.foreground.backgrounds.StaticBackgroundModel(update_inertia=3.0, error_inertia=5.0,
+                                                                     diff_method='rgb')
+        model = self.create_model(update_inertia=3.0, error_inertia=5.0, diff_method='rgb', precision='fixed16')
+        random = np.random.RandomState(5)
+        for _ in range(30):
+            image = np.clip(self.background + random.normal(0, 8, self.background.shape), 0, 255).astype(np.uint8)
+            background_mask = random.random_sample(self.foreground_mask.shape) > 0.3
+            reference.update(image, background_mask)
+            model.update(image, background_mask)
+
+        self.assertEqual(np.uint16, model.background_mean.dtype)
+        self.assertEqual(reference.background_mean.nbytes // 4, model.background_mean.nbytes)
+        expected, actual = reference.get_details(), model.get_details()
+        self.assertEqual(np.float32, actual['background'].dtype)
+        nptest.assert_equal(actual['mask'], expected['mask'])
+        nptest.assert_allclose(actual['background'], expected['background'], atol=0.02)
+        nptest.assert_allclose(actual['error'], expected['error'], atol=0.02)
+        nptest.assert_allclose(model.get(), reference.get(), atol=0.02)
+
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        model.save(checkpoint_path)
+        restored = see.foreground.backgrounds.StaticBackgroundModel.load(checkpoint_path)
+        nptest.assert_equal(restored.get(), model.get())
+        self.assertFalse(model.save(checkpoint_path, min_drift=0.01))
 
     def test_background_and_error_progression(self):
         pass
+
+
+class TestStaticBackgroundModelInPlace(TestStaticBackgroundModel):
+    def create_model(self, **config):
+        return see.foreground.backgrounds.StaticBackgroundModel(in_place=True, **config)
+
+    def random_sequence(self, length):
+        random = np.random.RandomState(7)
+        for i in range(length):
+            image = np.clip(self.background + random.normal(0, 8, self.background.shape), 0, 255).astype(np.uint8)
+            yield image, random.random_sample(self.foreground_mask.shape) > 0.3
+
+    def test_equivalent_to_default_update(self):
+        for precision, decimal in [('float64', 10), ('float32', 3)]:
+            reference = see.foreground.backgrounds.StaticBackgroundModel(update_inertia=3.0, error_inertia=5.0,
+                                                                         diff_method='rgb')
+            model = self.create_model(update_inertia=3.0, error_inertia=5.0, diff_method='rgb', precision=precision)
+            for image, background_mask in self.random_sequence(20):
+                reference.update(image, background_mask)
+                model.update(image, background_mask)
+
+            expected, actual = reference.get_details(), model.get_details()
+            self.assertEqual(model.dtype, actual['background'].dtype)
+            nptest.assert_equal(actual['mask'], expected['mask'])
+            nptest.assert_almost_equal(actual['background'], expected['background'], decimal=decimal)
+            nptest.assert_almost_equal(actual['error'], expected['error'], decimal=decimal)
+
+    def test_no_allocation_in_steady_state(self):
+        model = self.create_model(update_inertia=3.0, error_inertia=5.0, diff_method='rgb', precision='float32')
+        random = np.random.RandomState(7)
+        frames = [(random.randint(0, 256, (400, 400, 3)).astype(np.uint8), random.random_sample((400, 400)) > 0.3)
+                  for _ in range(4)]
+        model.update(*frames[0])
+        model.update(*frames[1])
+
+        tracemalloc.start()
+        try:
+            for image, background_mask in frames[2:]:
+                model.update(image, background_mask)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # only numpy's fixed-size casting buffers, nothing proportional to the frame
+        self.assertLess(peak, frames[0][0].nbytes)
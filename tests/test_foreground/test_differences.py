@@ -0,0 +1,55 @@
+import numpy as np
+import numpy.testing as nptest
+
+import see.foreground.differences as differences
+import tests.testbase
+
+
+class TestDifferences(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        random = np.random.RandomState(0)
+        self.image = random.randint(0, 256, (20, 30, 3)).astype(np.uint8)
+        self.other = random.randint(0, 256, (20, 30, 3)).astype(np.uint8)
+
+    def test_rgb_full_range(self):
+        expected = np.abs(self.image.astype(np.float64) - self.other).mean(axis=-1)
+        for other in [self.other, self.other.astype(np.float32), self.other.astype(np.float64)]:
+            difference = differences.calc_diff(self.image, other, 'rgb')
+            self.assertEqual(np.float32, difference.dtype)
+            nptest.assert_allclose(difference, expected, atol=1e-4)
+
+        white = np.full((1, 1, 3), 255, dtype=np.uint8)
+        self.assertAlmostEqual(255, differences.calc_diff(white, np.zeros_like(white), 'rgb')[0, 0], places=4)
+
+    def test_out(self):
+        out = np.empty(self.image.shape[:2], dtype=np.float32)
+        work = np.empty(self.image.shape, dtype=np.float32)
+        for method in ['rgb', 'rgs']:
+            result = differences.calc_diff(self.image, self.other, method, out=out, work=work)
+            self.assertTrue(np.shares_memory(result, out))
+            nptest.assert_equal(out, differences.calc_diff(self.image, self.other, method))
+
+    def test_rgs(self):
+        image = np.array([[[200, 100, 50], [0, 0, 0]]], dtype=np.uint8)
+        rgs = differences.to_rgs(image)
+        nptest.assert_allclose(rgs[0, 0], [255 * 200 / 350, 255 * 100 / 350, 350 / 3], rtol=1e-5)
+        nptest.assert_equal(rgs[0, 1], 0)
+
+        darker = (image * 0.5).astype(np.uint8)
+        rgs_difference = differences.calc_diff(image, darker, 'rgs')[0, 0]
+        rgb_difference = differences.calc_diff(image, darker, 'rgb')[0, 0]
+        # only the intensity changed
+        self.assertAlmostEqual(rgb_difference / 3, rgs_difference, places=3)
+
+    def test_register(self):
+        def max_difference(image1, image2, out=None, work=None):
+            return np.abs(image1.astype(np.float32) - image2).max(axis=-1)
+
+        self.assertRaises(NotImplementedError, differences.calc_diff, self.image, self.other, 'max')
+        differences.register_diff_method('max', max_difference)
+        try:
+            nptest.assert_equal(differences.calc_diff(self.image, self.other, 'max'),
+                                np.abs(self.image.astype(np.float32) - self.other).max(axis=-1))
+        finally:
+            del differences.DIFF_METHODS['max']
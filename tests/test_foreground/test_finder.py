@@ -1,7 +1,10 @@
+import os
+
 import cv2
 import numpy as np
 import numpy.testing as nptest
 
+import see._commons.tiling
 import see.foreground
 import see.foreground.backgrounds as backgrounds
 import tests.testbase
@@ -44,6 +47,32 @@ class TestForegroundFinder(tests.testbase.TestBase):
         expected = np.array([1, 0.8, 0.0, 0.0, 0.05, 0.03, 0.61, 0.05, 0.3, 0.99])
         nptest.assert_almost_equal(prob, expected, decimal=2)
 
+    def test_convert_to_probs_variants(self):
+        diffs = np.array([0, 1, 1, 2, 3, 4, 3, 6, 7, 8], dtype=np.uint8)
+        errors = np.array([0, 1, 0, 0, 1, 1, 2, 2, 3, 255], dtype=np.uint8)
+        expected = np.array([1, 0.8, 0.0, 0.0, 0.05, 0.03, 0.61, 0.05, 0.3, 0.99])
+
+        for method in ['linear', 'lut']:
+            finder = see.foreground.ForegroundFinder.create_from_dicts(probability={'method': method,
+                                                                                    'dtype': 'float32'})
+            prob = finder._convert_to_percentage(diffs, errors=errors)
+            self.assertEqual(np.float32, prob.dtype)
+            nptest.assert_almost_equal(prob, expected, decimal=2)
+
+            finder = see.foreground.ForegroundFinder.create_from_dicts(probability={'method': method,
+                                                                                    'dtype': 'uint8'})
+            prob = finder._convert_to_percentage(diffs, errors=errors)
+            self.assertEqual(np.uint8, prob.dtype)
+            nptest.assert_almost_equal(prob / 255, expected, decimal=2)
+
+    def test_convert_to_probs_lut_quantizes_floats(self):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(probability={'method': 'lut'})
+        diffs = np.array([2.2, 5.9, 40.1])
+        errors = np.array([2.1, 2.0, 9.8])
+        prob = finder._convert_to_percentage(diffs, errors=errors)
+        exact = see.foreground.ForegroundFinder.create_from_dicts()._convert_to_percentage(diffs, errors=errors)
+        nptest.assert_allclose(prob, exact, atol=0.2)
+
     def test_finder_no_object(self):
         background_model = backgrounds.StaticBackgroundModel(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
         finder = see.foreground.ForegroundFinder(background_model,
@@ -92,3 +121,189 @@ class TestForegroundFinder(tests.testbase.TestBase):
 
         nptest.assert_equal(prob_unknown.mean(), 0.5)
         nptest.assert_array_less(prob_background.mean(), 0.2)
+
+    def test_finder_uint8_probability(self):
+        background_model = backgrounds.StaticBackgroundModel(update_inertia=1.0, error_inertia=1.0, diff_method='rgb')
+        finder = see.foreground.ForegroundFinder(background_model, cleaning={'method': 'median', 'size': 5},
+                                                 confident_size=1, probability={'dtype': 'uint8'})
+        finder.update(self.background, self.foreground_mask)
+
+        prob = finder.calc_prob(self.noise(self.background, 2))
+        self.assertEqual(np.uint8, prob.dtype)
+        nptest.assert_equal(prob[self.foreground_mask], 128)
+        nptest.assert_array_less(prob[self.foreground_mask == 0].mean(), 0.2 * 255)
+
+    def create_finder(self):
+        background_model = backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0, diff_method='rgb')
+        return see.foreground.ForegroundFinder(background_model,
+                                               cleaning={'method': 'median', 'size': 5}, confident_size=3)
+
+    def test_batch_same_as_sequential(self):
+        images = np.stack([self.noise(self.background, 10) for _ in range(7)])
+        masks = np.zeros(images.shape[:3], dtype=np.bool)
+        masks[3:, 22:26, 10:24] = 1
+
+        sequential = self.create_finder()
+        for image, mask in zip(images, masks):
+            sequential.update(image, mask)
+        batched = self.create_finder()
+        batched.update_batch(images, masks, chunk_size=3)
+        for key, value in sequential.static_background.get_details().items():
+            nptest.assert_equal(batched.static_background.get_details()[key], value)
+
+        probabilities = batched.calc_prob_batch(images, chunk_size=3)
+        self.assertEqual(images.shape[:3], probabilities.shape)
+        for image, probability in zip(images, probabilities):
+            nptest.assert_almost_equal(probability, sequential.calc_prob(image))
+
+    def test_batch_before_update(self):
+        images = np.stack([self.noise(self.background, 10) for _ in range(2)])
+        probabilities = self.create_finder().calc_prob_batch(images)
+        nptest.assert_equal(probabilities, 0.5)
+
+    def test_tiled_identical_to_untiled(self):
+        random = np.random.RandomState(3)
+        images = [np.clip(self.background + random.normal(0, 10, self.background.shape), 0, 255).astype(np.uint8)
+                  for _ in range(4)]
+        masks = [random.random_sample(self.foreground_mask.shape) > 0.8 for _ in range(4)]
+        for in_place in [False, True]:
+            finders = []
+            for tiling in [None, {'rows': 7, 'threads': 3}]:
+                background_model = backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0,
+                                                                     diff_method='rgb', in_place=in_place)
+                finders.append(see.foreground.ForegroundFinder(background_model,
+                                                               cleaning={'method': 'median', 'size': 7},
+                                                               confident_size=5, tiling=tiling))
+            untiled, tiled = finders
+            for image, mask in zip(images, masks):
+                nptest.assert_equal(tiled.calc_prob(image), untiled.calc_prob(image))
+                untiled.update(image, mask)
+                tiled.update(image, mask)
+                for key, value in untiled.static_background.get_details().items():
+                    nptest.assert_equal(tiled.static_background.get_details()[key], value)
+
+    def test_stats(self):
+        finder = self.create_finder()
+        finder.process(self.background, self.foreground_mask)
+        self.assertEqual({}, finder.stats())
+
+        finder = see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 2.0, 'error_inertia': 3.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 3}, profiling={'window': 10})
+        for _ in range(3):
+            finder.process(self.noise(self.background, 10), self.foreground_mask)
+        stats = finder.stats()
+        self.assertEqual({'update', 'calc_prob', 'clean', 'confident_background', 'background_update',
+                          'calc_diff', 'convert'}, set(stats))
+        # the first frame only initialises the model
+        self.assertEqual(2, stats['calc_prob']['calls'])
+        self.assertEqual(3, stats['update']['calls'])
+        # process cleans each image once
+        self.assertEqual(3, stats['clean']['calls'])
+
+    def test_scaled(self):
+        background = np.clip(np.random.RandomState(0).normal(120, 30, (48, 64, 3)), 0, 255).astype(np.uint8)
+        foreground = background.copy()
+        foreground[20:36, 16:40] = (250, 10, 10)
+        mask = np.zeros(background.shape[:2], dtype=np.bool)
+        for scaling in [{'scale': 0.5}, {'levels': 2, 'refine_edges': True}]:
+            background_model = backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0,
+                                                                 diff_method='rgb')
+            finder = see.foreground.ForegroundFinder(background_model, cleaning={'method': 'median', 'size': 5},
+                                                     confident_size=3, scaling=scaling)
+            for _ in range(3):
+                finder.update(self.noise(background, 2), mask)
+            self.assertEqual((48 * finder._scale, 64 * finder._scale),
+                             finder.static_background.get_details()['background'].shape[:2])
+
+            probability = finder.calc_prob(foreground)
+            self.assertEqual(background.shape[:2], probability.shape)
+            self.assertTrue((probability[24:32, 20:36] > 0.9).all())
+            self.assertLess((probability > 0.5).mean(), 0.3)
+
+            images = np.stack([foreground, background])
+            nptest.assert_allclose(finder.calc_prob_batch(images)[0], probability)
+
+    def test_scaled_kernel_size(self):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(scaling={'scale': 0.5})
+        self.assertEqual(3, finder._kernel_size(5))
+        self.assertEqual(1, finder._kernel_size(1))
+        self.assertEqual(5, finder._kernel_size(9))
+
+    def test_process_same_as_calc_prob_and_update(self):
+        random = np.random.RandomState(4)
+        images = [np.clip(self.background + random.normal(0, 10, self.background.shape), 0, 255).astype(np.uint8)
+                  for _ in range(4)]
+        images[3][22:26, 10:24] = 250
+        for config in [{}, {'tiling': {'rows': 7, 'threads': 2}}, {'scaling': {'scale': 0.5, 'refine_edges': True}},
+                       {'probability': {'dtype': 'uint8'}}]:
+            finders = [see.foreground.ForegroundFinder(
+                backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0, diff_method='rgb'),
+                cleaning={'method': 'median', 'size': 5}, confident_size=3, **config) for _ in range(2)]
+            fused, separate = finders
+            for i, image in enumerate(images):
+                mask = self.foreground_mask if i % 2 else None
+                expected = separate.calc_prob(image)
+                separate.update(image, mask if mask is not None else separate.foreground_mask(expected, 0.5))
+                nptest.assert_equal(fused.process(image, mask), expected)
+                for key, value in separate.static_background.get_details().items():
+                    nptest.assert_equal(fused.static_background.get_details()[key], value)
+
+    def test_cache(self):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 2.0, 'error_inertia': 3.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 3}, cache={'frames': 1}, profiling={})
+        image = self.noise(self.background, 10)
+        finder.update(image, self.foreground_mask)
+        probability = finder.calc_prob(image)
+        self.assertEqual(1, finder.stats()['clean']['calls'])
+
+        # modified in place or other images are cleaned again
+        image[:] = self.noise(self.background, 10)
+        self.np_assert_not_equal(finder.calc_prob(image), probability)
+        finder.calc_prob(self.background)
+        finder.calc_prob(image)
+        self.assertEqual(4, finder.stats()['clean']['calls'])
+
+    def test_roi(self):
+        random = np.random.RandomState(6)
+        background = random.randint(50, 200, (40, 60, 3))
+        images = np.clip(background + random.normal(0, 5, (6,) + background.shape), 0, 255).astype(np.uint8)
+        images[5, 10:20, 5:25] = 250
+        masks = np.zeros(images.shape[:3], dtype=bool)
+        polygons = [[(2, 4), (30, 4), (30, 25), (2, 25)], [(45, 30), (58, 30), (58, 38)]]
+        roi = see._commons.tiling.mask_from_polygons(background.shape, polygons)
+        for config in [{}, {'tiling': {'rows': 8, 'threads': 2}}, {'probability': {'dtype': 'uint8'}}]:
+            config = {'config_background_model': {'update_inertia': 2.0, 'error_inertia': 3.0, 'diff_method': 'rgb'},
+                      'cleaning': {'method': 'median', 'size': 5}, 'confident_size': 3, **config}
+            full = see.foreground.ForegroundFinder.create_from_dicts(**config)
+            cropped = see.foreground.ForegroundFinder.create_from_dicts(
+                **config, roi={'polygons': polygons, 'fill': 1.0})
+            self.assertIsNone(cropped.regions)
+            for image, mask in zip(images[:5], masks):
+                nptest.assert_equal(full.process(image, mask)[roi], cropped.process(image, mask)[roi])
+            probability = cropped.calc_prob(images[5])
+            nptest.assert_equal(full.calc_prob(images[5])[roi], probability[roi])
+            self.assertTrue((probability[~roi] == (255 if probability.dtype == np.uint8 else 1.0)).all())
+            nptest.assert_equal(cropped.calc_prob_batch(images[4:]), np.stack([cropped.calc_prob(images[4]),
+                                                                                probability]))
+
+            # only the crops of the two regions with the halo are kept
+            self.assertIsNone(cropped.static_background.get_details())
+            shapes = [region.finder.static_background.get_details()['background'].shape[:2]
+                      for region in cropped.regions]
+            self.assertEqual([(26, 33), (12, 17)], shapes)
+            self.assertEqual([region.crop for region in cropped.regions],
+                             see._commons.tiling.crop_boxes(roi, 2))
+            # the crops share the threads of the tiling
+            self.assertTrue(all(region.finder._bands is cropped._bands for region in cropped.regions))
+
+        # the models of the regions are checkpointed, restored when the regions are created for the first image
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        self.assertTrue(cropped.save_background(checkpoint_path))
+        self.assertEqual(["region_0", "region_1"], sorted(os.listdir(checkpoint_path)))
+        restored = see.foreground.ForegroundFinder.create_from_dicts(**config, roi={'polygons': polygons, 'fill': 1.0})
+        restored.load_background(checkpoint_path)
+        nptest.assert_equal(cropped.process(images[0]), restored.process(images[0]))
+        for region, restored_region in zip(cropped.regions, restored.regions):
+            nptest.assert_equal(region.finder.static_background.get(), restored_region.finder.static_background.get())
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+import tests.testbase
+
+
+class TestImports(tests.testbase.TestBase):
+    def imported_modules(self, statement):
+        completed = subprocess.run([sys.executable, '-c', f"import sys; {statement}; print(' '.join(sys.modules))"],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                                   check=True, cwd=self.root_test_dir(".."))
+        return {name.split('.')[0] for name in completed.stdout.split()}
+
+    def test_optional_dependencies_are_lazy(self):
+        modules = self.imported_modules("import see.foreground, see.foreground.objects, see.foreground.storage")
+        self.assertIn('cv2', modules)
+        self.assertFalse(modules & {'vendor', 'matplotlib', 'IPython'})
+
+        modules = self.imported_modules("sys.path.append('inspects'); import utils")
+        self.assertFalse(modules & {'matplotlib', 'IPython'})
+        modules = self.imported_modules("sys.path.append('inspects'); import utils; utils.random_colormap(0)")
+        self.assertIn('matplotlib', modules)
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+
+import see.foreground
+import tests.testbase
+
+
+def flickering_images(count, shape=(16, 16), seed=0):
+    random = np.random.RandomState(seed)
+    return [np.clip((60 if i % 2 else 180) + random.normal(0, 2, shape + (3,)), 0, 255).astype(np.uint8)
+            for i in range(count)]
+
+
+class TestMixture(tests.testbase.TestBase):
+    def test_bimodal_background(self):
+        model = see.foreground.MixtureBackgroundModel(update_inertia=10.0)
+        static = see.foreground.StaticBackgroundModel(update_inertia=10.0, error_inertia=10.0, diff_method='rgb')
+        mask = np.ones((16, 16), bool)
+        for image in flickering_images(40):
+            model.update(image, mask)
+            static.update(image, mask)
+
+        details = model.get_details()
+        self.assertEqual((16, 16, 3, model.FIELDS), details['background'].shape)
+        self.assertTrue(details['mask'].all())
+        for value in [60, 180]:
+            difference = model.calc_diff(np.full((16, 16, 3), value, np.uint8), details['background'])
+            self.assertLess((difference / details['error']).max(), 1)
+        difference = model.calc_diff(np.full((16, 16, 3), 120, np.uint8), details['background'])
+        self.assertGreater((difference / details['error']).min(), 5)
+        # the single mode model learns the flicker as a large error so it would miss the same foreground
+        static_details = static.get_details()
+        difference = static.calc_diff(np.full((16, 16, 3), 120, np.uint8), static_details['background'])
+        self.assertLess((difference / static_details['error']).max(), 1)
+
+    def test_update_rows(self):
+        model = see.foreground.MixtureBackgroundModel(update_inertia=3.0)
+        banded = see.foreground.MixtureBackgroundModel(update_inertia=3.0)
+        mask = np.ones((16, 16), bool)
+        mask[4:8, 4:8] = False
+        images = flickering_images(6)
+        model.update(images[0], mask)
+        banded.update(images[0], mask)
+        for image in images[1:]:
+            model.update(image, mask)
+            banded.update_rows(image[:8], mask[:8], slice(0, 8))
+            banded.update_rows(image[8:], mask[8:], slice(8, 16))
+        np.testing.assert_allclose(model.modes, banded.modes, atol=1e-4)
+        np.testing.assert_equal(mask, model.get_details()['mask'])
+        self.assertEqual(model.UNKNOWN_PIXEL, tuple(model.get()[5, 5]))
+        self.assertEqual((4, 4, 3), model.get(step=4).shape)
+
+        model.reset()
+        self.assertIsNone(model.get_details())
+
+    def test_save_and_load(self):
+        checkpoint_path = os.path.join(self.create_temp_dir(), "checkpoint")
+        model = see.foreground.MixtureBackgroundModel(update_inertia=3.0, modes=2)
+        self.assertTrue(model.save(checkpoint_path))
+        self.assertIsNone(see.foreground.MixtureBackgroundModel.load(checkpoint_path).get())
+
+        images = flickering_images(8)
+        mask = np.ones((16, 16), bool)
+        mask[4:8, 4:8] = False
+        for image in images[:5]:
+            model.update(image, mask)
+        self.assertTrue(model.save(checkpoint_path, min_drift=1))
+        restored = see.foreground.MixtureBackgroundModel.load(checkpoint_path)
+        self.assertEqual(model.config, restored.config)
+        self.assertIsInstance(restored.modes, np.memmap)
+        for key, value in model.get_details().items():
+            np.testing.assert_equal(restored.get_details()[key], value)
+        with self.assertRaises(ValueError):
+            see.foreground.StaticBackgroundModel.load(checkpoint_path)
+
+        # restored model continues as the original one, the checkpoint is rewritten only when the modes drift
+        for image in images[5:]:
+            model.update(image, mask)
+            restored.update(image, mask)
+        np.testing.assert_equal(restored.modes, model.modes)
+        self.assertFalse(model.save(checkpoint_path, min_drift=1))
+        model.update(np.full((16, 16, 3), 250, np.uint8), mask)
+        self.assertTrue(model.save(checkpoint_path, min_drift=1, wait=False))
+        model.save(checkpoint_path + "_other")  # waits for the previous save
+        np.testing.assert_equal(see.foreground.MixtureBackgroundModel.load(checkpoint_path).get(), model.get())
+
+    def test_finder(self):
+        for config in [{}, {'tiling': {'rows': 4, 'threads': 2}, 'probability': {'method': 'lut', 'dtype': 'uint8'}},
+                       {'scheduling': {'budget_ms': 1000, 'band_rows': 4, 'warmup_frames': 2, 'step': 2}}]:
+            finder = see.foreground.ForegroundFinder.create_from_dicts(
+                {'model': 'mixture', 'update_inertia': 10.0}, cleaning={'method': 'median', 'size': 3}, **config)
+            for image in flickering_images(30, shape=(32, 32)):
+                finder.process(image, np.zeros((32, 32), bool))
+            image = flickering_images(1, shape=(32, 32))[0]
+            image[10:20, 10:20] = 250
+            detected = finder.calc_prob(image) > finder._unknown_probability()
+            # the median cleaning can cut the corners of the square
+            self.assertTrue(detected[11:19, 11:19].all())
+            detected[10:20, 10:20] = False
+            self.assertFalse(detected.any())
+
+        with self.assertRaises(NotImplementedError):
+            see.foreground.ForegroundFinder.create_from_dicts({'model': 'unknown'})
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+
+import numpy as np
+import numpy.testing as nptest
+
+import see._commons.sharedmem as sharedmem
+import see.foreground
+import see.foreground.multicamera as multicamera
+import tests.testbase
+
+FINDER_CONFIG = {'config_background_model': {'update_inertia': 1.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+                 'cleaning': {'method': 'median', 'size': 3}, 'confident_size': 3}
+MIXTURE_CONFIG = {**FINDER_CONFIG, 'config_background_model': {'model': 'mixture', 'update_inertia': 1.0}}
+ROI_CONFIG = {**FINDER_CONFIG, 'roi': {'polygons': [[(2, 2), (16, 2), (16, 14), (2, 14)], [(24, 16), (30, 22)]]}}
+
+
+class TestMultiCameraScheduler(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        random = np.random.RandomState(5)
+        self.streams = {}
+        for stream_id, level in [("a", 60), ("b", 120), ("c", 180)]:
+            frames = np.clip(level + random.normal(0, 4, (12, 24, 32, 3)), 0, 255).astype(np.uint8)
+            frames[6:, 5:10, 5:12] = 255 - level
+            self.streams[stream_id] = frames
+
+    def expected(self, frames, config=FINDER_CONFIG):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(**config)
+        return [finder.process(frame) for frame in frames]
+
+    def run_streams(self, scheduler, frame_range):
+        results = {stream_id: [] for stream_id in self.streams}
+        for i in frame_range:
+            for stream_id, frames in self.streams.items():
+                scheduler.submit(stream_id, frames[i])
+            for result in scheduler.results():
+                results[result.stream_id].append(result)
+        return results
+
+    def test_shared_frame_ring(self):
+        ring = sharedmem.SharedFrameRing(3, (4, 5), np.float32)
+        attached = sharedmem.SharedFrameRing.attach(ring.description)
+        ring[1] = 7
+        nptest.assert_equal(attached[1], 7)
+        attached.close()
+        ring.close()
+
+    def test_streams_are_ordered_and_correct(self):
+        with multicamera.MultiCameraScheduler(workers=2, slots=3) as scheduler:
+            for stream_id, frames in self.streams.items():
+                scheduler.add_stream(stream_id, frames.shape[1:], FINDER_CONFIG)
+
+            results = {stream_id: [] for stream_id in self.streams}
+
+            def collect():
+                for _ in range(12 * len(self.streams)):
+                    result = scheduler.get_result()
+                    results[result.stream_id].append(result)
+
+            collector = threading.Thread(target=collect)
+            collector.start()
+            for i in range(12):
+                for stream_id, frames in self.streams.items():
+                    scheduler.submit(stream_id, frames[i])  # blocks while all slots of the stream are in flight
+                    self.assertLessEqual(scheduler.report()[stream_id]['in_flight'], 3)
+            collector.join()
+
+            report = scheduler.report()
+            for stream_id, frames in self.streams.items():
+                self.assertEqual(list(range(12)), [result.seq for result in results[stream_id]])
+                for result, expected in zip(results[stream_id], self.expected(frames)):
+                    nptest.assert_almost_equal(result.probability, expected)
+                self.assertEqual(12, report[stream_id]['frames'])
+                self.assertGreater(report[stream_id]['fps'], 0)
+            self.assertEqual({0, 1}, {stream['worker'] for stream in report.values()})
+
+    def test_probability_dtype(self):
+        frames = self.streams["a"]
+        config = {**FINDER_CONFIG, 'probability': {'dtype': 'uint8'}}
+        with multicamera.MultiCameraScheduler(workers=1, slots=2) as scheduler:
+            scheduler.add_stream("a", frames.shape[1:], config)
+            with self.assertRaises(NotImplementedError):
+                scheduler.add_stream("b", frames.shape[1:], {'probability': {'dtype': 'int16'}})
+            scheduler.submit("a", frames[0])
+            results = list(scheduler.results())
+        self.assertEqual(np.uint8, results[0].probability.dtype)
+        nptest.assert_equal(results[0].probability, self.expected(frames[:1], config)[0])
+
+    def test_failed_frames_free_their_slots(self):
+        # the roi does not match the frames so every frame of the stream fails
+        failing_config = {**FINDER_CONFIG, 'roi': {'mask': np.ones((5, 5), bool)}}
+        frames = self.streams["a"]
+        with multicamera.MultiCameraScheduler(workers=1, slots=2) as scheduler:
+            scheduler.add_stream("bad", frames.shape[1:], failing_config)
+            scheduler.add_stream("a", frames.shape[1:], FINDER_CONFIG)
+            for i in range(2):
+                scheduler.submit("bad", frames[i], timeout=5)
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    list(scheduler.results())
+            self.assertEqual(0, scheduler.in_flight())
+            self.assertEqual(2, scheduler.submit("bad", frames[2], timeout=5))
+            scheduler.submit("a", frames[0], timeout=5)
+            with self.assertRaises(RuntimeError):
+                list(scheduler.results())
+            self.assertEqual([0], [result.seq for result in scheduler.results()])
+            report = scheduler.report()
+            self.assertEqual((3, 0), (report["bad"]['failed'], report["bad"]['in_flight']))
+            self.assertEqual((1, 0), (report["a"]['frames'], report["a"]['restarts']))
+
+    def test_unreadable_checkpoint(self):
+        checkpoint_dir = self.create_temp_dir()
+        os.makedirs(multicamera.checkpoint_path(checkpoint_dir, "bad"))
+        with open(os.path.join(multicamera.checkpoint_path(checkpoint_dir, "bad"), "model.json"), "w") as file:
+            file.write("not json")
+        frames = self.streams["a"]
+        with multicamera.MultiCameraScheduler(workers=1, slots=2, checkpoint_dir=checkpoint_dir) as scheduler:
+            scheduler.add_stream("bad", frames.shape[1:], FINDER_CONFIG)
+            scheduler.add_stream("a", frames.shape[1:], FINDER_CONFIG)
+            scheduler.submit("bad", frames[0], timeout=5)
+            with self.assertRaisesRegex(RuntimeError, "could not be added"):
+                list(scheduler.results())
+            scheduler.submit("a", frames[0], timeout=5)
+            self.assertEqual([0], [result.seq for result in scheduler.results()])
+            report = scheduler.report()
+            self.assertEqual({0}, {stream['restarts'] for stream in report.values()})
+            self.assertEqual(1, report["bad"]['failed'])
+
+    def test_failed_checkpoints_keep_results(self):
+        # the checkpoints cannot be written under a regular file
+        checkpoint_dir = os.path.join(self.create_temp_dir(), "file")
+        open(checkpoint_dir, "w").close()
+        frames = self.streams["a"]
+        with multicamera.MultiCameraScheduler(workers=1, slots=2, checkpoint_dir=checkpoint_dir,
+                                              checkpoint_every=1) as scheduler:
+            scheduler.add_stream("a", frames.shape[1:], FINDER_CONFIG)
+            results = []
+            for frame in frames[:4]:
+                scheduler.submit("a", frame, timeout=5)
+                results.extend(scheduler.results())
+            report = scheduler.report()["a"]
+        self.assertEqual(list(range(4)), [result.seq for result in results])
+        for result, expected in zip(results, self.expected(frames[:4])):
+            nptest.assert_almost_equal(result.probability, expected)
+        self.assertEqual((0, 0), (report['failed'], report['restarts']))
+        # the error of the save in the background is raised by the next save which writes nothing itself
+        self.assertEqual(2, report['checkpoint_errors'])
+
+    def test_worker_crash_recovery(self):
+        for config in [FINDER_CONFIG, MIXTURE_CONFIG, ROI_CONFIG]:
+            self.check_crash_recovery(config)
+
+    def check_crash_recovery(self, config):
+        checkpoint_dir = self.create_temp_dir()
+        with multicamera.MultiCameraScheduler(workers=2, slots=2, checkpoint_dir=checkpoint_dir,
+                                              checkpoint_every=2) as scheduler:
+            for stream_id, frames in self.streams.items():
+                scheduler.add_stream(stream_id, frames.shape[1:], config)
+            first = self.run_streams(scheduler, range(6))
+            time.sleep(0.5)  # checkpoints are written in the background
+            self.assertEqual({0}, {stream['restarts'] for stream in scheduler.report().values()})
+            self.assertEqual(sorted(self.streams), sorted(os.listdir(checkpoint_dir)))
+
+            scheduler._workers[0].kill()
+            scheduler._workers[0].join()
+            second = self.run_streams(scheduler, range(6, 12))
+
+            report = scheduler.report()
+            for stream_id, frames in self.streams.items():
+                self.assertEqual(list(range(12)), [result.seq for result in first[stream_id] + second[stream_id]])
+                for result, expected in zip(second[stream_id], self.expected(frames, config)[6:]):
+                    nptest.assert_almost_equal(result.probability, expected)
+                self.assertEqual(1 if report[stream_id]['worker'] == 0 else 0, report[stream_id]['restarts'])
@@ -0,0 +1,98 @@
+import os
+
+import imageio
+import numpy as np
+
+import see._commons.video as video
+import see.foreground
+import see.foreground.objects as objects
+import tests.testbase
+
+
+class TestObjects(tests.testbase.TestBase):
+    def create_probability(self):
+        probability = np.zeros((40, 60))
+        probability[5:10, 10:20] = 0.8
+        probability[5:10, 19] = 1.0
+        probability[20:30, 40:42] = 0.6
+        probability[35, 0] = 0.9
+        probability[0, 50] = 0.4
+        return probability
+
+    def test_extract(self):
+        extractor = objects.ObjectExtractor(backend='opencv')
+        found = extractor.extract(self.create_probability())
+        self.assertEqual(objects.OBJECT_DTYPE, found.dtype)
+        found = found[np.argsort(found['area'])]
+
+        self.assertEqual([1, 20, 50], found['area'].tolist())
+        self.assertEqual([0, 35, 1, 1], [found['left'][0], found['top'][0], found['width'][0], found['height'][0]])
+        self.assertEqual([40, 20, 2, 10], [found['left'][1], found['top'][1], found['width'][1], found['height'][1]])
+        self.assertEqual([10, 5, 10, 5], [found['left'][2], found['top'][2], found['width'][2], found['height'][2]])
+        np.testing.assert_allclose([0.9, 0.6, 0.82], found['mean_probability'], rtol=1e-6)
+        np.testing.assert_allclose([40.5, 24.5], [found['x'][1], found['y'][1]], rtol=1e-6)
+        # the brighter column pulls the centroid to the right
+        self.assertGreater(found['x'][2], 14.5)
+        self.assertAlmostEqual(7, found['y'][2], places=5)
+
+    def test_extract_min_area_and_uint8(self):
+        probability = self.create_probability()
+        extractor = objects.ObjectExtractor(min_area=2, backend='opencv')
+        found = extractor.extract(probability)
+        self.assertEqual([20, 50], sorted(found['area'].tolist()))
+
+        found_uint8 = extractor.extract(video.to_uint8(probability))
+        np.testing.assert_array_equal(np.sort(found['area']), np.sort(found_uint8['area']))
+        np.testing.assert_allclose(np.sort(found['mean_probability']), np.sort(found_uint8['mean_probability']),
+                                   atol=1 / 255)
+
+        self.assertEqual(0, len(extractor.extract(np.zeros((10, 10)))))
+
+    def test_backend(self):
+        with self.assertRaises(NotImplementedError):
+            objects.ObjectExtractor(backend='unknown')
+        extractor = objects.ObjectExtractor()
+        if objects.load_sep() is None:
+            self.assertEqual('opencv', extractor.backend)
+            with self.assertRaises(ImportError):
+                objects.ObjectExtractor(backend='sep')
+        else:
+            self.assertEqual('sep', extractor.backend)
+
+    def test_sep_same_as_opencv(self):
+        if objects.load_sep() is None:
+            self.skipTest("SEP is not available, checkout and build vendor/SEP")
+        probability = self.create_probability()
+        for extractor_args in [{}, {'min_area': 2}, {'threshold': 0.7}]:
+            sep_extractor = objects.ObjectExtractor(backend='sep', **extractor_args)
+            opencv_extractor = objects.ObjectExtractor(backend='opencv', **extractor_args)
+            for data in [probability, video.to_uint8(probability)]:
+                sep_found = np.sort(sep_extractor.extract(data), order=['area', 'left'])
+                opencv_found = np.sort(opencv_extractor.extract(data), order=['area', 'left'])
+                self.assertEqual(objects.OBJECT_DTYPE, sep_found.dtype)
+                for name in ['left', 'top', 'width', 'height', 'area']:
+                    np.testing.assert_array_equal(opencv_found[name], sep_found[name])
+                for name in ['x', 'y', 'mean_probability']:
+                    np.testing.assert_allclose(opencv_found[name], sep_found[name], rtol=1e-5)
+        self.assertEqual(0, len(objects.ObjectExtractor(backend='sep').extract(np.zeros((10, 10)))))
+
+    def test_run_on_video(self):
+        office_dir = self.root_test_dir("input", "office")
+        images = [imageio.imread(os.path.join(office_dir, "images", name))
+                  for name in sorted(os.listdir(os.path.join(office_dir, "images")))]
+        video_path = os.path.join(self.create_temp_dir(), "office.avi")
+        with video.VideoWriter(video_path, fps=10) as writer:
+            for image in images:
+                writer.write(image)
+
+        finder = see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 1.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 5}, confident_size=3)
+        results = []
+        stats = objects.run_on_video(video_path, finder, objects.ObjectExtractor(min_area=4),
+                                     lambda index, found: results.append((index, found)))
+        self.assertEqual(len(images), stats.frames)
+        self.assertEqual(list(range(len(images))), [index for index, _ in results])
+        self.assertTrue(all(found.dtype == objects.OBJECT_DTYPE for _, found in results))
+        # the first frame has probability 0.5 everywhere so it is not above the threshold
+        self.assertEqual(0, len(results[0][1]))
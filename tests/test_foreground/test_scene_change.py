@@ -0,0 +1,109 @@
+import numpy as np
+
+import see.foreground
+import see.foreground.backgrounds as backgrounds
+from see.foreground.scene_change import SceneChangeDetector
+import tests.testbase
+
+
+class TestSceneChangeDetector(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.random = np.random.RandomState(2)
+        self.background = self.random.randint(0, 200, (64, 80, 3)).astype(np.uint8)
+        self.static_probability = np.zeros(self.background.shape[:2])
+        self.changed_probability = np.ones(self.background.shape[:2])
+
+    def noisy(self, image):
+        return np.clip(image + self.random.normal(0, 3, image.shape), 0, 255).astype(np.uint8)
+
+    def test_static_scene(self):
+        detector = SceneChangeDetector(step=4)
+        probability = self.static_probability.copy()
+        probability[10:30, 10:30] = 1  # object
+        for _ in range(10):
+            self.assertFalse(detector.check(self.noisy(self.background), probability))
+        self.assertEqual(0, detector.changes)
+
+    def test_change_after_frames(self):
+        detector = SceneChangeDetector(step=4, frames=3)
+        detector.check(self.background, self.static_probability)
+        brighter = (self.background + 50).astype(np.uint8)
+        self.assertEqual([False, False, True], [detector.check(brighter, self.changed_probability)
+                                                for _ in range(3)])
+        self.assertEqual(1, detector.changes)
+        # the changed scene is the new reference
+        self.assertFalse(detector.check(brighter, self.static_probability))
+        self.assertAlmostEqual(0, detector.last['histogram_distance'])
+
+    def test_hysteresis(self):
+        detector = SceneChangeDetector(step=4, foreground_fraction=(0.6, 0.4), frames=3)
+        detector.check(self.background, self.static_probability)
+        between = self.static_probability.copy()
+        between[:32] = 1  # half of the pixels
+        results = [detector.check(self.background, probability)
+                   for probability in [self.changed_probability, between, self.changed_probability, between,
+                                       self.changed_probability]]
+        self.assertEqual([False, False, False, False, True], results)
+
+        detector.check(self.background, self.changed_probability)
+        detector.check(self.background, self.static_probability)
+        self.assertEqual(0, detector.last['suspicious_frames'])
+
+    def test_finder_resets_model(self):
+        finder = see.foreground.ForegroundFinder(
+            backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0, diff_method='rgb'),
+            cleaning={'method': 'median', 'size': 3}, scene_change={'step': 4, 'frames': 2})
+        for _ in range(3):
+            finder.process(self.noisy(self.background))
+        moved = np.roll(self.background, 20, axis=1)
+        self.assertTrue((finder.process(moved) > 0.5).mean() > 0.5)
+        self.assertEqual(0.5, finder.process(moved).max())
+        # model learned the new scene
+        self.assertTrue((finder.process(moved) < 0.5).all())
+
+    def test_mask(self):
+        detector = SceneChangeDetector(step=4, frames=1)
+        mask = np.zeros(self.background.shape[:2], bool)
+        mask[:, :20] = True
+        probability = self.static_probability.copy()
+        probability[:, :20] = 1  # a quarter of the image, all of the masked pixels
+        self.assertFalse(detector.check(self.background, probability))
+        self.assertTrue(detector.check(self.background, probability, mask=mask))
+        self.assertEqual(1.0, detector.last['foreground_fraction'])
+
+    def test_finder_with_roi_resets_all_regions(self):
+        finder = see.foreground.ForegroundFinder(
+            backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0, diff_method='rgb'),
+            cleaning={'method': 'median', 'size': 3}, scene_change={'step': 4, 'frames': 2},
+            roi={'polygons': [[(0, 0), (20, 0), (20, 63), (0, 63)], [(50, 0), (70, 0), (70, 30), (50, 30)]]})
+        for _ in range(3):
+            finder.process(self.noisy(self.background))
+        moved = np.roll(self.background, 20, axis=1)
+        finder.process(moved)
+        probability = finder.process(moved)
+        self.assertEqual(1, finder._scene_change.changes)
+        # the unknown probability is only inside the regions, the rest keeps the fill
+        roi = finder._roi_mask
+        self.assertTrue((probability[roi] == 0.5).all())
+        self.assertTrue((probability[~roi] == 0).all())
+        self.assertEqual(2, len(finder.regions))
+        # every region learned the new scene from the frame of the change
+        for region in finder.regions:
+            self.assertTrue(region.finder.static_background.get_details()['mask'].any())
+        self.assertTrue((finder.process(moved) < 0.5).all())
+
+    def test_finder_with_roi_batch_keeps_fill(self):
+        finder = see.foreground.ForegroundFinder(
+            backgrounds.StaticBackgroundModel(update_inertia=2.0, error_inertia=3.0, diff_method='rgb'),
+            cleaning={'method': 'median', 'size': 3}, scene_change={'step': 4, 'frames': 1},
+            probability={'dtype': 'uint8'}, roi={'polygons': [[(0, 0), (30, 0), (30, 63), (0, 63)]], 'fill': 0.2})
+        for _ in range(3):
+            finder.process(self.noisy(self.background))
+        moved = np.roll(self.background, 20, axis=1)
+        probabilities = finder.calc_prob_batch(np.stack([self.noisy(self.background), moved, moved]))
+        roi = finder._roi_mask
+        self.assertEqual(1, finder._scene_change.changes)
+        self.assertTrue((probabilities[0][roi] != 128).any())
+        self.assertTrue((probabilities[1:, roi] == 128).all())
+        self.assertTrue((probabilities[:, ~roi] == 51).all())
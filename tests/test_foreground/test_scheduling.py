@@ -0,0 +1,98 @@
+import numpy as np
+
+import see.foreground
+import see.foreground.scheduling as scheduling
+import tests.testbase
+
+
+class TestScheduling(tests.testbase.TestBase):
+    def test_plan(self):
+        scheduler = scheduling.UpdateScheduler(budget_ms=10, band_rows=10, refresh_frames=4, warmup_frames=0)
+        # the cost is not known yet
+        self.assertEqual([(slice(0, 10), 1), (slice(10, 20), 1), (slice(20, 30), 1), (slice(30, 40), 1)],
+                         scheduler.plan(40, elapsed_ms=9, change=1))
+        self.assertEqual('full', scheduler.last['decision'])
+        scheduler.record(40, 0.004)
+
+        # stable background, the bands rotate
+        self.assertEqual([(slice(0, 10), 1)], scheduler.plan(40, elapsed_ms=0, change=0))
+        self.assertEqual([(slice(10, 20), 1)], scheduler.plan(40, elapsed_ms=0, change=0))
+        self.assertEqual('partial', scheduler.last['decision'])
+
+        # changing background, as many bands as the budget allows with their age
+        self.assertEqual([(slice(20, 30), 3), (slice(30, 40), 3)], scheduler.plan(40, elapsed_ms=8, change=1))
+        self.assertEqual([], scheduler.plan(40, elapsed_ms=9.5, change=1))
+        self.assertEqual('skip', scheduler.last['decision'])
+        self.assertEqual([(slice(0, 10), 4), (slice(10, 20), 3), (slice(20, 30), 2), (slice(30, 40), 2)],
+                         scheduler.plan(40, elapsed_ms=0, change=1))
+        self.assertEqual({'full': 2, 'partial': 3, 'skip': 1}, scheduler.counts)
+
+    def test_warmup(self):
+        scheduler = scheduling.UpdateScheduler(budget_ms=100, band_rows=10, warmup_frames=2)
+        scheduler.record(40, 0.001)
+        decisions = []
+        for _ in range(3):
+            scheduler.plan(40, elapsed_ms=0, change=0)
+            decisions.append(scheduler.last['decision'])
+        scheduler.reset()
+        scheduler.plan(40, elapsed_ms=0, change=0)
+        decisions.append(scheduler.last['decision'])
+        self.assertEqual(['full', 'full', 'partial', 'full'], decisions)
+
+    def test_change_rate(self):
+        model = see.foreground.StaticBackgroundModel(update_inertia=10.0, error_inertia=10.0, diff_method='rgb')
+        background = np.full((64, 64, 3), 100, np.uint8)
+        model.update(background, np.ones((64, 64), bool))
+        scheduler = scheduling.UpdateScheduler(budget_ms=10, step=2)
+        no_foreground = np.zeros((64, 64), bool)
+
+        noise = np.random.RandomState(0).randint(-5, 6, background.shape)
+        self.assertLess(scheduler.change_rate(model, (background + noise).astype(np.uint8), no_foreground), 0.1)
+        self.assertGreater(scheduler.change_rate(model, (background + noise + 5).astype(np.uint8), no_foreground),
+                           0.8)
+        self.assertEqual(0, scheduler.change_rate(model, background + 5, np.ones((64, 64), bool)))
+
+    def test_update_rows_frames(self):
+        for config in [{}, {'in_place': True}, {'precision': 'fixed16'}]:
+            model = see.foreground.StaticBackgroundModel(update_inertia=3.0, error_inertia=3.0, diff_method='rgb',
+                                                         **config)
+            weighted = see.foreground.StaticBackgroundModel(update_inertia=3.0, error_inertia=3.0, diff_method='rgb',
+                                                            **config)
+            mask = np.ones((8, 8), bool)
+            for m in [model, weighted]:
+                m.update(np.full((8, 8, 3), 100, np.uint8), mask)
+            image = np.full((8, 8, 3), 180, np.uint8)
+            for _ in range(4):
+                model.update(image, mask)
+            weighted.update_rows(image, mask, slice(None), frames=4)
+            np.testing.assert_allclose(model.get(), weighted.get(), atol=0.01)
+
+    def test_finder_scheduled(self):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 10.0, 'error_inertia': 10.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 3}, scheduling={'budget_ms': 1000, 'band_rows': 8,
+                                                                  'warmup_frames': 2, 'step': 2})
+        random = np.random.RandomState(0)
+        background = random.randint(50, 200, (32, 32, 3))
+        images = [np.clip(background + random.normal(0, 2, background.shape), 0, 255).astype(np.uint8)
+                  for _ in range(8)]
+        for image in images:
+            finder.process(image, np.zeros((32, 32), bool))
+        self.assertEqual({'full': 2, 'partial': 5, 'skip': 0}, finder.scheduler.counts)
+
+        finder.static_background.reset()
+        finder.process(images[0])
+        finder.process(images[1])
+        self.assertEqual('full', finder.scheduler.last['decision'])
+
+    def test_finder_with_roi_splits_budget(self):
+        finder = see.foreground.ForegroundFinder.create_from_dicts(
+            {'update_inertia': 10.0, 'error_inertia': 10.0, 'diff_method': 'rgb'},
+            cleaning={'method': 'median', 'size': 3}, scheduling={'budget_ms': 1000, 'band_rows': 8},
+            roi={'polygons': [[(0, 0), (9, 0), (9, 31), (0, 31)], [(20, 0), (31, 0), (31, 9), (20, 9)]]})
+        finder.process(np.full((32, 32, 3), 100, np.uint8), np.zeros((32, 32), bool))
+        # crops with the halo of 1 pixel: 32 x 11 and 11 x 13
+        budgets = [region.finder.scheduler.budget_ms for region in finder.regions]
+        np.testing.assert_allclose([1000 * 352 / 495, 1000 * 143 / 495], budgets)
+        self.assertEqual(1000, finder.scheduler.budget_ms)
+        self.assertEqual(8, finder.regions[0].finder.scheduler.band_rows)
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+
+import see._commons.video as video
+import see.foreground.storage as storage
+import tests.testbase
+
+
+class TestStorage(tests.testbase.TestBase):
+    def create_probabilities(self, frames=10, shape=(30, 50)):
+        random = np.random.RandomState(0)
+        probabilities = np.zeros((frames,) + shape)
+        probabilities[:, :10] = 0.5
+        for i, probability in enumerate(probabilities):
+            probability[10 + i:15 + i, 5:20] = random.random_sample((5, 15))
+        return probabilities
+
+    def write(self, probabilities, **kwargs):
+        path = os.path.join(self.create_temp_dir(), "probabilities.seeprob")
+        with storage.ProbabilityWriter(path, **kwargs) as writer:
+            for probability in probabilities:
+                writer.write(probability)
+        return path
+
+    def test_rle(self):
+        frame = video.to_uint8(self.create_probabilities()[3])
+        encoded = storage.rle_encode(frame)
+        self.assertLess(len(encoded), frame.size / 2)
+        np.testing.assert_array_equal(frame, storage.rle_decode(encoded, frame.shape))
+
+        noise = np.random.RandomState(0).randint(0, 256, (7, 9)).astype(np.uint8)
+        np.testing.assert_array_equal(noise, storage.rle_decode(storage.rle_encode(noise), noise.shape))
+        constant = np.full((4, 5), 128, np.uint8)
+        np.testing.assert_array_equal(constant, storage.rle_decode(storage.rle_encode(constant), constant.shape))
+
+    def test_write_read(self):
+        probabilities = self.create_probabilities()
+        expected = np.stack([video.to_uint8(probability) for probability in probabilities])
+        for rle in [False, True]:
+            path = self.write(probabilities, chunk_frames=4, rle=rle)
+            self.assertLess(os.path.getsize(path), expected.nbytes / 4)
+            with storage.ProbabilityReader(path) as reader:
+                self.assertEqual(10, len(reader))
+                self.assertEqual((30, 50), reader.shape)
+                self.assertEqual(rle, reader.rle)
+                np.testing.assert_array_equal(expected[7], reader[7])
+                np.testing.assert_array_equal(expected[-1], reader[-1])
+                np.testing.assert_array_equal(expected[0], reader[0])
+                np.testing.assert_array_equal(expected, np.stack(list(reader)))
+                np.testing.assert_allclose(probabilities[5], reader.probability(5), atol=0.5 / 255 + 1e-6)
+                with self.assertRaises(IndexError):
+                    reader[10]
+
+    def test_errors(self):
+        path = os.path.join(self.create_temp_dir(), "probabilities.seeprob")
+        with storage.ProbabilityWriter(path) as writer:
+            writer.write(np.zeros((3, 4)))
+            with self.assertRaises(ValueError):
+                writer.write(np.zeros((4, 3)))
+        with storage.ProbabilityReader(path) as reader:
+            self.assertEqual(1, len(reader))
+
+        with open(path, 'r+b') as file:
+            file.truncate(os.path.getsize(path) - 1)
+        with self.assertRaises(IOError):
+            storage.ProbabilityReader(path)
+
+        empty_path = self.write([])
+        with storage.ProbabilityReader(empty_path) as reader:
+            self.assertEqual(0, len(reader))
+            self.assertEqual([], list(reader))
@@ -0,0 +1,62 @@
+import numpy as np
+
+import see.foreground
+import see.foreground.sweep as sweep
+import tests.testbase
+
+BASE_CONFIG = {'config_background_model': {'update_inertia': 1.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+               'cleaning': {'method': 'median', 'size': 3}, 'confident_size': 3}
+
+
+class TestSweep(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        random = np.random.RandomState(3)
+        self.frames = np.clip(100 + random.normal(0, 4, (40, 24, 32, 3)), 0, 255).astype(np.uint8)
+        self.masks = np.zeros(self.frames.shape[:3], bool)
+        for i in range(10, 40):
+            self.masks[i, 5:12, i % 20:i % 20 + 8] = True
+        self.frames[self.masks] = 220
+
+    def test_expand_grid(self):
+        configs = sweep.expand_grid(BASE_CONFIG, {'config_background_model.update_inertia': [1.0, 5.0],
+                                                  'cleaning.size': [3, 5, 7], 'probability.dtype': ['float32']})
+        self.assertEqual(6, len(configs))
+        self.assertEqual({'update_inertia': 5.0, 'error_inertia': 1.0, 'diff_method': 'rgb'},
+                         configs[3]['config_background_model'])
+        self.assertEqual({'method': 'median', 'size': 3}, configs[3]['cleaning'])
+        self.assertEqual({'dtype': 'float32'}, configs[3]['probability'])
+        self.assertEqual(1.0, BASE_CONFIG['config_background_model']['update_inertia'])
+        self.assertEqual(5, sweep.flatten(configs[1])['cleaning.size'])
+
+    def test_scores_match_sequential_runs(self):
+        configs = sweep.expand_grid(BASE_CONFIG, {'config_background_model.update_inertia': [1.0, 4.0, 16.0]})
+        results = sweep.run_sweep(configs, iter(self.frames), iter(self.masks), workers=2, chunk_frames=4,
+                                  warmup_frames=5)
+        self.assertEqual(sorted(r['iou'] for r in results)[::-1], [r['iou'] for r in results])
+
+        for result in results:
+            finder = see.foreground.ForegroundFinder.create_from_dicts(**result['config'])
+            intersection = union = 0
+            for i, (frame, mask) in enumerate(zip(self.frames, self.masks)):
+                detected = finder.process(frame, mask) > 0.5
+                if i >= 5:
+                    intersection += (detected & mask).sum()
+                    union += (detected | mask).sum()
+            self.assertEqual(40, result['frames'])
+            self.assertAlmostEqual(intersection / union, result['iou'])
+
+        table = sweep.format_table(results).splitlines()
+        self.assertEqual(4, len(table))
+        self.assertEqual(['rank', 'config_background_model.update_inertia', 'iou', 'precision', 'recall', 'fps'],
+                         table[0].split())
+
+    def test_without_masks(self):
+        results = sweep.run_sweep([BASE_CONFIG], self.frames, workers=1)
+        self.assertEqual(1, len(results))
+        self.assertNotIn('iou', results[0])
+        self.assertGreater(results[0]['fps'], 0)
+
+    def test_failing_config(self):
+        with self.assertRaises(RuntimeError):
+            sweep.run_sweep([BASE_CONFIG, {'cleaning': {'method': 'unknown'}}], self.frames, self.masks, workers=2)
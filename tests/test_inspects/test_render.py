@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import numpy.testing as nptest
+
+import inspects.render as render
+import see._commons.video as video
+import tests.testbase
+
+
+class TestRender(tests.testbase.TestBase):
+    def setUp(self):
+        super().setUp()
+        random = np.random.RandomState(2)
+        self.image = random.randint(0, 256, (24, 32, 3)).astype(np.uint8)
+        self.probability = np.zeros((24, 32))
+        self.probability[5:15, 10:20] = 1.0
+
+    def test_to_rgb(self):
+        self.assertIs(self.image, render.to_rgb(self.image))
+        nptest.assert_equal(self.image, render.to_rgb(self.image.astype(np.uint16) * 257))
+        nptest.assert_equal(self.image, render.to_rgb(self.image / 255))
+        nptest.assert_equal(self.image, render.to_rgb(self.image * 2.0, value_range=(0, 510)))
+        nptest.assert_equal([0, 255], render.to_rgb(np.array([[[-0.5] * 3, [1.5] * 3]]))[0, :, 0])
+
+        gray = render.to_rgb(np.array([[0.0, 0.5, 1.0]]))
+        self.assertEqual((1, 3, 3), gray.shape)
+        nptest.assert_equal([0, 128, 255], gray[0, :, 0])
+        nptest.assert_equal([0, 64, 128], render.to_rgb(np.array([[0.0, 0.5, 1.0]]), value_range=(0, 2))[0, :, 1])
+
+        labels = render.to_rgb(np.array([[0, 1, 1, render.LABEL_COLOURS + 1]]), cmap='rand')
+        nptest.assert_equal([0, 0, 0], labels[0, 0])
+        nptest.assert_equal(labels[0, 1], labels[0, 2])
+        nptest.assert_equal(labels[0, 1], labels[0, 3])
+
+        jet = render.to_rgb(self.probability, cmap='jet')
+        self.assertEqual(self.image.shape, jet.shape)
+        self.np_assert_not_equal(jet[..., 0], jet[..., 2])
+        with self.assertRaises(NotImplementedError):
+            render.to_rgb(self.probability, cmap='unknown')
+
+    def test_overlay(self):
+        nptest.assert_equal(self.image, render.overlay(self.image, self.probability, alpha=0))
+        colour = render.to_rgb(video.to_uint8(self.probability), 'jet', value_range=(0, 255))
+        nptest.assert_equal(colour, render.overlay(self.image, self.probability, alpha=1))
+        nptest.assert_equal(render.overlay(self.image, self.probability),
+                            render.overlay(self.image, video.to_uint8(self.probability)))
+
+    def test_montage(self):
+        grid = render.montage([self.image, self.probability, self.image[::2, ::2]], cols=2, gap=3)
+        self.assertEqual((2 * 24 + 3, 2 * 32 + 3, 3), grid.shape)
+        nptest.assert_equal(self.image, grid[:24, :32])
+        nptest.assert_equal(render.to_rgb(self.probability), grid[:24, 35:])
+        self.assertFalse(grid[24:27].any())
+        self.assertFalse(grid[:, 32:35].any())
+        self.assertFalse(grid[27:, 35:].any())
+
+        titled = render.montage([self.probability, self.probability], titles=["a", ""], cmap='gray,jet',
+                                tile_shape=(12, 16), gap=0)
+        self.assertEqual((12, 32, 3), titled.shape)
+        self.assertTrue((titled[:, :16] == 255).any(axis=2).any())
+        nptest.assert_equal(render.montage([self.probability], cmap='jet', tile_shape=(12, 16)), titled[:, 16:])
+
+    def test_write_video(self):
+        temp_dir = self.create_temp_dir()
+        path = os.path.join(temp_dir, "frames.avi")
+        frames = [np.full((24, 32, 3), value, np.uint8) for value in [0, 100, 200]]
+        self.assertEqual(3, render.write_video(path, iter(frames), fps=5))
+        read = list(video.read_frames(path))
+        self.assertEqual(3, len(read))
+        for frame, written in zip(frames, read):
+            self.assertEqual(frame.shape, written.shape)
+            self.assertLess(np.abs(written.astype(int) - frame).mean(), 5)
+
+        path = os.path.join(temp_dir, "review.avi")
+        self.assertEqual(2, render.write_review_video(path, [self.image] * 2, [self.probability] * 2, scale=0.5))
+        self.assertEqual([(12, 3 * 16 + 2 * 2, 3)] * 2, [frame.shape for frame in video.read_frames(path)])